@@ -1,9 +1,17 @@
 # app/__init__.py
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request
 from flask_jwt_extended import JWTManager
 from datetime import datetime
-from .config import Config, supabase_client
+from . import metrics
+from .config import Config
+from .health import health_checker
+from .signing_keys import key_ring
+from .utils.structured_logging import begin_request, debug_requested, end_request, setup_logging
 import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
 
 def create_app():
     app = Flask(__name__)
@@ -12,45 +20,120 @@ def create_app():
     # Initialize JWT
     jwt = JWTManager(app)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+    # Records are queued and written by a background thread as JSON lines
+    setup_logging(
+        Config.LOG_LEVEL,
+        json_format=Config.LOG_FORMAT == 'json',
+        debug_available=bool(Config.LOG_DEBUG_SAMPLE_RATE or Config.LOG_DEBUG_TOKEN),
+        max_queue=Config.LOG_QUEUE_SIZE
     )
-    app.logger.setLevel(logging.INFO)
+    app.logger.setLevel(logging.NOTSET)
+
+    if Config.RETENTION_ENABLED:
+        from .janitor import retention_janitor
+        retention_janitor.start()
+
+    # Fail deliveries left pending by a worker that died, and let a retry send a new code
+    from .auth_service import retire_registrations
+    from .delivery import delivery_pipeline
+    delivery_pipeline.start(on_abandoned=retire_registrations)
     
     # Register blueprints
     from .routes.email_auth import email_auth
     from .routes.phone_auth import phone_auth
+    from .routes.token_auth import token_auth
     
     app.register_blueprint(email_auth, url_prefix='/auth/email')
     app.register_blueprint(phone_auth, url_prefix='/auth/phone')
+    app.register_blueprint(token_auth, url_prefix='/auth')
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.log_context = begin_request(g.request_id, debug_requested(
+            request.headers.get('X-Debug-Log'), Config.LOG_DEBUG_TOKEN, Config.LOG_DEBUG_SAMPLE_RATE
+        ))
+
+    @app.after_request
+    def record_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            # The URL rule, not the path, keeps label cardinality bounded
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            duration = time.perf_counter() - started
+            metrics.REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(duration)
+            logger.debug("Request handled", extra={
+                'method': request.method,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2)
+            })
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    @app.teardown_request
+    def end_request_context(exc):
+        log_context = g.pop('log_context', None)
+        if log_context is not None:
+            end_request(log_context)
+
+    # Prometheus metrics, merged across worker processes
+    @app.route('/metrics')
+    def prometheus_metrics():
+        body, content_type = metrics.render()
+        return app.response_class(body, content_type=content_type)
+
+    # Liveness: the process is serving requests; no dependency I/O
+    @app.route('/livez')
+    def livez():
+        return jsonify({'status': 'alive'}), 200
+
+    # Readiness: cached results of the background dependency checker
+    @app.route('/readyz')
+    def readyz():
+        snapshot = health_checker.snapshot()
+        return jsonify({
+            'status': snapshot['status'],
+            'timestamp': datetime.utcnow().isoformat(),
+            'checks': snapshot['checks']
+        }), 200 if snapshot['ready'] else 503
 
     # Health check endpoint
     @app.route('/health')
     def health_check():
-        try:
-            # Test Supabase connection with a simple query
-            supabase_status = False
-            test_query = supabase_client.from_('users').select('*').limit(1).execute()
-            if test_query:
-                supabase_status = True
-            
-            return jsonify({
-                'status': 'healthy',
-                'timestamp': datetime.utcnow().isoformat(),
-                'service': 'auth-server',
-                'version': '1.0.0',
-                'dependencies': {
-                    'supabase': 'connected' if supabase_status else 'disconnected'
-                }
-            }), 200
-        except Exception as e:
+        snapshot = health_checker.snapshot()
+        if not snapshot['ready']:
             return jsonify({
                 'status': 'unhealthy',
                 'timestamp': datetime.utcnow().isoformat(),
-                'error': str(e)
+                'error': '; '.join(f"{name}: {check['error']}" for name, check in snapshot['checks'].items()
+                                   if not check['ok'])
             }), 500
 
+        return jsonify({
+            'status': 'healthy',
+            'timestamp': datetime.utcnow().isoformat(),
+            'service': 'auth-server',
+            'version': '1.0.0',
+            'dependencies': {
+                name: 'connected' if check['ok'] else 'disconnected'
+                for name, check in snapshot['checks'].items()
+            }
+        }), 200
+
+    # Public signing keys for offline token verification
+    @app.route('/.well-known/jwks.json')
+    def jwks():
+        if request.if_none_match.contains(key_ring.jwks_etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(key_ring.jwks())
+        response.set_etag(key_ring.jwks_etag)
+        response.headers['Cache-Control'] = f'public, max-age={Config.JWKS_MAX_AGE}'
+        return response
+
     @app.route('/')
     def index():
         return jsonify({
@@ -59,8 +142,13 @@ def create_app():
             'version': '1.0.0',
             'endpoints': {
                 'health': '/health',
+                'liveness': '/livez',
+                'readiness': '/readyz',
                 'email_auth': '/auth/email',
-                'phone_auth': '/auth/phone'
+                'phone_auth': '/auth/phone',
+                'introspect': '/auth/introspect',
+                'jwks': '/.well-known/jwks.json',
+                'metrics': '/metrics'
             }
         })
 
@@ -0,0 +1,2 @@
+# auth/aio/__init__.py
+from .auth_service import AsyncAuthService, create_async_auth_service
@@ -0,0 +1,237 @@
+# auth/aio/auth_service.py
+import asyncio
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+from postgrest import AsyncPostgrestClient
+from .. import metrics
+from ..auth_service import (MESSAGE_KINDS, TOO_MANY_GUESSES, AuthService, already_sent, registration_key,
+                            retire_registrations)
+from ..config import Config
+from ..otp_store import DatabaseOTPStore
+from .clients import AsyncEmailService, AsyncSMSClient
+from .delivery import AsyncDeliveryPipeline
+from .otp_store import AsyncDatabaseOTPStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+IDENTIFIER_LABELS = {'email': 'Email', 'phone': 'Phone number'}
+
+class AsyncAuthService:
+    """AuthService operations with non-blocking PostgREST, SMTP and SMS calls.
+
+    Token signing and session bookkeeping are shared with the sync
+    ``AuthService``. Not everything is native: with an in-memory OTP store,
+    verification runs the sync path, database calls included, and shared
+    attempt counters, registration claims and replay generations call their
+    sync store. Those
+    run on the loop's default executor, sized by ASGI_BLOCKING_THREADS.
+    """
+
+    def __init__(self, client: AsyncPostgrestClient, delivery: AsyncDeliveryPipeline,
+                 email_service: AsyncEmailService, sms_client: AsyncSMSClient,
+                 sync_service: Optional[AuthService] = None):
+        self.client = client
+        self.delivery = delivery
+        self.email_service = email_service
+        self.sms_client = sms_client
+        self.sync = sync_service or AuthService()
+        self.otp_store = (AsyncDatabaseOTPStore(client)
+                          if isinstance(self.sync.otp_store, DatabaseOTPStore) else None)
+
+    async def register_with_email(self, email: str, name: str,
+                                  idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[Dict]]:
+        """Handle email registration."""
+        return await self._single_flight('email', email, name, idempotency_key)
+
+    async def register_with_phone(self, phone: str, name: str,
+                                  idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[Dict]]:
+        """Handle phone registration."""
+        return await self._single_flight('phone', phone, name, idempotency_key)
+
+    async def verify_otp(self, email: str, otp: str) -> Tuple[bool, str, Optional[Dict]]:
+        """Verify email OTP."""
+        return await self._verify('email', email, otp)
+
+    async def verify_phone_otp(self, phone: str, otp: str) -> Tuple[bool, str, Optional[Dict]]:
+        """Verify phone OTP."""
+        return await self._verify('phone', phone, otp)
+
+    async def recent_registration(self, channel: str, identifier: str,
+                                  idempotency_key: Optional[str] = None) -> Optional[Tuple[bool, str, Optional[Dict]]]:
+        """See AuthService.recent_registration."""
+        if idempotency_key and Config.REGISTER_DEDUP_STORE_URL:
+            # The replay generation is read from the shared store; keep it off the event loop
+            return await asyncio.to_thread(self.sync.recent_registration, channel, identifier, idempotency_key)
+        return self.sync.recent_registration(channel, identifier, idempotency_key)
+
+    async def get_delivery_status(self, channel: str, delivery_id: str) -> Optional[Dict]:
+        """Get OTP delivery status for the given channel."""
+        return AuthService.format_delivery(channel, await self.delivery.get_status(delivery_id))
+
+    async def close(self):
+        """Finish in-flight deliveries and close connections."""
+        await self.delivery.drain()
+        await self.sms_client.close()
+        await self.email_service.pool.close()
+        await self.client.aclose()
+
+    async def _single_flight(self, channel: str, identifier: str, name: str,
+                             idempotency_key: Optional[str]) -> Tuple[bool, str, Optional[Dict]]:
+        # Same de-duplication as the sync service, sharing its replayed results and claims
+        if idempotency_key and Config.REGISTER_DEDUP_STORE_URL:
+            key, ttl = await asyncio.to_thread(registration_key, channel, identifier, idempotency_key)
+        else:
+            key, ttl = registration_key(channel, identifier, idempotency_key)
+        result, outcome = await self.sync.registrations.run_async(
+            key, lambda: self._register(channel, identifier, name, key), ttl,
+            keep=lambda result: result[0],
+            duplicate=lambda: already_sent(channel, identifier)
+        )
+        if outcome != 'run':
+            metrics.REGISTRATIONS_COALESCED.labels(channel, outcome).inc()
+        return result
+
+    async def _register(self, channel: str, identifier: str, name: str, key: str) -> Tuple[bool, str, Optional[Dict]]:
+        try:
+            with metrics.stage('user_exists'):
+                exists = await self._user_exists(channel, identifier)
+            if exists:
+                return False, f"{IDENTIFIER_LABELS[channel]} already registered", None
+
+            await self._start_new_code(channel, identifier)
+
+            otp = self.sync._generate_otp()
+            ttl = timedelta(minutes=Config.OTP_EXPIRY_MINUTES)
+            try:
+                with metrics.stage('otp_save'):
+                    if self.otp_store is not None:
+                        await self.otp_store.save(channel, identifier, otp, name, ttl)
+                    else:
+                        self.sync.otp_store.save(channel, identifier, otp, name, ttl)
+            except Exception as e:
+                logger.error("Failed to store verification code: %s", e)
+                return False, "Failed to create verification code", None
+
+            async def cleanup_code():
+                # Cleanup the stored code if delivery fails, and let a retry send a new one
+                if self.otp_store is not None:
+                    await self.otp_store.discard(channel, identifier, otp)
+                else:
+                    self.sync.otp_store.discard(channel, identifier, otp)
+                await asyncio.to_thread(self.sync.registrations.forget, key)
+
+            delivery_id = await self.delivery.enqueue(channel, identifier, otp, on_failure=cleanup_code)
+
+            return (True, f"Verification {MESSAGE_KINDS[channel]} queued",
+                    {channel: identifier, 'delivery_id': delivery_id})
+
+        except Exception as e:
+            logger.error("%s registration error: %s", channel.capitalize(), e)
+            return False, str(e), None
+
+    async def _verify(self, channel: str, identifier: str, otp: str) -> Tuple[bool, str, Optional[Dict]]:
+        try:
+            logger.debug("Verifying OTP", extra={'channel': channel, 'identifier': identifier})
+
+            attempts = self.sync.otp_attempts
+            attempt = await self._counter(attempts.attempt, channel, identifier)
+            if attempts.exhausted(attempt):
+                metrics.OTP_VERIFICATIONS.labels(channel, 'blocked').inc()
+                return False, TOO_MANY_GUESSES, None
+
+            if self.otp_store is None:
+                result = await asyncio.to_thread(self.sync._verify_and_login, channel, identifier, otp)
+            else:
+                result = await self._verify_and_login(channel, identifier, otp)
+            if not result:
+                logger.warning("No valid verification code found for %s: %s", channel, identifier)
+                metrics.OTP_VERIFICATIONS.labels(channel, 'invalid').inc()
+                if attempts.last(attempt):
+                    await self._attempts_exhausted(channel, identifier)
+                return False, "Invalid or expired verification code", None
+
+            await self._counter(attempts.reset, channel, identifier)
+            metrics.OTP_VERIFICATIONS.labels(channel, 'success').inc()
+            return True, "Verification successful", result
+
+        except Exception as e:
+            logger.error("OTP verification error: %s", e)
+            metrics.OTP_VERIFICATIONS.labels(channel, 'error').inc()
+            return False, str(e), None
+
+    async def _user_exists(self, channel: str, identifier: str) -> bool:
+        """See AuthService._user_exists."""
+        if not self.sync.user_filter.might_exist(channel, identifier):
+            metrics.USER_EXISTS_CHECKS.labels('filtered').inc()
+            return False
+        column = 'email' if channel == 'email' else 'phone_number'
+        existing = await self.client.table('users').select('id').eq(column, identifier).limit(1).execute()
+        metrics.USER_EXISTS_CHECKS.labels('found' if existing.data else 'not_found').inc()
+        return bool(existing.data)
+
+    async def _start_new_code(self, channel: str, identifier: str):
+        """See AuthService._start_new_code."""
+        attempts = self.sync.otp_attempts
+        if await self._counter(attempts.failures, channel, identifier):
+            await self._discard_all(channel, identifier)
+            await self._counter(attempts.reset, channel, identifier)
+
+    async def _attempts_exhausted(self, channel: str, identifier: str):
+        logger.warning("OTP attempts exhausted for %s: %s", channel, identifier)
+        await asyncio.to_thread(retire_registrations, channel, identifier)
+        try:
+            await self._discard_all(channel, identifier)
+        except Exception as e:
+            logger.error("Failed to discard verification codes: %s", e)
+
+    async def _discard_all(self, channel: str, identifier: str):
+        if self.otp_store is not None:
+            await self.otp_store.discard_all(channel, identifier)
+        else:
+            self.sync.otp_store.discard_all(channel, identifier)
+
+    @staticmethod
+    async def _counter(method, *args):
+        # A shared counter store may be a network round trip; keep it off the event loop
+        if Config.OTP_ATTEMPT_STORE_URL:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _verify_and_login(self, channel: str, identifier: str, otp: str) -> Optional[Dict]:
+        token_manager = self.sync.token_manager
+        refresh_jti, refresh_expires_at = token_manager.new_refresh_token_id()
+        with metrics.stage('otp_consume_and_login'):
+            login = await self.otp_store.consume_and_login(channel, identifier, otp, refresh_jti, refresh_expires_at)
+        if not login:
+            return None
+        user, session = login['user'], login['session_id']
+        self.sync.session_manager.session_created(user['id'])
+        self.sync.user_filter.add(channel, identifier)
+        return {
+            'user': user,
+            'tokens': token_manager.sign_tokens(user['id'], refresh_jti, refresh_expires_at, session),
+            'session': session
+        }
+
+def create_async_auth_service(client: AsyncPostgrestClient) -> AsyncAuthService:
+    """Build the service with async email and SMS senders from Config."""
+    email_service = AsyncEmailService()
+    sms_client = AsyncSMSClient()
+
+    async def send_email(recipient: str, otp: str) -> Tuple[bool, bool, str]:
+        sent, retryable = await email_service.send_verification(recipient, otp)
+        return sent, retryable, '' if sent else 'Failed to send verification email'
+
+    async def send_sms(recipient: str, otp: str) -> Tuple[bool, bool, str]:
+        return await sms_client.send(recipient, f'Your OTP is: {otp}')
+
+    delivery = AsyncDeliveryPipeline(
+        client,
+        {'email': send_email, 'phone': send_sms},
+        concurrency=Config.DELIVERY_CONCURRENCY,
+        max_attempts=Config.DELIVERY_MAX_ATTEMPTS,
+        backoff=Config.DELIVERY_RETRY_BACKOFF,
+        stale_after=Config.DELIVERY_STALE_AFTER
+    )
+    return AsyncAuthService(client, delivery, email_service, sms_client)
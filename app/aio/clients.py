@@ -0,0 +1,234 @@
+# auth/aio/clients.py
+import asyncio
+import random
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+import aiosmtplib
+import httpx
+from httpcore.backends.auto import AutoBackend
+from postgrest import AsyncPostgrestClient
+from .. import metrics
+from ..config import Config
+from ..email_service import EmailService
+from ..sms_client import RETRYABLE_STATUS_CODES
+from ..utils.circuit_breaker import CircuitBreaker
+import logging
+
+logger = logging.getLogger(__name__)
+
+def set_nodelay(sock):
+    """Disable Nagle's algorithm so small writes are not held for the peer's ACK."""
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError as e:
+        logger.warning("Could not set TCP_NODELAY: %s", e)
+
+class NoDelayBackend(AutoBackend):
+    """httpcore network backend that sets TCP_NODELAY on every connection."""
+
+    async def connect_tcp(self, *args, **kwargs):
+        stream = await super().connect_tcp(*args, **kwargs)
+        set_nodelay(stream.get_extra_info('socket'))
+        return stream
+
+def nodelay_transport(limits: httpx.Limits = httpx.Limits()) -> httpx.AsyncHTTPTransport:
+    """Async transport whose connections have TCP_NODELAY set whatever the event loop."""
+    transport = httpx.AsyncHTTPTransport(limits=limits)
+    # httpx 0.23 has no option to pass a network backend through to httpcore
+    transport._pool._network_backend = NoDelayBackend()
+    return transport
+
+def create_postgrest_client() -> AsyncPostgrestClient:
+    """Async PostgREST client for the Supabase project in Config."""
+    client = AsyncPostgrestClient(
+        f"{Config.SUPABASE_URL}/rest/v1",
+        headers={
+            'apiKey': Config.SUPABASE_KEY,
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'
+        }
+    )
+    session = client.session
+    client.session = httpx.AsyncClient(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        transport=nodelay_transport()
+    )
+    client.auth(token=Config.SUPABASE_KEY)
+    return client
+
+class AsyncSMSClient:
+    """Async counterpart of SMSClient with the same retry and breaker rules."""
+
+    def __init__(self, gateway_url: Optional[str] = None, client: Optional[httpx.AsyncClient] = None):
+        self.gateway_url = gateway_url or Config.SMS_GATEWAY_URL
+        self.max_retries = Config.SMS_MAX_RETRIES
+        self.backoff_base = Config.SMS_RETRY_BACKOFF
+        self.breaker = CircuitBreaker(
+            'sms-gateway-async',
+            failure_threshold=Config.SMS_BREAKER_THRESHOLD,
+            reset_timeout=Config.SMS_BREAKER_RESET_TIMEOUT
+        )
+        self.client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(Config.SMS_READ_TIMEOUT, connect=Config.SMS_CONNECT_TIMEOUT),
+            transport=nodelay_transport(httpx.Limits(max_connections=Config.SMS_POOL_SIZE)),
+            headers={'Accept': 'application/json', 'User-Agent': 'auth-server/1.0'}
+        )
+
+    async def send(self, phone: str, message: str) -> Tuple[bool, bool, str]:
+        """Send an SMS; returns (success, retryable, error message) as SMSClient.send."""
+        if not self.breaker.allow():
+            logger.warning("SMS gateway circuit open, failing fast")
+            return False, True, "SMS service unavailable"
+
+        payload = {'number': phone, 'message': message}
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+            try:
+                with metrics.dependency('sms_gateway', 'send'):
+                    response = await self.client.post(self.gateway_url, json=payload)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # Nothing reached the gateway
+                logger.warning("SMS gateway connection error (attempt %s): %s", attempt + 1, e)
+                error = "SMS service connection error"
+                continue
+            except httpx.HTTPError as e:
+                logger.error("SMS gateway request error: %s", e)
+                self.breaker.record_failure()
+                return False, False, "SMS service connection error"
+
+            if response.status_code >= 400:
+                metrics.PROVIDER_FAILURES.labels('sms_gateway').inc()
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                logger.warning("SMS gateway returned %s (attempt %s)", response.status_code, attempt + 1)
+                error = f"SMS gateway unavailable ({response.status_code})"
+                continue
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            try:
+                response_data = response.json()
+            except ValueError:
+                response_data = {}
+            if response_data.get('status') != 'success':
+                return False, False, f"Failed to send SMS: {response.text}"
+            return True, False, ""
+
+        self.breaker.record_failure()
+        return False, True, error
+
+    async def close(self):
+        await self.client.aclose()
+
+class AsyncSMTPConnectionPool:
+    """Pool of authenticated aiosmtplib connections kept alive between sends."""
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str],
+                 use_tls: bool = True, size: int = 4, timeout: float = 10.0, max_idle: float = 60.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        server = aiosmtplib.SMTP(hostname=self.host, port=self.port, timeout=self.timeout,
+                                 start_tls=self.use_tls)
+        await server.connect()
+        set_nodelay(server.transport.get_extra_info('socket'))
+        if self.username:
+            await server.login(self.username, self.password)
+        return server
+
+    async def _get_idle(self):
+        """Return a live idle connection, discarding stale ones."""
+        while self._idle:
+            server, released_at = self._idle.pop()
+            if time.monotonic() - released_at < self.max_idle:
+                try:
+                    if (await server.noop()).code == 250:
+                        return server
+                except Exception:
+                    pass
+            await self._close(server)
+        return None
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a connection; it is returned to the pool unless the send failed."""
+        async with self._slots:
+            server = None
+            try:
+                server = await self._get_idle() or await self._connect()
+                yield server
+            except Exception:
+                if server is not None:
+                    await self._close(server)
+                    server = None
+                raise
+            finally:
+                if server is not None:
+                    self._idle.append((server, time.monotonic()))
+
+    async def close(self):
+        while self._idle:
+            server, _ = self._idle.pop()
+            await self._close(server)
+
+    @staticmethod
+    async def _close(server):
+        try:
+            await server.quit()
+        except Exception:
+            server.close()
+
+class AsyncEmailService(EmailService):
+    """EmailService sending over an async SMTP pool."""
+
+    def __init__(self):
+        self.smtp_server = Config.SMTP_SERVER
+        self.smtp_port = Config.SMTP_PORT
+        self.username = Config.SMTP_USERNAME
+        self.password = Config.SMTP_PASSWORD
+        self.from_email = Config.SMTP_FROM_EMAIL
+        self.pool = AsyncSMTPConnectionPool(
+            Config.SMTP_SERVER,
+            Config.SMTP_PORT,
+            Config.SMTP_USERNAME,
+            Config.SMTP_PASSWORD,
+            use_tls=Config.SMTP_USE_TLS,
+            size=Config.SMTP_POOL_SIZE,
+            timeout=Config.SMTP_TIMEOUT
+        )
+
+    async def send_verification(self, to_email: str, otp: str) -> Tuple[bool, bool]:
+        """Send verification email with OTP; returns (success, retryable) as EmailService."""
+        msg = self._build_verification(to_email, otp)
+        connected = False
+        try:
+            with metrics.dependency('smtp', 'send'):
+                async with self.pool.connection() as server:
+                    connected = True
+                    await server.send_message(msg)
+            return True, False
+        except aiosmtplib.SMTPRecipientsRefused as e:
+            logger.error("Failed to send verification email: %s", e)
+            return False, all(400 <= error.code < 500 for error in e.recipients)
+        except aiosmtplib.SMTPResponseException as e:
+            logger.error("Failed to send verification email: %s", e)
+            return False, not connected or 400 <= e.code < 500
+        except Exception as e:
+            logger.error("Failed to send verification email: %s", e)
+            return False, not connected
@@ -0,0 +1,135 @@
+# auth/aio/delivery.py
+import asyncio
+import random
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from postgrest import AsyncPostgrestClient
+from .. import metrics
+from ..delivery import error_category
+from ..repositories.supabase import DELIVERY_COLUMNS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sender signature: async (recipient, otp) -> (success, retryable, error message)
+AsyncSender = Callable[[str, str], Awaitable[Tuple[bool, bool, str]]]
+
+class AsyncDeliveryPipeline:
+    """DeliveryPipeline on the event loop: each job is a task, at most
+    ``concurrency`` of them sending at once. Status rows are shared with the
+    sync pipeline, so either serving mode can answer status queries, and the
+    sync pipeline's recovery fails the rows of jobs lost with their process.
+    """
+
+    def __init__(self, client: AsyncPostgrestClient, senders: Dict[str, AsyncSender], concurrency: int = 100,
+                 max_attempts: int = 3, backoff: float = 1.0, cache_size: int = 10000,
+                 stale_after: float = 300):
+        self.client = client
+        self.senders = senders
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.cache_size = cache_size
+        self.stale_after = stale_after
+        self._slots = asyncio.Semaphore(concurrency)
+        self._records: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def enqueue(self, channel: str, recipient: str, otp: str,
+                      on_failure: Optional[Callable[[], Awaitable[None]]] = None) -> str:
+        """Store the queued delivery, start it and return its delivery ID."""
+        if channel not in self.senders:
+            raise ValueError(f"Unknown delivery channel: {channel}")
+
+        now = datetime.now(timezone.utc).isoformat()
+        record = {
+            'id': str(uuid.uuid4()),
+            'channel': channel,
+            'recipient': recipient,
+            'status': 'queued',
+            'attempts': 0,
+            'last_error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        self._records[record['id']] = record
+        while len(self._records) > self.cache_size:
+            self._records.popitem(last=False)
+        await self._save(record)
+        task = asyncio.get_running_loop().create_task(self._deliver(record, otp, on_failure, time.monotonic()))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return record['id']
+
+    async def get_status(self, delivery_id: str) -> Optional[Dict]:
+        """Return the delivery record, from memory if this process owns it."""
+        record = self._records.get(delivery_id)
+        if record is not None:
+            return dict(record)
+        try:
+            result = await self.client.table('otp_deliveries').select(DELIVERY_COLUMNS).eq(
+                'id', delivery_id
+            ).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error("Error fetching delivery status: %s", e)
+            return None
+
+    async def drain(self, timeout: float = 10.0):
+        """Wait for in-flight deliveries, e.g. on shutdown."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    async def _update(self, record: Dict, **changes):
+        record.update(changes, updated_at=datetime.now(timezone.utc).isoformat())
+        await self._save(record)
+
+    async def _save(self, record: Dict):
+        try:
+            with metrics.dependency('supabase', 'otp_deliveries.upsert'):
+                await self.client.table('otp_deliveries').upsert(dict(record)).execute()
+        except Exception as e:
+            logger.error("Error persisting delivery status: %s", e)
+
+    async def _deliver(self, record: Dict, otp: str, on_failure: Optional[Callable[[], Awaitable[None]]],
+                       queued_at: float):
+        sender = self.senders[record['channel']]
+        error = ''
+        async with self._slots:
+            if time.monotonic() - queued_at >= self.stale_after:
+                # Recovery may already have reported it failed, so the code must not go out now
+                logger.warning("OTP delivery %s waited too long in the queue", record['id'])
+                await self._fail(record, 'internal_error', on_failure)
+                return
+            for attempt in range(1, self.max_attempts + 1):
+                await self._update(record, status='sending', attempts=attempt)
+                try:
+                    sent, retryable, detail = await sender(record['recipient'], otp)
+                    error = error_category(retryable)
+                except Exception as e:
+                    sent, retryable, detail, error = False, False, str(e), 'internal_error'
+                if sent:
+                    metrics.OTP_SENDS.labels(record['channel'], 'delivered').inc()
+                    await self._update(record, status='delivered', last_error=None)
+                    return
+                metrics.OTP_SENDS.labels(record['channel'], 'attempt_failed').inc()
+                logger.warning("OTP delivery %s attempt %s failed: %s", record['id'], attempt, detail)
+                if not retryable:
+                    break
+                if attempt < self.max_attempts:
+                    await self._update(record, status='retrying', last_error=error)
+                    await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+        await self._fail(record, error, on_failure)
+
+    async def _fail(self, record: Dict, error: str, on_failure: Optional[Callable[[], Awaitable[None]]]):
+        metrics.OTP_SENDS.labels(record['channel'], 'failed').inc()
+        await self._update(record, status='failed', last_error=error)
+        if on_failure is not None:
+            try:
+                await on_failure()
+            except Exception as e:
+                logger.error("Delivery failure callback error: %s", e)
@@ -0,0 +1,56 @@
+# auth/aio/otp_store.py
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from postgrest import AsyncPostgrestClient
+from postgrest.types import ReturnMethod
+from ..otp_store import hash_code
+from ..repositories.supabase import CODE_IDENTIFIER_COLUMNS
+
+class AsyncDatabaseOTPStore:
+    """Async counterpart of DatabaseOTPStore on the same verification_codes rows."""
+
+    def __init__(self, client: AsyncPostgrestClient):
+        self.client = client
+
+    async def save(self, channel: str, identifier: str, code: str, name: Optional[str], ttl: timedelta) -> Dict:
+        """Store a code; returns the stored record."""
+        await self.client.table('verification_codes').insert({
+            CODE_IDENTIFIER_COLUMNS[channel]: identifier,
+            'code_hash': hash_code(channel, identifier, code),
+            'name': name,
+            'type': channel,
+            'expires_at': (datetime.now(timezone.utc) + ttl).isoformat()
+        }, returning=ReturnMethod.minimal).execute()
+        return {'channel': channel, 'identifier': identifier, 'name': name}
+
+    async def consume_and_login(self, channel: str, identifier: str, code: str, refresh_jti: str,
+                                refresh_expires_at: datetime, device_info: Optional[Dict] = None) -> Optional[Dict]:
+        """See DatabaseOTPStore.consume_and_login."""
+        # rpc() is itself a coroutine in postgrest 0.10
+        query = await self.client.rpc('verify_otp_login', {
+            'p_code_hash': hash_code(channel, identifier, code),
+            'p_channel': channel,
+            'p_identifier': identifier,
+            'p_refresh_jti': refresh_jti,
+            'p_refresh_expires_at': refresh_expires_at.isoformat(),
+            'p_device_info': device_info
+        })
+        result = await query.execute()
+        if not result.data:
+            return None
+        row = result.data[0]
+        return {
+            'user': row['app_user'],
+            'session_id': row['session_id'],
+            'refresh_token': row['refresh_token']
+        }
+
+    async def discard(self, channel: str, identifier: str, code: str):
+        await self.client.table('verification_codes').delete(returning=ReturnMethod.minimal).eq(
+            'code_hash', hash_code(channel, identifier, code)
+        ).eq('verified', False).execute()
+
+    async def discard_all(self, channel: str, identifier: str):
+        await self.client.table('verification_codes').delete(returning=ReturnMethod.minimal).eq(
+            CODE_IDENTIFIER_COLUMNS[channel], identifier
+        ).eq('verified', False).execute()
@@ -0,0 +1,173 @@
+# auth/aio/routes.py
+import asyncio
+import time
+import uuid
+from typing import Callable, Dict, Optional
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from .. import metrics
+from ..config import Config
+from ..utils.rate_limiter import RateLimitDecision, log_attempt, rate_limiter
+from ..utils.structured_logging import begin_request, debug_requested, end_request
+from ..utils.validators import validate_email, validate_idempotency_key, validate_phone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Same request and response shapes as routes/email_auth.py and routes/phone_auth.py
+
+async def _json_body(request: Request) -> Optional[Dict]:
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+async def _hit(identifier: str) -> RateLimitDecision:
+    if Config.RATE_LIMIT_BACKEND == 'shared':
+        # Shared store calls are network round trips; keep them off the event loop
+        return await asyncio.to_thread(rate_limiter.hit, identifier)
+    return rate_limiter.hit(identifier)
+
+def _error(message: str, status: int) -> JSONResponse:
+    return JSONResponse({'status': 'error', 'message': message}, status_code=status)
+
+def _rate_limited(limit: RateLimitDecision) -> JSONResponse:
+    return JSONResponse({
+        'status': 'error',
+        'message': f'Too many attempts. Please try again in {limit.wait_time} seconds',
+        'remaining_attempts': 0,
+        'wait_time': limit.wait_time
+    }, status_code=429, headers={'Retry-After': str(limit.wait_time)})
+
+async def _register(request: Request, channel: str) -> JSONResponse:
+    data = await _json_body(request)
+    if data is None:
+        return _error('Invalid JSON body', 400)
+    field, valid = ('email', validate_email) if channel == 'email' else ('phone', validate_phone)
+    identifier = data.get(field)
+    name = data.get('name', '')
+
+    if not identifier or not valid(identifier):
+        return _error('Invalid email format' if channel == 'email' else 'Invalid phone number format', 400)
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None and not validate_idempotency_key(idempotency_key):
+        return _error('Invalid Idempotency-Key header', 400)
+
+    service = request.app.state.auth_service
+    # A repeat of a registration that just succeeded is not a new attempt
+    replay = await service.recent_registration(channel, identifier, idempotency_key)
+    if replay is not None:
+        return JSONResponse({
+            'status': 'success',
+            'message': replay[1],
+            'data': replay[2],
+            'remaining_attempts': None
+        })
+
+    limit = await _hit(identifier)
+    if not limit.allowed:
+        return _rate_limited(limit)
+
+    if channel == 'email':
+        success, message, result = await service.register_with_email(identifier, name, idempotency_key)
+    else:
+        success, message, result = await service.register_with_phone(identifier, name, idempotency_key)
+
+    log_attempt(identifier, request.client.host if request.client else '', success)
+
+    return JSONResponse({
+        'status': 'success' if success else 'error',
+        'message': message,
+        'data': result,
+        'remaining_attempts': limit.remaining if not success else None
+    }, status_code=200 if success else 400)
+
+async def _verify(request: Request, channel: str) -> JSONResponse:
+    data = await _json_body(request)
+    if data is None:
+        return _error('Invalid JSON body', 400)
+    field = 'email' if channel == 'email' else 'phone'
+    identifier = data.get(field)
+    otp = data.get('otp')
+
+    if not identifier or not otp:
+        return _error('Email and OTP are required' if channel == 'email'
+                      else 'Phone number and OTP are required', 400)
+    if channel == 'phone' and not validate_phone(identifier):
+        return _error('Invalid phone number format', 400)
+
+    service = request.app.state.auth_service
+    if channel == 'email':
+        success, message, result = await service.verify_otp(identifier, otp)
+    else:
+        success, message, result = await service.verify_phone_otp(identifier, otp)
+
+    return JSONResponse({
+        'status': 'success' if success else 'error',
+        'message': message,
+        'data': result
+    }, status_code=200 if success else 400)
+
+async def _delivery_status(request: Request, channel: str) -> JSONResponse:
+    service = request.app.state.auth_service
+    result = await service.get_delivery_status(channel, request.path_params['delivery_id'])
+    if not result:
+        return _error('Delivery not found', 404)
+    return JSONResponse({'status': 'success', 'data': result})
+
+async def email_register(request: Request) -> JSONResponse:
+    return await _register(request, 'email')
+
+async def email_verify(request: Request) -> JSONResponse:
+    """Verify email verification code."""
+    return await _verify(request, 'email')
+
+async def email_delivery_status(request: Request) -> JSONResponse:
+    """Get verification code delivery status."""
+    return await _delivery_status(request, 'email')
+
+async def phone_register(request: Request) -> JSONResponse:
+    return await _register(request, 'phone')
+
+async def phone_verify(request: Request) -> JSONResponse:
+    """Verify phone OTP."""
+    return await _verify(request, 'phone')
+
+async def phone_delivery_status(request: Request) -> JSONResponse:
+    """Get verification code delivery status."""
+    return await _delivery_status(request, 'phone')
+
+def _timed_route(path: str, endpoint: Callable, methods) -> Route:
+    """Route with the request ID, debug sampling and latency metric of the Flask routes."""
+    async def timed(request: Request) -> JSONResponse:
+        started = time.perf_counter()
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        log_context = begin_request(request_id, debug_requested(
+            request.headers.get('X-Debug-Log'), Config.LOG_DEBUG_TOKEN, Config.LOG_DEBUG_SAMPLE_RATE
+        ))
+        try:
+            response = await endpoint(request)
+            duration = time.perf_counter() - started
+            metrics.REQUEST_LATENCY.labels(request.method, path, response.status_code).observe(duration)
+            logger.debug("Request handled", extra={
+                'method': request.method,
+                'endpoint': path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2)
+            })
+        finally:
+            end_request(log_context)
+        response.headers['X-Request-ID'] = request_id
+        return response
+    return Route(path, timed, methods=methods)
+
+routes = [
+    _timed_route('/auth/email/register', email_register, methods=['POST']),
+    _timed_route('/auth/email/verify', email_verify, methods=['POST']),
+    _timed_route('/auth/email/delivery/{delivery_id}', email_delivery_status, methods=['GET']),
+    _timed_route('/auth/phone/register', phone_register, methods=['POST']),
+    _timed_route('/auth/phone/verify', phone_verify, methods=['POST']),
+    _timed_route('/auth/phone/delivery/{delivery_id}', phone_delivery_status, methods=['GET']),
+]
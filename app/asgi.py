@@ -0,0 +1,34 @@
+# auth/asgi.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from . import create_app
+from .config import Config
+from .aio import create_async_auth_service
+from .aio.clients import create_postgrest_client
+from .aio.routes import routes
+
+def create_asgi_app() -> Starlette:
+    """ASGI app: OTP flows run on the event loop, every other
+    endpoint is served by the Flask app on a thread pool."""
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        # Shared counter stores and the in-memory OTP store are sync; they run on this pool
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(
+            max_workers=Config.ASGI_BLOCKING_THREADS, thread_name_prefix='asgi-blocking'
+        ))
+        # Async clients bind to the running loop, so build them on startup
+        app.state.auth_service = create_async_auth_service(create_postgrest_client())
+        yield
+        await app.state.auth_service.close()
+
+    return Starlette(
+        routes=routes + [Mount('/', app=WSGIMiddleware(create_app()))],
+        lifespan=lifespan
+    )
+
+app = create_asgi_app()
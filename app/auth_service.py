@@ -1,146 +1,231 @@
 # auth/auth_service.py
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Tuple, Optional
+from typing import Callable, Dict, Tuple, Optional
 import logging
-from .config import supabase_client, Config
-from .email_service import EmailService
+from . import metrics
+from .config import Config
+from .delivery import delivery_pipeline, public_error
+from .otp_store import DatabaseOTPStore, otp_store
+from .repositories import repositories
 from .token_manager import TokenManager
 from .session_manager import SessionManager
-import requests
-import pytz
-from flask import current_app
+from .user_filter import user_filter
+from .utils.counter_store import create_counter_store
+from .utils.otp_attempts import OTPAttemptLimiter
+from .utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+MESSAGE_KINDS = {'email': 'email', 'phone': 'SMS'}
+TOO_MANY_GUESSES = "Too many incorrect codes. Please request a new code"
+
+# Concurrent and repeated register requests for one identifier (or one
+# Idempotency-Key) share the first request's code and delivery
+registrations = SingleFlight(
+    create_counter_store(Config.REGISTER_DEDUP_STORE_URL) if Config.REGISTER_DEDUP_STORE_URL else None,
+    prefix='register'
+)
+
+otp_attempts = OTPAttemptLimiter(
+    create_counter_store(Config.OTP_ATTEMPT_STORE_URL),
+    Config.MAX_OTP_ATTEMPTS,
+    Config.OTP_EXPIRY_MINUTES * 60
+)
+
+# Changed when an identifier's pending codes are deleted. Idempotency-Key
+# replay keys include it, so replays of the deleted codes end at once
+registration_generations = create_counter_store(Config.REGISTER_DEDUP_STORE_URL)
+
+def registration_key(channel: str, identifier: str, idempotency_key: Optional[str]) -> Tuple[str, float]:
+    """Single-flight key and replay period for a register request."""
+    if idempotency_key:
+        generation = registration_generation(channel, identifier)
+        return f"{channel}:{identifier}:{generation}:{idempotency_key}", Config.IDEMPOTENCY_KEY_TTL
+    return f"{channel}:{identifier}", Config.REGISTER_DEDUP_WINDOW
+
+def registration_generation(channel: str, identifier: str) -> int:
+    """Current replay generation of the identifier; 0 until its codes are first deleted."""
+    try:
+        return registration_generations.get(f"register-generation:{channel}:{identifier}")
+    except Exception as e:
+        logger.error("Registration generation error: %s", e)
+        return 0  # Replay as before rather than fail the request
+
+def retire_registrations(channel: str, identifier: str):
+    """Stop replaying the identifier's registrations, with or without an Idempotency-Key."""
+    registrations.forget(registration_key(channel, identifier, None)[0])
+    key = f"register-generation:{channel}:{identifier}"
+    try:
+        # A timestamp rather than a count: once the key expires a count would
+        # restart at values that replay keys still in their TTL may use
+        registration_generations.delete(key)
+        registration_generations.incr(key, int(time.time() * 1000), ttl=Config.IDEMPOTENCY_KEY_TTL)
+    except Exception as e:
+        logger.error("Error retiring registration replays: %s", e)
+
+def already_sent(channel: str, identifier: str) -> Tuple[bool, str, Optional[Dict]]:
+    """Response when another worker is handling or has just handled the same registration."""
+    return True, f"Verification {MESSAGE_KINDS[channel]} already sent", {channel: identifier, 'delivery_id': None}
+
 class AuthService:
     def __init__(self):
-        self.supabase = supabase_client
-        self.email_service = EmailService()
+        self.users = repositories.users
+        self.delivery = delivery_pipeline
+        self.otp_store = otp_store
         self.token_manager = TokenManager()
         self.session_manager = SessionManager()
-
-    def register_with_email(self, email: str, name: str) -> Tuple[bool, str, Optional[Dict]]:
-        """Handle email registration."""
+        self.registrations = registrations
+        self.otp_attempts = otp_attempts
+        self.user_filter = user_filter
+
+    def register_with_email(self, email: str, name: str,
+                            idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[Dict]]:
+        """Handle email registration; repeats within the de-duplication window reuse the code sent."""
+        return self._single_flight('email', email, idempotency_key,
+                                   lambda key: self._register_with_email(email, name, key))
+
+    def register_with_phone(self, phone: str, name: str,
+                            idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[Dict]]:
+        """Handle phone registration; repeats within the de-duplication window reuse the code sent."""
+        return self._single_flight('phone', phone, idempotency_key,
+                                   lambda key: self._register_with_phone(phone, name, key))
+
+    def recent_registration(self, channel: str, identifier: str,
+                            idempotency_key: Optional[str] = None) -> Optional[Tuple[bool, str, Optional[Dict]]]:
+        """The response being replayed for a repeat of a registration that just succeeded, or None."""
+        key, _ = registration_key(channel, identifier, idempotency_key)
+        result = self.registrations.recent(key)
+        if result is not None:
+            metrics.REGISTRATIONS_COALESCED.labels(channel, 'replayed').inc()
+        return result
+
+    def _single_flight(self, channel: str, identifier: str, idempotency_key: Optional[str],
+                       register: Callable[[str], Tuple[bool, str, Optional[Dict]]]) -> Tuple[bool, str, Optional[Dict]]:
+        key, ttl = registration_key(channel, identifier, idempotency_key)
+        result, outcome = self.registrations.run(
+            key, lambda: register(key), ttl,
+            keep=lambda result: result[0],
+            duplicate=lambda: already_sent(channel, identifier)
+        )
+        if outcome != 'run':
+            metrics.REGISTRATIONS_COALESCED.labels(channel, outcome).inc()
+        return result
+
+    def _register_with_email(self, email: str, name: str, key: str) -> Tuple[bool, str, Optional[Dict]]:
         try:
             # Check if email exists
-            user = self.supabase.table('users').select('*').eq('email', email).execute()
-            if user.data:
+            with metrics.stage('user_exists'):
+                exists = self._user_exists('email', email)
+            if exists:
                 return False, "Email already registered", None
 
+            self._start_new_code('email', email)
+
             # Generate OTP
             otp = self._generate_otp()
-            
-            # Send verification email
-            if not self.email_service.send_verification(email, otp):
-                return False, "Failed to send verification email", None
 
             # Store verification code
             try:
-                self.supabase.table('verification_codes').insert({
-                    'email': email,
-                    'code': otp,
-                    'name': name,  # Store name for later user creation
-                    'type': 'email',
-                    'expires_at': (datetime.now(pytz.UTC) + timedelta(minutes=Config.OTP_EXPIRY_MINUTES)).isoformat()
-                }).execute()
+                with metrics.stage('otp_save'):
+                    self.otp_store.save('email', email, otp, name, timedelta(minutes=Config.OTP_EXPIRY_MINUTES))
             except Exception as e:
-                logger.error(f"Failed to store verification code: {e}")
+                logger.error("Failed to store verification code: %s", e)
                 return False, "Failed to create verification code", None
 
-            if not self.email_service.send_verification(email, otp):
-                # Cleanup the stored code if email fails
-                self.supabase.table('verification_codes').delete().match({
-                    'email': email,
-                    'code': otp
-                }).execute()
-                return False, "Failed to send verification email", None
+            def cleanup_code():
+                # Cleanup the stored code if email fails, and let a retry send a new one
+                self.otp_store.discard('email', email, otp)
+                self.registrations.forget(key)
+
+            # Deliver verification email in the background
+            delivery_id = self.delivery.enqueue('email', email, otp, on_failure=cleanup_code)
 
-            return True, "Verification email sent", {'email': email}
+            return True, "Verification email queued", {'email': email, 'delivery_id': delivery_id}
 
         except Exception as e:
-            logger.error(f"Email registration error: {e}")
+            logger.error("Email registration error: %s", e)
             return False, str(e), None
 
-    def register_with_phone(self, phone: str, name: str) -> Tuple[bool, str, Optional[Dict]]:
-        """Handle phone registration."""
+    def _register_with_phone(self, phone: str, name: str, key: str) -> Tuple[bool, str, Optional[Dict]]:
         try:
             # Check if phone exists
-            user = self.supabase.table('users').select('*').eq('phone_number', phone).execute()
-            if user.data:
+            with metrics.stage('user_exists'):
+                exists = self._user_exists('phone', phone)
+            if exists:
                 return False, "Phone number already registered", None
 
+            self._start_new_code('phone', phone)
+
             # Generate OTP
             otp = self._generate_otp()
 
-            sms_payload = {
-                'number': phone,
-                'message': f'Your OTP is: {otp}'
-            }
-            
-            # Add request headers
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'User-Agent': 'auth-server/1.0'
-            }
-
-            current_app.logger.info("=== SMS Gateway Request Details ===")
-            current_app.logger.info(f"URL: {Config.SMS_GATEWAY_URL}")
-            current_app.logger.info(f"Headers: {headers}")
-            current_app.logger.info(f"Payload: {sms_payload}")
-
+            # Store verification code
             try:
-                response = requests.post(
-                    Config.SMS_GATEWAY_URL,
-                    json=sms_payload,
-                    headers=headers,
-                    timeout=10
-                )
-                
-                current_app.logger.info("=== SMS Gateway Response Details ===")
-                current_app.logger.info(f"Status Code: {response.status_code}")
-                current_app.logger.info(f"Response Headers: {dict(response.headers)}")
-                current_app.logger.info(f"Response Body: {response.text}")
-
-                # Test request with simpler message
-                test_payload = {
-                    'number': phone,
-                    'message': 'Test message'
-                }
-                
-                current_app.logger.info("=== Making test request ===")
-                test_response = requests.post(
-                    Config.SMS_GATEWAY_URL,
-                    json=test_payload,
-                    headers=headers,
-                    timeout=10
-                )
-                current_app.logger.info(f"Test Status Code: {test_response.status_code}")
-                current_app.logger.info(f"Test Response: {test_response.text}")
-
-                response_data = response.json()
-                if response_data.get('status') != 'success':
-                    return False, f"Failed to send SMS: {response.text}", None
+                with metrics.stage('otp_save'):
+                    self.otp_store.save('phone', phone, otp, name, timedelta(minutes=Config.OTP_EXPIRY_MINUTES))
+            except Exception as e:
+                logger.error("Failed to store verification code: %s", e)
+                return False, "Failed to create verification code", None
 
-                # Store verification code
-                self.supabase.table('verification_codes').insert({
-                    'phone': phone,
-                    'code': otp,
-                    'type': 'phone',
-                    'name': name,
-                    'expires_at': (datetime.now(pytz.UTC) + timedelta(minutes=Config.OTP_EXPIRY_MINUTES)).isoformat()
-                }).execute()
+            def cleanup_code():
+                # Cleanup the stored code if SMS fails, and let a retry send a new one
+                self.otp_store.discard('phone', phone, otp)
+                self.registrations.forget(key)
 
-                return True, "Verification SMS sent", {'phone': phone}
+            # Deliver verification SMS in the background
+            delivery_id = self.delivery.enqueue('phone', phone, otp, on_failure=cleanup_code)
 
-            except requests.exceptions.RequestException as e:
-                current_app.logger.error(f"SMS Gateway Connection Error: {str(e)}")
-                return False, "SMS service connection error", None
+            return True, "Verification SMS queued", {'phone': phone, 'delivery_id': delivery_id}
 
         except Exception as e:
-            current_app.logger.error(f"Phone registration error: {e}")
+            logger.error("Phone registration error: %s", e)
             return False, str(e), None
 
+    def _user_exists(self, channel: str, identifier: str) -> bool:
+        """Ask the database only if the registered-user filter may hold the identifier."""
+        if not self.user_filter.might_exist(channel, identifier):
+            metrics.USER_EXISTS_CHECKS.labels('filtered').inc()
+            return False
+        exists = self.users.exists(channel, identifier)
+        metrics.USER_EXISTS_CHECKS.labels('found' if exists else 'not_found').inc()
+        return exists
+
+    def _start_new_code(self, channel: str, identifier: str):
+        """Give a new code a fresh guess budget; codes that already had wrong guesses are deleted."""
+        if self.otp_attempts.failures(channel, identifier):
+            self.otp_store.discard_all(channel, identifier)
+            self.otp_attempts.reset(channel, identifier)
+
+    def _guess_failed(self, channel: str, identifier: str, attempt: int):
+        if not self.otp_attempts.last(attempt):
+            return
+        # The guesses are used up: delete the pending codes so only a new one can be verified
+        logger.warning("OTP attempts exhausted for %s: %s", channel, identifier)
+        retire_registrations(channel, identifier)
+        try:
+            self.otp_store.discard_all(channel, identifier)
+        except Exception as e:
+            logger.error("Failed to discard verification codes: %s", e)
+
+    def get_delivery_status(self, channel: str, delivery_id: str) -> Optional[Dict]:
+        """Get OTP delivery status for the given channel."""
+        return self.format_delivery(channel, self.delivery.get_status(delivery_id))
+
+    @staticmethod
+    def format_delivery(channel: str, record: Optional[Dict]) -> Optional[Dict]:
+        """Public view of a delivery record; None unless it belongs to the channel."""
+        if not record or record.get('channel') != channel:
+            return None
+        return {
+            'delivery_id': record['id'],
+            'status': record['status'],
+            'attempts': record['attempts'],
+            'last_error': public_error(record.get('last_error')),
+            'created_at': record.get('created_at'),
+            'updated_at': record.get('updated_at')
+        }
+
     def _generate_otp(self) -> str:
         """Generate OTP code."""
         import random
@@ -150,135 +235,90 @@ class AuthService:
     def verify_otp(self, email: str, otp: str) -> Tuple[bool, str, Optional[Dict]]:
         """Verify email OTP."""
         try:
-            now = datetime.now(pytz.UTC)
-            logger.info(f"Verifying OTP for email: {email}")
-
-            # Get verification code
-            result = self.supabase.table('verification_codes').select('*').match({
-                'email': email,
-                'code': otp,
-                'verified': False
-            }).execute()
-
-            if not result.data:
-                logger.warning(f"No verification code found for email: {email}")
-                return False, "Invalid verification code", None
-
-            code_data = result.data[0]
-            
-            # Parse expiry time
-            expires_at = datetime.fromisoformat(code_data['expires_at'])
-            if not expires_at.tzinfo:
-                expires_at = pytz.UTC.localize(expires_at)
-            
-            if expires_at < now:
-                logger.warning(f"Expired code for email: {email}")
-                return False, "Verification code expired", None
-
-            # Update verification status
-            self.supabase.table('verification_codes').update({
-                'verified': True,
-                'verified_at': now.isoformat()
-            }).match({
-                'id': code_data['id']
-            }).execute()
-
-            # Create or update user with required fields
-            user_data = {
-                'email': email,
-                'email_verified': True,
-                'name': code_data.get('name'),
-                'auth_type': 'email',  # Add this line
-                'updated_at': now.isoformat()
-            }
-
-            user_response = self.supabase.table('users').upsert(user_data).execute()
-            if not user_response.data:
-                raise Exception("Failed to create/update user")
-            user = user_response.data[0]
-
-            # Generate access token
-            tokens = self.token_manager.create_tokens(user['id'])
-            
-            # Create session
-            session = self.session_manager.create_session(user['id'])
+            logger.debug("Verifying OTP", extra={'channel': 'email', 'identifier': email})
+
+            attempt = self.otp_attempts.attempt('email', email)
+            if self.otp_attempts.exhausted(attempt):
+                metrics.OTP_VERIFICATIONS.labels('email', 'blocked').inc()
+                return False, TOO_MANY_GUESSES, None
 
-            return True, "Verification successful", {
-                'user': user,
-                'tokens': tokens,
-                'session': session
-            }
+            result = self._verify_and_login('email', email, otp)
+            if not result:
+                logger.warning("No valid verification code found for email: %s", email)
+                metrics.OTP_VERIFICATIONS.labels('email', 'invalid').inc()
+                self._guess_failed('email', email, attempt)
+                return False, "Invalid or expired verification code", None
+
+            self.otp_attempts.reset('email', email)
+            metrics.OTP_VERIFICATIONS.labels('email', 'success').inc()
+            return True, "Verification successful", result
 
         except Exception as e:
-            logger.error(f"OTP verification error: {e}")
+            logger.error("OTP verification error: %s", e)
+            metrics.OTP_VERIFICATIONS.labels('email', 'error').inc()
             return False, str(e), None
-        
+
     def verify_phone_otp(self, phone: str, otp: str) -> Tuple[bool, str, Optional[Dict]]:
         """Verify phone OTP."""
         try:
-            now = datetime.now(pytz.UTC)
-            logger.info(f"Verifying OTP for phone: {phone}")
-
-            # Get verification code
-            result = self.supabase.table('verification_codes').select('*').match({
-                'phone': phone,
-                'code': otp,
-                'verified': False
-            }).execute()
-
-            if not result.data:
-                logger.warning(f"No verification code found for phone: {phone}")
-                return False, "Invalid verification code", None
-
-            code_data = result.data[0]
-            
-            # Parse expiry time
-            expires_at = datetime.fromisoformat(code_data['expires_at'])
-            if not expires_at.tzinfo:
-                expires_at = pytz.UTC.localize(expires_at)
-            
-            if expires_at < now:
-                logger.warning(f"Expired code for phone: {phone}")
-                return False, "Verification code expired", None
-
-            # Update verification status
-            self.supabase.table('verification_codes').update({
-                'verified': True,
-                'verified_at': now.isoformat()
-            }).match({
-                'id': code_data['id']
-            }).execute()
-
-            # Create or update user
-            user_data = {
-                'phone_number': phone,
-                'phone_verified': True,
-                'name': code_data.get('name'),
-                'auth_type': 'phone',  # Note this is 'phone' instead of 'email'
-                'updated_at': now.isoformat()
-            }
-
-            user_response = self.supabase.table('users').upsert(user_data).execute()
-            if not user_response.data:
-                raise Exception("Failed to create/update user")
-            user = user_response.data[0]
-
-            # Generate access token
-            tokens = self.token_manager.create_tokens(user['id'])
-            
-            # Create session
-            session = self.session_manager.create_session(user['id'])
+            logger.debug("Verifying OTP", extra={'channel': 'phone', 'identifier': phone})
 
-            return True, "Verification successful", {
-                'user': user,
-                'tokens': tokens,
-                'session': session
-            }
+            attempt = self.otp_attempts.attempt('phone', phone)
+            if self.otp_attempts.exhausted(attempt):
+                metrics.OTP_VERIFICATIONS.labels('phone', 'blocked').inc()
+                return False, TOO_MANY_GUESSES, None
+
+            result = self._verify_and_login('phone', phone, otp)
+            if not result:
+                logger.warning("No valid verification code found for phone: %s", phone)
+                metrics.OTP_VERIFICATIONS.labels('phone', 'invalid').inc()
+                self._guess_failed('phone', phone, attempt)
+                return False, "Invalid or expired verification code", None
+
+            self.otp_attempts.reset('phone', phone)
+            metrics.OTP_VERIFICATIONS.labels('phone', 'success').inc()
+            return True, "Verification successful", result
 
         except Exception as e:
-            logger.error(f"OTP verification error: {e}")
+            logger.error("OTP verification error: %s", e)
+            metrics.OTP_VERIFICATIONS.labels('phone', 'error').inc()
             return False, str(e), None
-    
+
+    def _verify_and_login(self, channel: str, identifier: str, otp: str) -> Optional[Dict]:
+        """Consume the code, upsert the user, store a refresh token and open a session."""
+        refresh_jti, refresh_expires_at = self.token_manager.new_refresh_token_id()
+
+        if isinstance(self.otp_store, DatabaseOTPStore):
+            # One round trip: the whole sequence runs in a database transaction
+            with metrics.stage('otp_consume_and_login'):
+                login = self.otp_store.consume_and_login(
+                    channel, identifier, otp, refresh_jti, refresh_expires_at
+                )
+            if not login:
+                return None
+            user, session = login['user'], login['session_id']
+            self.session_manager.session_created(user['id'])
+        else:
+            with metrics.stage('otp_consume'):
+                code_data = self.otp_store.consume(channel, identifier, otp)
+            if not code_data:
+                return None
+            with metrics.stage('user_upsert'):
+                user = self._upsert_verified_user(channel, identifier, code_data.get('name'))
+            session = self.session_manager.create_session(user['id'])
+            self.token_manager.store_refresh_token(user['id'], refresh_jti, refresh_expires_at, session)
+        self.user_filter.add(channel, identifier)
+
+        tokens = self.token_manager.sign_tokens(user['id'], refresh_jti, refresh_expires_at, session)
+        return {
+            'user': user,
+            'tokens': tokens,
+            'session': session
+        }
+
+    def _upsert_verified_user(self, channel: str, identifier: str, name: Optional[str]) -> Dict:
+        """Create or update the user for a verified identifier."""
+        return self.users.upsert_verified(channel, identifier, name)
 
     def _get_or_create_user(self, user_data: Dict) -> Dict:
         """Get existing user or create new one."""
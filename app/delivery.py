@@ -0,0 +1,217 @@
+# auth/delivery.py
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Tuple
+from . import metrics
+from .config import Config
+from .email_service import EmailService
+from .repositories import repositories
+from .sms_client import SMSClient
+from .utils.periodic import PeriodicTask
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sender signature: (recipient, otp) -> (success, retryable, error message). A
+# failed send is retried only if retryable, i.e. the message cannot have gone out
+Sender = Callable[[str, str], Tuple[bool, bool, str]]
+
+# Error categories kept in last_error and shown by the status endpoint. The
+# sender's message, which may carry a provider's response body, is only logged.
+DELIVERY_ERRORS = {'provider_unavailable', 'provider_error', 'internal_error'}
+
+def error_category(retryable: bool) -> str:
+    """Category of a failed send: the provider was unreachable or refused it for now, or failed it."""
+    return 'provider_unavailable' if retryable else 'provider_error'
+
+def public_error(last_error: Optional[str]) -> Optional[str]:
+    """last_error as shown to clients; rows written before categories were stored map to provider_error."""
+    if last_error is None or last_error in DELIVERY_ERRORS:
+        return last_error
+    return 'provider_error'
+
+# Stale deliveries failed per query
+RECOVERY_BATCH_SIZE = 100
+
+class DeliveryPipeline:
+    """Deliver OTPs on a worker pool with retries, tracking status per job.
+
+    A failed send is retried only when the sender reports that the message
+    cannot have been accepted; otherwise the delivery fails at once rather
+    than risk sending the same OTP twice.
+
+    ``enqueue`` stores the ``queued`` row before returning its ID, and every
+    status change is written to ``otp_deliveries``, so any worker process can
+    answer status queries. The OTP itself is only held in memory: a job whose
+    process dies is found by ``recover`` once it has had no update for
+    ``stale_after`` seconds and is marked failed, and a job that waited that
+    long in the queue is failed rather than sent.
+    """
+
+    def __init__(self, senders: Dict[str, Sender], workers: int = 4,
+                 max_attempts: int = 3, backoff: float = 1.0, cache_size: int = 10000,
+                 stale_after: float = 300, recovery_interval: float = 60):
+        self.deliveries = repositories.deliveries
+        self.senders = senders
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.cache_size = cache_size
+        self.stale_after = stale_after
+        self.on_abandoned: Optional[Callable[[str, str], None]] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._records: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._recovery = PeriodicTask('delivery-recovery', recovery_interval, self.recover, run_immediately=True)
+
+    def start(self, on_abandoned: Optional[Callable[[str, str], None]] = None):
+        """Start recovering abandoned deliveries in this process; ``on_abandoned(channel, recipient)`` is called for each."""
+        self.on_abandoned = on_abandoned
+        self._recovery.start()
+
+    def enqueue(self, channel: str, recipient: str, otp: str,
+                on_failure: Optional[Callable[[], None]] = None) -> str:
+        """Queue an OTP for delivery and return its delivery ID."""
+        if channel not in self.senders:
+            raise ValueError(f"Unknown delivery channel: {channel}")
+
+        now = datetime.now(timezone.utc).isoformat()
+        record = {
+            'id': str(uuid.uuid4()),
+            'channel': channel,
+            'recipient': recipient,
+            'status': 'queued',
+            'attempts': 0,
+            'last_error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        self._remember(record)
+        self._save(record)
+        self._get_executor().submit(self._deliver, record, otp, on_failure, time.monotonic())
+        return record['id']
+
+    def get_status(self, delivery_id: str) -> Optional[Dict]:
+        """Return the delivery record, from memory if this worker owns it."""
+        with self._lock:
+            record = self._records.get(delivery_id)
+            if record is not None:
+                return dict(record)
+        try:
+            return self.deliveries.get(delivery_id)
+        except Exception as e:
+            logger.error("Error fetching delivery status: %s", e)
+            return None
+
+    def recover(self) -> int:
+        """Fail deliveries left pending by a dead process; returns how many."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after)
+        total = 0
+        while True:
+            rows = self.deliveries.fail_stale(cutoff, RECOVERY_BATCH_SIZE)
+            for row in rows:
+                metrics.OTP_SENDS.labels(row['channel'], 'failed').inc()
+                logger.warning("OTP delivery %s abandoned, marked failed", row['id'])
+                if self.on_abandoned is not None:
+                    try:
+                        self.on_abandoned(row['channel'], row['recipient'])
+                    except Exception as e:
+                        logger.error("Abandoned delivery callback error: %s", e)
+            total += len(rows)
+            if len(rows) < RECOVERY_BATCH_SIZE:
+                return total
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='otp-delivery'
+                )
+            return self._executor
+
+    def _remember(self, record: Dict):
+        with self._lock:
+            self._records[record['id']] = record
+            self._records.move_to_end(record['id'])
+            while len(self._records) > self.cache_size:
+                self._records.popitem(last=False)
+
+    def _update(self, record: Dict, **changes):
+        with self._lock:
+            record.update(changes, updated_at=datetime.now(timezone.utc).isoformat())
+            row = dict(record)
+        self._save(row)
+
+    def _save(self, row: Dict):
+        try:
+            self.deliveries.save(row)
+        except Exception as e:
+            logger.error("Error persisting delivery status: %s", e)
+
+    def _deliver(self, record: Dict, otp: str, on_failure: Optional[Callable[[], None]], queued_at: float):
+        if time.monotonic() - queued_at >= self.stale_after:
+            # Recovery may already have reported it failed, so the code must not go out now
+            logger.warning("OTP delivery %s waited too long in the queue", record['id'])
+            self._fail(record, 'internal_error', on_failure)
+            return
+
+        sender = self.senders[record['channel']]
+        error = ''
+        for attempt in range(1, self.max_attempts + 1):
+            self._update(record, status='sending', attempts=attempt)
+            try:
+                sent, retryable, detail = sender(record['recipient'], otp)
+                error = error_category(retryable)
+            except Exception as e:
+                sent, retryable, detail, error = False, False, str(e), 'internal_error'
+            if sent:
+                metrics.OTP_SENDS.labels(record['channel'], 'delivered').inc()
+                self._update(record, status='delivered', last_error=None)
+                return
+            metrics.OTP_SENDS.labels(record['channel'], 'attempt_failed').inc()
+            logger.warning("OTP delivery %s attempt %s failed: %s", record['id'], attempt, detail)
+            if not retryable:
+                break
+            if attempt < self.max_attempts:
+                self._update(record, status='retrying', last_error=error)
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+        self._fail(record, error, on_failure)
+
+    def _fail(self, record: Dict, error: str, on_failure: Optional[Callable[[], None]]):
+        metrics.OTP_SENDS.labels(record['channel'], 'failed').inc()
+        self._update(record, status='failed', last_error=error)
+        if on_failure is not None:
+            try:
+                on_failure()
+            except Exception as e:
+                logger.error("Delivery failure callback error: %s", e)
+
+def create_delivery_pipeline() -> DeliveryPipeline:
+    """Build the pipeline with the email and SMS senders from Config."""
+    email_service = EmailService()
+    sms_client = SMSClient()
+
+    def send_email(recipient: str, otp: str) -> Tuple[bool, bool, str]:
+        sent, retryable = email_service.send_verification(recipient, otp)
+        return sent, retryable, '' if sent else 'Failed to send verification email'
+
+    def send_sms(recipient: str, otp: str) -> Tuple[bool, bool, str]:
+        return sms_client.send(recipient, f'Your OTP is: {otp}')
+
+    return DeliveryPipeline(
+        {'email': send_email, 'phone': send_sms},
+        workers=Config.DELIVERY_WORKERS,
+        max_attempts=Config.DELIVERY_MAX_ATTEMPTS,
+        backoff=Config.DELIVERY_RETRY_BACKOFF,
+        stale_after=Config.DELIVERY_STALE_AFTER,
+        recovery_interval=Config.DELIVERY_RECOVERY_INTERVAL
+    )
+
+delivery_pipeline = create_delivery_pipeline()
@@ -1,47 +1,157 @@
 # auth/email_service.py
+import queue
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import Optional, Tuple
+from . import metrics
 from .config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+class SMTPConnectionPool:
+    """Pool of authenticated SMTP connections kept alive between sends."""
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str],
+                 use_tls: bool = True, size: int = 4, timeout: float = 10.0, max_idle: float = 60.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def _get_idle(self) -> Optional[smtplib.SMTP]:
+        """Return a live idle connection, discarding stale ones."""
+        while True:
+            try:
+                server, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - released_at < self.max_idle:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except OSError:  # includes SMTPException
+                    pass
+            self._close(server)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is returned to the pool unless the send failed."""
+        self._slots.acquire()
+        server = None
+        try:
+            server = self._get_idle() or self._connect()
+            yield server
+        except Exception:
+            if server is not None:
+                self._close(server)
+                server = None
+            raise
+        finally:
+            if server is not None:
+                self._idle.put((server, time.monotonic()))
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
 class EmailService:
+    _pool: Optional[SMTPConnectionPool] = None
+    _init_lock = threading.Lock()
+
     def __init__(self):
         self.smtp_server = Config.SMTP_SERVER
         self.smtp_port = Config.SMTP_PORT
         self.username = Config.SMTP_USERNAME
         self.password = Config.SMTP_PASSWORD
         self.from_email = Config.SMTP_FROM_EMAIL
+        self.pool = self._shared_pool()
 
-    def send_verification(self, to_email: str, otp: str) -> bool:
-        """Send verification email with OTP."""
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            msg['Subject'] = "Your Verification Code"
-
-            body = f"""
-            <html>
-              <body>
-                <h2>Verification Code</h2>
-                <p>Your verification code is: <strong>{otp}</strong></p>
-                <p>This code will expire in {Config.OTP_EXPIRY_MINUTES} minutes.</p>
-                <p>If you didn't request this code, please ignore this email.</p>
-              </body>
-            </html>
-            """
-            msg.attach(MIMEText(body, 'html'))
-
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.username, self.password)
-                server.send_message(msg)
+    @classmethod
+    def _shared_pool(cls) -> SMTPConnectionPool:
+        # One pool per process, shared by every EmailService instance
+        with cls._init_lock:
+            if cls._pool is None:
+                cls._pool = SMTPConnectionPool(
+                    Config.SMTP_SERVER,
+                    Config.SMTP_PORT,
+                    Config.SMTP_USERNAME,
+                    Config.SMTP_PASSWORD,
+                    use_tls=Config.SMTP_USE_TLS,
+                    size=Config.SMTP_POOL_SIZE,
+                    timeout=Config.SMTP_TIMEOUT
+                )
+            return cls._pool
 
-            return True
+    def _build_verification(self, to_email: str, otp: str) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = to_email
+        msg['Subject'] = "Your Verification Code"
 
+        body = f"""
+        <html>
+          <body>
+            <h2>Verification Code</h2>
+            <p>Your verification code is: <strong>{otp}</strong></p>
+            <p>This code will expire in {Config.OTP_EXPIRY_MINUTES} minutes.</p>
+            <p>If you didn't request this code, please ignore this email.</p>
+          </body>
+        </html>
+        """
+        msg.attach(MIMEText(body, 'html'))
+        return msg
+
+    def send_verification(self, to_email: str, otp: str) -> Tuple[bool, bool]:
+        """Send verification email with OTP; returns (success, retryable).
+
+        ``retryable`` is set only when the server cannot have accepted the
+        message: no connection could be made, or it refused the message with
+        a transient (4xx) reply. A connection lost mid-send is not retryable,
+        since the message may already have been queued for delivery.
+        """
+        msg = self._build_verification(to_email, otp)
+        connected = False
+        try:
+            with metrics.dependency('smtp', 'send'), self.pool.connection() as server:
+                connected = True
+                server.send_message(msg)
+            return True, False
+        except smtplib.SMTPRecipientsRefused as e:
+            logger.error("Failed to send verification email: %s", e)
+            return False, all(400 <= code < 500 for code, _ in e.recipients.values())
+        except smtplib.SMTPResponseException as e:
+            logger.error("Failed to send verification email: %s", e)
+            return False, not connected or 400 <= e.smtp_code < 500
         except Exception as e:
-            logger.error(f"Failed to send verification email: {e}")
-            return False
\ No newline at end of file
+            logger.error("Failed to send verification email: %s", e)
+            return False, not connected
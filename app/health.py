@@ -0,0 +1,138 @@
+# auth/health.py
+import smtplib
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Callable, Dict
+from urllib.parse import urlparse
+from .config import Config, supabase_client
+from .utils.periodic import PeriodicTask
+import logging
+
+logger = logging.getLogger(__name__)
+
+class HealthChecker:
+    """Pings dependencies on a background thread and caches the results.
+
+    Each check is a callable that raises on failure; it runs with a
+    ``timeout`` and the last outcome is kept with its time and latency.
+    Readiness needs every critical check to have passed within
+    ``stale_after`` seconds; failing non-critical checks only mark the
+    service as degraded.
+    """
+
+    def __init__(self, checks: Dict[str, Callable[[], None]], critical: set,
+                 interval: float = 15, timeout: float = 2):
+        self.checks = checks
+        self.critical = critical
+        self.timeout = timeout
+        self.stale_after = 3 * interval
+        self._results: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._first_run = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=len(checks) or 1, thread_name_prefix='health-check')
+        self._task = PeriodicTask('health-checker', interval, self.run, run_immediately=True)
+
+    def run(self):
+        """Run every check once, in parallel, and store the outcomes."""
+        futures = {name: self._executor.submit(self._timed, check) for name, check in self.checks.items()}
+        wait(futures.values(), timeout=self.timeout)
+        now = datetime.now(timezone.utc)
+        results = {}
+        for name, future in futures.items():
+            if future.done():
+                results[name] = dict(future.result(), checked_at=now.isoformat(), _at=time.monotonic())
+            else:
+                results[name] = {
+                    'ok': False,
+                    'latency_ms': None,
+                    'error': f'timed out after {self.timeout}s',
+                    'checked_at': now.isoformat(),
+                    '_at': time.monotonic()
+                }
+        with self._lock:
+            self._results = results
+        self._first_run.set()
+
+    @staticmethod
+    def _timed(check: Callable[[], None]) -> Dict:
+        start = time.perf_counter()
+        try:
+            check()
+            error = None
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+        return {
+            'ok': error is None,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+            'error': error
+        }
+
+    def snapshot(self) -> Dict:
+        """Cached readiness: ``{'ready', 'status', 'checks'}``."""
+        self._task.start()
+        # The first probe after startup waits for the first round of checks
+        self._first_run.wait(self.timeout + 1)
+        with self._lock:
+            results = dict(self._results)
+
+        now = time.monotonic()
+        checks = {}
+        for name in self.checks:
+            result = results.get(name)
+            if result is None:
+                checks[name] = {'ok': False, 'latency_ms': None, 'error': 'not checked yet', 'checked_at': None}
+                continue
+            result = {k: v for k, v in result.items() if k != '_at'}
+            if now - results[name]['_at'] > self.stale_after:
+                result.update(ok=False, error='result is stale')
+            checks[name] = result
+
+        ready = all(checks[name]['ok'] for name in self.critical if name in checks)
+        degraded = not all(check['ok'] for check in checks.values())
+        return {
+            'ready': ready,
+            'status': 'unavailable' if not ready else 'degraded' if degraded else 'ready',
+            'checks': checks
+        }
+
+def _check_supabase():
+    supabase_client.table('users').select('id').limit(1).execute()
+
+def _check_database():
+    from .repositories import repositories
+    # Any indexed lookup exercises the pool and a live connection
+    repositories.users.exists('email', '')
+
+def _check_smtp():
+    server = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT, timeout=Config.HEALTH_CHECK_TIMEOUT)
+    try:
+        server.noop()
+        server.quit()
+    finally:
+        server.close()
+
+def _check_sms_gateway():
+    # A TCP connect only: any request to the gateway could send a message
+    url = urlparse(Config.SMS_GATEWAY_URL or '')
+    if not url.hostname:
+        raise ValueError('SMS_GATEWAY_URL is not set')
+    port = url.port or (443 if url.scheme == 'https' else 80)
+    socket.create_connection((url.hostname, port), timeout=Config.HEALTH_CHECK_TIMEOUT).close()
+
+def create_health_checker() -> HealthChecker:
+    """Checks for the configured dependencies; the data store is critical."""
+    if Config.DATA_BACKEND == 'postgres':
+        checks = {'database': _check_database}
+    else:
+        checks = {'supabase': _check_supabase}
+    critical = set(checks)
+    if Config.SMTP_SERVER:
+        checks['smtp'] = _check_smtp
+    if Config.SMS_GATEWAY_URL:
+        checks['sms_gateway'] = _check_sms_gateway
+    return HealthChecker(checks, critical, Config.HEALTH_CHECK_INTERVAL, Config.HEALTH_CHECK_TIMEOUT)
+
+health_checker = create_health_checker()
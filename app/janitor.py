@@ -0,0 +1,108 @@
+# auth/janitor.py
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+from . import metrics
+from .config import Config
+from .repositories import repositories
+from .utils.periodic import PeriodicTask
+import logging
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'retention-janitor'
+
+class RetentionJanitor:
+    """Deletes expired and ended rows in bounded batches.
+
+    Every worker runs the task, but only the holder of a cluster-wide lease
+    purges; the others return at once. Each target is purged ``batch_size``
+    rows at a time with a ``pause`` between batches so that no DELETE holds
+    locks for long, and the lease is renewed before every batch; a worker that
+    loses it stops purging. A holder that dies keeps the lease for at most
+    ``lease_ttl`` seconds.
+    """
+
+    def __init__(self, retention: Dict[str, timedelta], interval: float, batch_size: int,
+                 pause: float, lease_ttl: int):
+        self.maintenance = repositories.maintenance
+        self.retention = retention
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lease_ttl = lease_ttl
+        self._instance = uuid.uuid4().hex[:8]
+        self._held = False
+        self._task = PeriodicTask('retention-janitor', interval, self.run, on_stop=self.release)
+
+    @property
+    def holder(self) -> str:
+        # Includes the pid so that processes forked after import never share a lease
+        return f"{socket.gethostname()}:{os.getpid()}:{self._instance}"
+
+    def start(self):
+        self._task.start()
+
+    def run(self) -> Dict[str, int]:
+        """Purge every target once if this process holds the lease; returns rows deleted per target."""
+        if not self._renew():
+            return {}
+        started = time.monotonic()
+        purged = {}
+        for target, period in self.retention.items():
+            if not self._renew():
+                break
+            purged[target] = self._purge(target, datetime.now(timezone.utc) - period)
+        logger.info("Retention run finished", extra={
+            'purged': purged,
+            'total': sum(purged.values()),
+            'duration_ms': round((time.monotonic() - started) * 1000, 1)
+        })
+        return purged
+
+    def _purge(self, target: str, cutoff: datetime) -> int:
+        total = 0
+        while True:
+            try:
+                deleted = self.maintenance.purge(target, cutoff, self.batch_size)
+            except Exception as e:
+                logger.error("Error purging %s: %s", target, e)
+                break
+            total += deleted
+            metrics.RETENTION_PURGED.labels(target).inc(deleted)
+            if deleted < self.batch_size:
+                break
+            time.sleep(self.pause)
+            # A long backlog can outlast the lease; another worker may have taken it over
+            if not self._renew():
+                logger.warning("Retention lease lost while purging %s", target)
+                break
+        return total
+
+    def _renew(self) -> bool:
+        try:
+            self._held = self.maintenance.acquire_lease(LEASE_NAME, self.holder, self.lease_ttl)
+        except Exception as e:
+            logger.error("Error acquiring retention lease: %s", e)
+            self._held = False
+        return self._held
+
+    def release(self):
+        """Give up the lease so another worker can take over without waiting for it to expire."""
+        if not self._held:
+            return
+        try:
+            self.maintenance.release_lease(LEASE_NAME, self.holder)
+        except Exception as e:
+            logger.error("Error releasing retention lease: %s", e)
+        self._held = False
+
+retention_janitor = RetentionJanitor(
+    Config.RETENTION_PERIODS,
+    Config.RETENTION_INTERVAL,
+    Config.RETENTION_BATCH_SIZE,
+    Config.RETENTION_BATCH_PAUSE,
+    Config.RETENTION_LEASE_TTL
+)
@@ -0,0 +1,67 @@
+# auth/metrics.py
+"""Prometheus metrics for requests, internal stages and external calls.
+
+With PROMETHEUS_MULTIPROC_DIR set (before this module is imported) every
+worker process writes its samples to that directory and ``render`` merges
+them, so /metrics returns the same totals whichever worker answers.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+REQUEST_LATENCY = Histogram(
+    'auth_request_duration_seconds', 'HTTP request latency by endpoint',
+    ['method', 'endpoint', 'status']
+)
+STAGE_LATENCY = Histogram(
+    'auth_stage_duration_seconds', 'Latency of steps within a request', ['stage']
+)
+DEPENDENCY_LATENCY = Histogram(
+    'auth_dependency_duration_seconds', 'Latency of calls to external services',
+    ['dependency', 'operation']
+)
+OTP_SENDS = Counter('auth_otp_sends_total', 'OTP delivery attempts by outcome', ['channel', 'result'])
+OTP_VERIFICATIONS = Counter('auth_otp_verifications_total', 'OTP verifications by outcome', ['channel', 'result'])
+REGISTRATIONS_COALESCED = Counter(
+    'auth_registrations_coalesced_total', 'Register requests answered without sending a new code',
+    ['channel', 'outcome']
+)
+USER_EXISTS_CHECKS = Counter(
+    'auth_user_exists_checks_total', 'Registration existence checks by how they were answered', ['result']
+)
+RATE_LIMIT_REJECTIONS = Counter('auth_rate_limit_rejections_total', 'Attempts rejected by the rate limiter')
+PROVIDER_FAILURES = Counter('auth_provider_failures_total', 'Failed calls to external providers', ['provider'])
+RETENTION_PURGED = Counter('auth_retention_purged_total', 'Rows deleted by the retention janitor', ['target'])
+
+@contextmanager
+def stage(name: str):
+    """Time a step of request handling."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+@contextmanager
+def dependency(name: str, operation: str):
+    """Time a call to an external service; an exception counts as a provider failure."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        PROVIDER_FAILURES.labels(name).inc()
+        raise
+    finally:
+        DEPENDENCY_LATENCY.labels(name, operation).observe(time.perf_counter() - start)
+
+def render() -> Tuple[bytes, str]:
+    """Exposition body and content type, merged across processes when multiprocess mode is on."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,125 @@
+# auth/otp_store.py
+import hashlib
+import heapq
+import hmac
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from .config import Config
+from .repositories import repositories
+import logging
+
+logger = logging.getLogger(__name__)
+
+def hash_code(channel: str, identifier: str, code: str) -> str:
+    """Keyed digest of (channel, identifier, code) used as the lookup key."""
+    message = f"{channel}:{identifier}:{code}".encode()
+    return hmac.new(Config.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+class MemoryOTPStore:
+    """Process-local OTP store with TTL expiry, for single-node and local use."""
+
+    def __init__(self):
+        self._codes: Dict[str, Tuple[Dict, float]] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def save(self, channel: str, identifier: str, code: str, name: Optional[str], ttl: timedelta) -> Dict:
+        """Store a code; returns the stored record."""
+        key = hash_code(channel, identifier, code)
+        expires = time.monotonic() + ttl.total_seconds()
+        record = {
+            'id': str(uuid.uuid4()),
+            'channel': channel,
+            'identifier': identifier,
+            'name': name,
+            'expires_at': (datetime.now(timezone.utc) + ttl).isoformat()
+        }
+        with self._lock:
+            self._purge(time.monotonic())
+            self._codes[key] = (record, expires)
+            heapq.heappush(self._expiry, (expires, key))
+        return record
+
+    def consume(self, channel: str, identifier: str, code: str) -> Optional[Dict]:
+        """Atomically take a valid, unexpired code; returns its record or None."""
+        key = hash_code(channel, identifier, code)
+        with self._lock:
+            entry = self._codes.pop(key, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def discard(self, channel: str, identifier: str, code: str):
+        with self._lock:
+            self._codes.pop(hash_code(channel, identifier, code), None)
+
+    def discard_all(self, channel: str, identifier: str):
+        """Drop every pending code of the identifier."""
+        with self._lock:
+            for key in [k for k, (record, _) in self._codes.items()
+                        if record['channel'] == channel and record['identifier'] == identifier]:
+                del self._codes[key]
+
+    def _purge(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, key = heapq.heappop(self._expiry)
+            entry = self._codes.get(key)
+            if entry is not None and entry[1] == expires:
+                del self._codes[key]
+
+class DatabaseOTPStore:
+    """OTP store on verification_codes, keyed by the indexed code_hash column."""
+
+    def __init__(self):
+        self.codes = repositories.verification_codes
+
+    def save(self, channel: str, identifier: str, code: str, name: Optional[str], ttl: timedelta) -> Dict:
+        """Store a code; returns the stored record."""
+        self.codes.insert(channel, identifier, hash_code(channel, identifier, code), name,
+                          datetime.now(timezone.utc) + ttl)
+        return {'channel': channel, 'identifier': identifier, 'name': name}
+
+    def consume(self, channel: str, identifier: str, code: str) -> Optional[Dict]:
+        """Atomically take a valid, unexpired code; returns its record or None."""
+        row = self.codes.consume(hash_code(channel, identifier, code))
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'channel': channel,
+            'identifier': identifier,
+            'name': row.get('name'),
+            'expires_at': row['expires_at']
+        }
+
+    def consume_and_login(self, channel: str, identifier: str, code: str, refresh_jti: str,
+                          refresh_expires_at: datetime, device_info: Optional[Dict] = None) -> Optional[Dict]:
+        """Consume the code, upsert the user, open a session and register the
+        refresh token in one transaction (``verify_otp_login``).
+
+        Returns ``{'user', 'session_id', 'refresh_token'}`` or None if the code
+        is invalid or expired.
+        """
+        return self.codes.verify_and_login(hash_code(channel, identifier, code), channel, identifier,
+                                           refresh_jti, refresh_expires_at, device_info)
+
+    def discard(self, channel: str, identifier: str, code: str):
+        self.codes.discard(hash_code(channel, identifier, code))
+
+    def discard_all(self, channel: str, identifier: str):
+        """Delete every pending code of the identifier."""
+        self.codes.discard_all(channel, identifier)
+
+def create_otp_store(backend: Optional[str] = None):
+    """Build the OTP store configured in Config."""
+    backend = backend or Config.OTP_STORE_BACKEND
+    if backend == 'database':
+        return DatabaseOTPStore()
+    if backend == 'memory':
+        return MemoryOTPStore()
+    raise ValueError(f"Unknown OTP store backend: {backend}")
+
+otp_store = create_otp_store()
@@ -0,0 +1,79 @@
+# auth/repositories/__init__.py
+from typing import Any, NamedTuple, Optional
+from .. import metrics
+from ..config import Config
+from .base import (AttemptRepository, DeliveryRepository, MaintenanceRepository, RefreshTokenRepository,
+                   SessionRepository, UserRepository, VerificationCodeRepository)
+
+class Repositories(NamedTuple):
+    users: UserRepository
+    refresh_tokens: RefreshTokenRepository
+    sessions: SessionRepository
+    attempts: AttemptRepository
+    maintenance: MaintenanceRepository
+    verification_codes: VerificationCodeRepository
+    deliveries: DeliveryRepository
+
+class InstrumentedRepository:
+    """Proxy timing every method call of a repository as a dependency call."""
+
+    def __init__(self, repository: Any, dependency: str, name: str):
+        self._repository = repository
+        self._dependency = dependency
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        method = getattr(self._repository, attr)
+        if not callable(method):
+            return method
+        operation = f"{self._name}.{attr}"
+
+        def call(*args, **kwargs):
+            with metrics.dependency(self._dependency, operation):
+                return method(*args, **kwargs)
+
+        # Later lookups find the wrapper on the instance and skip __getattr__
+        setattr(self, attr, call)
+        return call
+
+def _instrumented(repositories: Repositories, backend: str) -> Repositories:
+    return Repositories(*(InstrumentedRepository(repository, backend, name)
+                          for name, repository in zip(Repositories._fields, repositories)))
+
+def create_repositories(backend: Optional[str] = None, database_url: Optional[str] = None) -> Repositories:
+    """Build the repositories for ``DATA_BACKEND`` ('supabase' or 'postgres')."""
+    backend = backend or Config.DATA_BACKEND
+    if backend == 'postgres':
+        from .postgres import (PostgresAttemptRepository, PostgresDeliveryRepository, PostgresMaintenanceRepository,
+                               PostgresPool, PostgresRefreshTokenRepository, PostgresSessionRepository,
+                               PostgresUserRepository, PostgresVerificationCodeRepository)
+        pool = PostgresPool(
+            database_url or Config.DATABASE_URL,
+            Config.DATABASE_POOL_SIZE,
+            Config.DATABASE_POOL_TIMEOUT
+        )
+        return _instrumented(Repositories(
+            PostgresUserRepository(pool),
+            PostgresRefreshTokenRepository(pool),
+            PostgresSessionRepository(pool),
+            PostgresAttemptRepository(pool),
+            PostgresMaintenanceRepository(pool),
+            PostgresVerificationCodeRepository(pool),
+            PostgresDeliveryRepository(pool)
+        ), backend)
+    if backend != 'supabase':
+        raise ValueError(f"Unknown data backend: {backend}")
+    from .supabase import (SupabaseAttemptRepository, SupabaseDeliveryRepository, SupabaseMaintenanceRepository,
+                           SupabaseRefreshTokenRepository, SupabaseSessionRepository, SupabaseUserRepository,
+                           SupabaseVerificationCodeRepository)
+    return _instrumented(Repositories(
+        SupabaseUserRepository(),
+        SupabaseRefreshTokenRepository(),
+        SupabaseSessionRepository(),
+        SupabaseAttemptRepository(),
+        SupabaseMaintenanceRepository(),
+        SupabaseVerificationCodeRepository(),
+        SupabaseDeliveryRepository()
+    ), backend)
+
+repositories = create_repositories()
@@ -0,0 +1,129 @@
+# auth/repositories/base.py
+from datetime import datetime
+from typing import Dict, List, Optional
+
+class UserRepository:
+    """Persistence of ``users`` rows."""
+
+    def exists(self, channel: str, identifier: str) -> bool:
+        """True if a user with this email (channel 'email') or phone number exists."""
+        raise NotImplementedError
+
+    def upsert_verified(self, channel: str, identifier: str, name: Optional[str]) -> Dict:
+        """Create or update the user for a verified identifier; returns the user row."""
+        raise NotImplementedError
+
+    def list_identifiers(self, after_id: Optional[str], created_since: Optional[datetime], limit: int) -> List[Dict]:
+        """Up to ``limit`` users ordered by id, after ``after_id`` and created at or after
+        ``created_since`` when given; rows hold id, email, phone_number and created_at."""
+        raise NotImplementedError
+
+class RefreshTokenRepository:
+    """Persistence of ``refresh_tokens`` rows, keyed by JTI or token digest."""
+
+    def insert(self, user_id: str, jti: str, expires_at: datetime, session_id: Optional[str] = None):
+        raise NotImplementedError
+
+    def rotate(self, jti: Optional[str], token_digest: Optional[str],
+               new_jti: str, new_expires_at: datetime, session_id: Optional[str] = None) -> Optional[str]:
+        """Revoke a token and register its replacement atomically; returns the owner's user_id.
+
+        The replacement keeps the old token's session, or ``session_id`` if it had none.
+        """
+        raise NotImplementedError
+
+    def is_active(self, jti: Optional[str], token_digest: Optional[str]) -> bool:
+        raise NotImplementedError
+
+    def revoke_all(self, user_id: str):
+        raise NotImplementedError
+
+    def revoke_session(self, session_id: str) -> List[str]:
+        """Revoke the active tokens issued for a session; returns their JTIs."""
+        raise NotImplementedError
+
+    def count_revoked_unexpired(self) -> int:
+        raise NotImplementedError
+
+    def list_revoked(self, revoked_since: Optional[str], unexpired_only: bool, offset: int, limit: int) -> List[Dict]:
+        """A page of revoked tokens (jti, revoked_at) in revoked_at order, revoked at or
+        after ``revoked_since`` when given."""
+        raise NotImplementedError
+
+class SessionRepository:
+    """Persistence of ``user_sessions`` rows."""
+
+    def create(self, user_id: str, device_info: Optional[Dict]) -> Optional[Dict]:
+        """Insert an active session; returns it with id, device_info, started_at, last_activity."""
+        raise NotImplementedError
+
+    def list_active(self, user_id: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def end(self, session_id: str) -> Optional[str]:
+        """End a session; returns its user_id, or None if it does not exist."""
+        raise NotImplementedError
+
+    def end_all(self, user_id: str) -> List[str]:
+        """End every active session of a user; returns the ended session ids."""
+        raise NotImplementedError
+
+    def touch(self, session_ids: List[str], seen_at: List[str]):
+        """Raise last_activity of each session to the matching time."""
+        raise NotImplementedError
+
+class AttemptRepository:
+    """Persistence of ``login_attempts`` rows."""
+
+    def insert_many(self, records: List[Dict]):
+        raise NotImplementedError
+
+class VerificationCodeRepository:
+    """Persistence of ``verification_codes`` rows, looked up by code hash."""
+
+    def insert(self, channel: str, identifier: str, code_hash: str, name: Optional[str], expires_at: datetime):
+        raise NotImplementedError
+
+    def consume(self, code_hash: str) -> Optional[Dict]:
+        """Mark an unverified, unexpired code verified; returns its id, name and expires_at, or None."""
+        raise NotImplementedError
+
+    def verify_and_login(self, code_hash: str, channel: str, identifier: str, refresh_jti: str,
+                         refresh_expires_at: datetime, device_info: Optional[Dict]) -> Optional[Dict]:
+        """Run ``verify_otp_login``; returns ``{'user', 'session_id', 'refresh_token'}`` or None."""
+        raise NotImplementedError
+
+    def discard(self, code_hash: str):
+        raise NotImplementedError
+
+    def discard_all(self, channel: str, identifier: str):
+        """Delete every unverified code of the identifier."""
+        raise NotImplementedError
+
+class DeliveryRepository:
+    """Persistence of ``otp_deliveries`` rows."""
+
+    def save(self, record: Dict):
+        """Insert a delivery record, or update its status, attempts, last_error and updated_at."""
+        raise NotImplementedError
+
+    def get(self, delivery_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def fail_stale(self, cutoff: datetime, limit: int) -> List[Dict]:
+        """Mark up to ``limit`` deliveries pending since before ``cutoff`` as failed; returns their id, channel and recipient."""
+        raise NotImplementedError
+
+class MaintenanceRepository:
+    """Cluster-wide leases and batched retention deletes."""
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: int) -> bool:
+        """Take or renew the named lease; False while another holder's lease is unexpired."""
+        raise NotImplementedError
+
+    def release_lease(self, name: str, holder: str):
+        raise NotImplementedError
+
+    def purge(self, target: str, cutoff: datetime, limit: int) -> int:
+        """Delete up to ``limit`` rows of a purge target older than ``cutoff``; returns the count."""
+        raise NotImplementedError
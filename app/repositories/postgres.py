@@ -0,0 +1,387 @@
+# auth/repositories/postgres.py
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .base import (AttemptRepository, DeliveryRepository, MaintenanceRepository, RefreshTokenRepository,
+                   SessionRepository, UserRepository, VerificationCodeRepository)
+import logging
+
+logger = logging.getLogger(__name__)
+
+USER_COLUMNS = 'id, email, phone_number, name, auth_type, email_verified, phone_verified, created_at, updated_at'
+SESSION_COLUMNS = 'id, device_info, started_at, last_activity'
+DELIVERY_COLUMNS = 'id, channel, recipient, status, attempts, last_error, created_at, updated_at'
+# Lower bound for paging by id
+MIN_UUID = '00000000-0000-0000-0000-000000000000'
+
+# name -> (parameter types, statement); prepared once per connection
+STATEMENTS: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    'user_exists_email': (('text',), "SELECT 1 FROM users WHERE email = $1 LIMIT 1"),
+    'user_exists_phone': (('text',), "SELECT 1 FROM users WHERE phone_number = $1 LIMIT 1"),
+    'user_upsert_email': (('text', 'text'), f"""
+        INSERT INTO users (email, email_verified, name, auth_type, updated_at)
+        VALUES ($1, true, $2, 'email', now())
+        ON CONFLICT (email) DO UPDATE
+            SET email_verified = true, name = EXCLUDED.name,
+                auth_type = EXCLUDED.auth_type, updated_at = EXCLUDED.updated_at
+        RETURNING {USER_COLUMNS}"""),
+    'user_upsert_phone': (('text', 'text'), f"""
+        INSERT INTO users (phone_number, phone_verified, name, auth_type, updated_at)
+        VALUES ($1, true, $2, 'phone', now())
+        ON CONFLICT (phone_number) DO UPDATE
+            SET phone_verified = true, name = EXCLUDED.name,
+                auth_type = EXCLUDED.auth_type, updated_at = EXCLUDED.updated_at
+        RETURNING {USER_COLUMNS}"""),
+    'user_identifiers': (('uuid', 'integer'), """
+        SELECT id, email, phone_number, created_at FROM users
+         WHERE id > $1 ORDER BY id LIMIT $2"""),
+    'user_identifiers_since': (('timestamptz', 'uuid', 'integer'), """
+        SELECT id, email, phone_number, created_at FROM users
+         WHERE created_at >= $1 AND id > $2 ORDER BY id LIMIT $3"""),
+    'refresh_insert': (('uuid', 'uuid', 'timestamptz', 'uuid'),
+                       "INSERT INTO refresh_tokens (user_id, jti, expires_at, session_id) VALUES ($1, $2, $3, $4)"),
+    'refresh_rotate': (('uuid', 'text', 'uuid', 'timestamptz', 'uuid'),
+                       "SELECT user_id FROM rotate_refresh_token($1, $2, $3, $4, $5)"),
+    'refresh_active_jti': (('uuid',), """
+        SELECT 1 FROM refresh_tokens
+         WHERE jti = $1 AND NOT is_revoked AND expires_at > now() LIMIT 1"""),
+    'refresh_active_digest': (('text',), """
+        SELECT 1 FROM refresh_tokens
+         WHERE token_digest = $1 AND NOT is_revoked AND expires_at > now() LIMIT 1"""),
+    'refresh_revoke_all': (('uuid',), """
+        UPDATE refresh_tokens SET is_revoked = true, revoked_at = now()
+         WHERE user_id = $1 AND NOT is_revoked"""),
+    'refresh_revoke_session': (('uuid',), """
+        UPDATE refresh_tokens SET is_revoked = true, revoked_at = now()
+         WHERE session_id = $1 AND NOT is_revoked
+        RETURNING jti"""),
+    'refresh_count_revoked_unexpired': ((), """
+        SELECT count(*) AS count FROM refresh_tokens WHERE is_revoked AND expires_at > now()"""),
+    'refresh_revoked_since': (('timestamptz', 'integer', 'integer'), """
+        SELECT jti, revoked_at FROM refresh_tokens
+         WHERE is_revoked AND revoked_at >= $1
+         ORDER BY revoked_at LIMIT $3 OFFSET $2"""),
+    'refresh_revoked_unexpired_since': (('timestamptz', 'integer', 'integer'), """
+        SELECT jti, revoked_at FROM refresh_tokens
+         WHERE is_revoked AND revoked_at >= $1 AND expires_at > now()
+         ORDER BY revoked_at LIMIT $3 OFFSET $2"""),
+    'session_create': (('uuid', 'jsonb'), f"""
+        INSERT INTO user_sessions (user_id, device_info, is_active, last_activity)
+        VALUES ($1, $2, true, now())
+        RETURNING {SESSION_COLUMNS}"""),
+    'session_list_active': (('uuid',), f"""
+        SELECT {SESSION_COLUMNS} FROM user_sessions
+         WHERE user_id = $1 AND is_active"""),
+    'session_end': (('uuid',), """
+        UPDATE user_sessions SET is_active = false, ended_at = now()
+         WHERE id = $1 RETURNING user_id"""),
+    'session_end_all': (('uuid',), """
+        UPDATE user_sessions SET is_active = false, ended_at = now()
+         WHERE user_id = $1 AND is_active RETURNING id"""),
+    'session_touch': (('uuid[]', 'timestamptz[]'), "SELECT touch_sessions($1, $2)"),
+    'attempt_insert_many': (('text[]', 'text[]', 'boolean[]', 'timestamptz[]'), """
+        INSERT INTO login_attempts (identifier, ip_address, success, created_at)
+        SELECT * FROM unnest($1, $2, $3, $4)"""),
+    'code_insert_email': (('text', 'text', 'text', 'timestamptz'), """
+        INSERT INTO verification_codes (email, code_hash, name, type, expires_at)
+        VALUES ($1, $2, $3, 'email', $4)"""),
+    'code_insert_phone': (('text', 'text', 'text', 'timestamptz'), """
+        INSERT INTO verification_codes (phone, code_hash, name, type, expires_at)
+        VALUES ($1, $2, $3, 'phone', $4)"""),
+    'code_consume': (('text',), """
+        UPDATE verification_codes SET verified = true, verified_at = now()
+         WHERE code_hash = $1 AND verified = false AND expires_at > now()
+        RETURNING id, name, expires_at"""),
+    'code_verify_and_login': (('text', 'text', 'text', 'uuid', 'timestamptz', 'jsonb'), """
+        SELECT app_user, session_id, refresh_token FROM verify_otp_login($1, $2, $3, $4, $5, $6)"""),
+    'code_discard': (('text',), "DELETE FROM verification_codes WHERE code_hash = $1 AND verified = false"),
+    'code_discard_email': (('text',), "DELETE FROM verification_codes WHERE email = $1 AND verified = false"),
+    'code_discard_phone': (('text',), "DELETE FROM verification_codes WHERE phone = $1 AND verified = false"),
+    'delivery_save': (('uuid', 'text', 'text', 'text', 'integer', 'text', 'timestamptz', 'timestamptz'), """
+        INSERT INTO otp_deliveries (id, channel, recipient, status, attempts, last_error, created_at, updated_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+        ON CONFLICT (id) DO UPDATE
+            SET status = EXCLUDED.status, attempts = EXCLUDED.attempts,
+                last_error = EXCLUDED.last_error, updated_at = EXCLUDED.updated_at"""),
+    'delivery_get': (('uuid',), f"SELECT {DELIVERY_COLUMNS} FROM otp_deliveries WHERE id = $1"),
+    'delivery_fail_stale': (('timestamptz', 'integer'),
+                            "SELECT id, channel, recipient FROM fail_stale_deliveries($1, $2)"),
+    'lease_acquire': (('text', 'text', 'integer'), "SELECT acquired FROM acquire_lease($1, $2, $3)"),
+    'lease_release': (('text', 'text'), "SELECT release_lease($1, $2)"),
+    'purge_expired': (('text', 'timestamptz', 'integer'), "SELECT deleted FROM purge_expired($1, $2, $3)"),
+}
+
+class PostgresPool:
+    """Bounded pool of direct Postgres connections with per-connection prepared statements.
+
+    At most ``size`` connections are open per process; callers wait up to
+    ``timeout`` seconds for a free one. The pool is recreated after a fork,
+    so connections are never shared between worker processes.
+    """
+
+    def __init__(self, dsn: str, size: int = 10, timeout: float = 5.0):
+        try:
+            import psycopg2
+            import psycopg2.extensions
+            import psycopg2.pool
+        except ImportError:
+            raise RuntimeError("psycopg2 package is required for the postgres data backend")
+        self._psycopg2 = psycopg2
+        self.dsn = dsn
+        self.size = size
+        self.timeout = timeout
+        self._pool = None
+        self._pid: Optional[int] = None
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+        class _Connection(psycopg2.extensions.connection):
+            prepared: set
+
+        self._connection_factory = _Connection
+
+    def _get_pool(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = self._psycopg2.pool.ThreadedConnectionPool(
+                        0, self.size, self.dsn, connection_factory=self._connection_factory
+                    )
+                    self._slots = threading.BoundedSemaphore(self.size)
+                    if _gevent_patched():
+                        # Blocking libpq calls would stall every greenlet of the worker
+                        self._psycopg2.extensions.set_wait_callback(_gevent_wait_callback)
+                    self._pid = os.getpid()
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success and rolls back on error."""
+        pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection available within {self.timeout}s")
+        conn = None
+        broken = False
+        try:
+            conn = pool.getconn()
+            if not hasattr(conn, 'prepared'):
+                conn.prepared = set()
+            yield conn
+            conn.commit()
+        except Exception:
+            if conn is not None:
+                broken = conn.closed != 0
+                if not broken:
+                    conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                pool.putconn(conn, close=broken)
+            slots.release()
+
+    def execute(self, name: str, params: Sequence[Any] = ()) -> List[Dict]:
+        """Run a named statement from STATEMENTS; returns rows as dicts."""
+        with self.connection() as conn:
+            return self._execute(conn, name, params)
+
+    @staticmethod
+    def _execute(conn, name: str, params: Sequence[Any]) -> List[Dict]:
+        types, statement = STATEMENTS[name]
+        with conn.cursor() as cur:
+            if name not in conn.prepared:
+                parameters = f" ({', '.join(types)})" if types else ''
+                cur.execute(f"PREPARE {name}{parameters} AS {statement}")
+                conn.prepared.add(name)
+            if types:
+                cur.execute(f"EXECUTE {name} ({', '.join(f'%s::{t}' for t in types)})", params)
+            else:
+                cur.execute(f"EXECUTE {name}")
+            if cur.description is None:
+                return []
+            columns = [column.name for column in cur.description]
+            return [
+                {col: _to_json(value) for col, value in zip(columns, row)}
+                for row in cur.fetchall()
+            ]
+
+    def close(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.closeall()
+            self._pool = None
+            self._pid = None
+
+def _gevent_patched() -> bool:
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+def _gevent_wait_callback(conn, timeout=None):
+    """psycopg2 wait callback that lets other greenlets run while waiting on the server."""
+    from gevent.socket import wait_read, wait_write
+    extensions = sys.modules['psycopg2.extensions']
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise sys.modules['psycopg2'].OperationalError(f"Bad result from poll: {state}")
+
+def _to_json(value: Any) -> Any:
+    # Match the shapes PostgREST returns: timestamps as ISO strings
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+class PostgresUserRepository(UserRepository):
+    def __init__(self, pool: PostgresPool):
+        self.pool = pool
+
+    def exists(self, channel: str, identifier: str) -> bool:
+        name = 'user_exists_email' if channel == 'email' else 'user_exists_phone'
+        return bool(self.pool.execute(name, (identifier,)))
+
+    def upsert_verified(self, channel: str, identifier: str, name: Optional[str]) -> Dict:
+        statement = 'user_upsert_email' if channel == 'email' else 'user_upsert_phone'
+        rows = self.pool.execute(statement, (identifier, name))
+        if not rows:
+            raise Exception("Failed to create/update user")
+        return rows[0]
+
+    def list_identifiers(self, after_id: Optional[str], created_since: Optional[datetime], limit: int) -> List[Dict]:
+        if created_since is None:
+            return self.pool.execute('user_identifiers', (after_id or MIN_UUID, limit))
+        return self.pool.execute('user_identifiers_since', (created_since, after_id or MIN_UUID, limit))
+
+class PostgresRefreshTokenRepository(RefreshTokenRepository):
+    def __init__(self, pool: PostgresPool):
+        self.pool = pool
+
+    def insert(self, user_id: str, jti: str, expires_at: datetime, session_id: Optional[str] = None):
+        self.pool.execute('refresh_insert', (user_id, jti, expires_at, session_id))
+
+    def rotate(self, jti: Optional[str], token_digest: Optional[str],
+               new_jti: str, new_expires_at: datetime, session_id: Optional[str] = None) -> Optional[str]:
+        rows = self.pool.execute('refresh_rotate', (jti, token_digest, new_jti, new_expires_at, session_id))
+        return rows[0]['user_id'] if rows else None
+
+    def is_active(self, jti: Optional[str], token_digest: Optional[str]) -> bool:
+        if jti:
+            return bool(self.pool.execute('refresh_active_jti', (jti,)))
+        return bool(self.pool.execute('refresh_active_digest', (token_digest,)))
+
+    def revoke_all(self, user_id: str):
+        self.pool.execute('refresh_revoke_all', (user_id,))
+
+    def revoke_session(self, session_id: str) -> List[str]:
+        return [row['jti'] for row in self.pool.execute('refresh_revoke_session', (session_id,)) if row['jti']]
+
+    def count_revoked_unexpired(self) -> int:
+        return self.pool.execute('refresh_count_revoked_unexpired')[0]['count']
+
+    def list_revoked(self, revoked_since: Optional[str], unexpired_only: bool, offset: int, limit: int) -> List[Dict]:
+        name = 'refresh_revoked_unexpired_since' if unexpired_only else 'refresh_revoked_since'
+        return self.pool.execute(name, (revoked_since or '-infinity', offset, limit))
+
+class PostgresSessionRepository(SessionRepository):
+    def __init__(self, pool: PostgresPool):
+        self.pool = pool
+
+    def create(self, user_id: str, device_info: Optional[Dict]) -> Optional[Dict]:
+        from psycopg2.extras import Json
+        rows = self.pool.execute('session_create', (
+            user_id, Json(device_info) if device_info is not None else None
+        ))
+        return rows[0] if rows else None
+
+    def list_active(self, user_id: str) -> List[Dict]:
+        return self.pool.execute('session_list_active', (user_id,))
+
+    def end(self, session_id: str) -> Optional[str]:
+        rows = self.pool.execute('session_end', (session_id,))
+        return rows[0]['user_id'] if rows else None
+
+    def end_all(self, user_id: str) -> List[str]:
+        return [row['id'] for row in self.pool.execute('session_end_all', (user_id,))]
+
+    def touch(self, session_ids: List[str], seen_at: List[str]):
+        self.pool.execute('session_touch', (session_ids, seen_at))
+
+class PostgresAttemptRepository(AttemptRepository):
+    def __init__(self, pool: PostgresPool):
+        self.pool = pool
+
+    def insert_many(self, records: List[Dict]):
+        self.pool.execute('attempt_insert_many', (
+            [r['identifier'] for r in records],
+            [r['ip_address'] for r in records],
+            [r['success'] for r in records],
+            [r['created_at'] for r in records]
+        ))
+
+class PostgresVerificationCodeRepository(VerificationCodeRepository):
+    def __init__(self, pool: PostgresPool):
+        self.pool = pool
+
+    def insert(self, channel: str, identifier: str, code_hash: str, name: Optional[str], expires_at: datetime):
+        statement = 'code_insert_email' if channel == 'email' else 'code_insert_phone'
+        self.pool.execute(statement, (identifier, code_hash, name, expires_at))
+
+    def consume(self, code_hash: str) -> Optional[Dict]:
+        rows = self.pool.execute('code_consume', (code_hash,))
+        return rows[0] if rows else None
+
+    def verify_and_login(self, code_hash: str, channel: str, identifier: str, refresh_jti: str,
+                         refresh_expires_at: datetime, device_info: Optional[Dict]) -> Optional[Dict]:
+        from psycopg2.extras import Json
+        rows = self.pool.execute('code_verify_and_login', (
+            code_hash, channel, identifier, refresh_jti, refresh_expires_at,
+            Json(device_info) if device_info is not None else None
+        ))
+        if not rows:
+            return None
+        row = rows[0]
+        return {'user': row['app_user'], 'session_id': row['session_id'], 'refresh_token': row['refresh_token']}
+
+    def discard(self, code_hash: str):
+        self.pool.execute('code_discard', (code_hash,))
+
+    def discard_all(self, channel: str, identifier: str):
+        self.pool.execute('code_discard_email' if channel == 'email' else 'code_discard_phone', (identifier,))
+
+class PostgresDeliveryRepository(DeliveryRepository):
+    def __init__(self, pool: PostgresPool):
+        self.pool = pool
+
+    def save(self, record: Dict):
+        self.pool.execute('delivery_save', (
+            record['id'], record['channel'], record['recipient'], record['status'], record['attempts'],
+            record['last_error'], record['created_at'], record['updated_at']
+        ))
+
+    def get(self, delivery_id: str) -> Optional[Dict]:
+        rows = self.pool.execute('delivery_get', (delivery_id,))
+        return rows[0] if rows else None
+
+    def fail_stale(self, cutoff: datetime, limit: int) -> List[Dict]:
+        return self.pool.execute('delivery_fail_stale', (cutoff, limit))
+
+class PostgresMaintenanceRepository(MaintenanceRepository):
+    def __init__(self, pool: PostgresPool):
+        self.pool = pool
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: int) -> bool:
+        return bool(self.pool.execute('lease_acquire', (name, holder, ttl_seconds)))
+
+    def release_lease(self, name: str, holder: str):
+        self.pool.execute('lease_release', (name, holder))
+
+    def purge(self, target: str, cutoff: datetime, limit: int) -> int:
+        rows = self.pool.execute('purge_expired', (target, cutoff, limit))
+        return rows[0]['deleted'] if rows else 0
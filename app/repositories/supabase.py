@@ -0,0 +1,245 @@
+# auth/repositories/supabase.py
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from postgrest.types import CountMethod, ReturnMethod
+from ..config import supabase_client
+from .base import (AttemptRepository, DeliveryRepository, MaintenanceRepository, RefreshTokenRepository,
+                   SessionRepository, UserRepository, VerificationCodeRepository)
+
+SESSION_COLUMNS = 'id,device_info,started_at,last_activity'
+DELIVERY_COLUMNS = 'id,channel,recipient,status,attempts,last_error,created_at,updated_at'
+# verification_codes column holding the identifier for each channel
+CODE_IDENTIFIER_COLUMNS = {'email': 'email', 'phone': 'phone'}
+# Lower bound for paging by id
+MIN_UUID = '00000000-0000-0000-0000-000000000000'
+
+def _identifier_column(channel: str) -> str:
+    return 'email' if channel == 'email' else 'phone_number'
+
+class SupabaseUserRepository(UserRepository):
+    def __init__(self, client=None):
+        self.supabase = client or supabase_client
+
+    def exists(self, channel: str, identifier: str) -> bool:
+        result = self.supabase.table('users').select('id').eq(
+            _identifier_column(channel), identifier
+        ).limit(1).execute()
+        return bool(result.data)
+
+    def upsert_verified(self, channel: str, identifier: str, name: Optional[str]) -> Dict:
+        column = _identifier_column(channel)
+        user_data = {
+            column: identifier,
+            f'{channel}_verified': True,
+            'name': name,
+            'auth_type': channel,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }
+        result = self.supabase.table('users').upsert(user_data, on_conflict=column).execute()
+        if not result.data:
+            raise Exception("Failed to create/update user")
+        return result.data[0]
+
+    def list_identifiers(self, after_id: Optional[str], created_since: Optional[datetime], limit: int) -> List[Dict]:
+        query = self.supabase.table('users').select('id,email,phone_number,created_at').gt('id', after_id or MIN_UUID)
+        if created_since is not None:
+            query = query.gte('created_at', created_since.isoformat())
+        return query.order('id').limit(limit).execute().data
+
+class SupabaseRefreshTokenRepository(RefreshTokenRepository):
+    def __init__(self, client=None):
+        self.supabase = client or supabase_client
+
+    def insert(self, user_id: str, jti: str, expires_at: datetime, session_id: Optional[str] = None):
+        self.supabase.table('refresh_tokens').insert({
+            'user_id': user_id,
+            'jti': jti,
+            'expires_at': expires_at.isoformat(),
+            'session_id': session_id
+        }, returning=ReturnMethod.minimal).execute()
+
+    def rotate(self, jti: Optional[str], token_digest: Optional[str],
+               new_jti: str, new_expires_at: datetime, session_id: Optional[str] = None) -> Optional[str]:
+        result = self.supabase.rpc('rotate_refresh_token', {
+            'p_jti': jti,
+            'p_token_digest': token_digest,
+            'p_new_jti': new_jti,
+            'p_new_expires_at': new_expires_at.isoformat(),
+            'p_session_id': session_id
+        }).execute()
+        return result.data[0]['user_id'] if result.data else None
+
+    def is_active(self, jti: Optional[str], token_digest: Optional[str]) -> bool:
+        query = self.supabase.table('refresh_tokens').select('id')
+        if jti:
+            query = query.eq('jti', jti)
+        else:
+            query = query.eq('token_digest', token_digest)
+        result = query.eq('is_revoked', False).gt(
+            'expires_at', datetime.now(timezone.utc).isoformat()
+        ).limit(1).execute()
+        return bool(result.data)
+
+    def revoke_all(self, user_id: str):
+        self.supabase.table('refresh_tokens').update({
+            'is_revoked': True,
+            'revoked_at': datetime.now(timezone.utc).isoformat()
+        }, returning=ReturnMethod.minimal).match({'user_id': user_id, 'is_revoked': False}).execute()
+
+    def revoke_session(self, session_id: str) -> List[str]:
+        result = self.supabase.table('refresh_tokens').update({
+            'is_revoked': True,
+            'revoked_at': datetime.now(timezone.utc).isoformat()
+        }).match({'session_id': session_id, 'is_revoked': False}).execute()
+        return [row['jti'] for row in result.data if row.get('jti')]
+
+    def count_revoked_unexpired(self) -> int:
+        result = self.supabase.table('refresh_tokens').select('id', count=CountMethod.exact).eq(
+            'is_revoked', True
+        ).gt('expires_at', datetime.now(timezone.utc).isoformat()).limit(1).execute()
+        return result.count or 0
+
+    def list_revoked(self, revoked_since: Optional[str], unexpired_only: bool, offset: int, limit: int) -> List[Dict]:
+        query = self.supabase.table('refresh_tokens').select('jti,revoked_at').eq('is_revoked', True)
+        if revoked_since:
+            query = query.gte('revoked_at', revoked_since)
+        if unexpired_only:
+            query = query.gt('expires_at', datetime.now(timezone.utc).isoformat())
+        # range() takes an exclusive end in postgrest-py 0.10
+        return query.order('revoked_at').range(offset, offset + limit).execute().data
+
+class SupabaseSessionRepository(SessionRepository):
+    def __init__(self, client=None):
+        self.supabase = client or supabase_client
+
+    def create(self, user_id: str, device_info: Optional[Dict]) -> Optional[Dict]:
+        result = self.supabase.table('user_sessions').insert({
+            'user_id': user_id,
+            'device_info': device_info,
+            'is_active': True,
+            'last_activity': datetime.now(timezone.utc).isoformat()
+        }).execute()
+        return result.data[0] if result.data else None
+
+    def list_active(self, user_id: str) -> List[Dict]:
+        result = self.supabase.table('user_sessions').select(SESSION_COLUMNS).match({
+            'user_id': user_id,
+            'is_active': True
+        }).execute()
+        return result.data or []
+
+    def end(self, session_id: str) -> Optional[str]:
+        result = self.supabase.table('user_sessions').update({
+            'is_active': False,
+            'ended_at': datetime.now(timezone.utc).isoformat()
+        }).match({'id': session_id}).execute()
+        return result.data[0]['user_id'] if result.data else None
+
+    def end_all(self, user_id: str) -> List[str]:
+        result = self.supabase.table('user_sessions').update({
+            'is_active': False,
+            'ended_at': datetime.now(timezone.utc).isoformat()
+        }).match({'user_id': user_id, 'is_active': True}).execute()
+        return [row['id'] for row in result.data or []]
+
+    def touch(self, session_ids: List[str], seen_at: List[str]):
+        self.supabase.rpc('touch_sessions', {
+            'p_session_ids': session_ids,
+            'p_seen_at': seen_at
+        }).execute()
+
+class SupabaseAttemptRepository(AttemptRepository):
+    def __init__(self, client=None):
+        self.supabase = client or supabase_client
+
+    def insert_many(self, records: List[Dict]):
+        self.supabase.table('login_attempts').insert(records, returning=ReturnMethod.minimal).execute()
+
+class SupabaseVerificationCodeRepository(VerificationCodeRepository):
+    def __init__(self, client=None):
+        self.supabase = client or supabase_client
+
+    def insert(self, channel: str, identifier: str, code_hash: str, name: Optional[str], expires_at: datetime):
+        self.supabase.table('verification_codes').insert({
+            CODE_IDENTIFIER_COLUMNS[channel]: identifier,
+            'code_hash': code_hash,
+            'name': name,  # Store name for later user creation
+            'type': channel,
+            'expires_at': expires_at.isoformat()
+        }, returning=ReturnMethod.minimal).execute()
+
+    def consume(self, code_hash: str) -> Optional[Dict]:
+        now = datetime.now(timezone.utc).isoformat()
+        # Single conditional UPDATE: only one concurrent caller can flip verified
+        result = self.supabase.table('verification_codes').update({
+            'verified': True,
+            'verified_at': now
+        }).eq('code_hash', code_hash).eq('verified', False).gt('expires_at', now).execute()
+        return result.data[0] if result.data else None
+
+    def verify_and_login(self, code_hash: str, channel: str, identifier: str, refresh_jti: str,
+                         refresh_expires_at: datetime, device_info: Optional[Dict]) -> Optional[Dict]:
+        result = self.supabase.rpc('verify_otp_login', {
+            'p_code_hash': code_hash,
+            'p_channel': channel,
+            'p_identifier': identifier,
+            'p_refresh_jti': refresh_jti,
+            'p_refresh_expires_at': refresh_expires_at.isoformat(),
+            'p_device_info': device_info
+        }).execute()
+        if not result.data:
+            return None
+        row = result.data[0]
+        return {'user': row['app_user'], 'session_id': row['session_id'], 'refresh_token': row['refresh_token']}
+
+    def discard(self, code_hash: str):
+        # Only unverified codes are discarded, which keeps the lookup on the partial code_hash index
+        self.supabase.table('verification_codes').delete(returning=ReturnMethod.minimal).eq(
+            'code_hash', code_hash
+        ).eq('verified', False).execute()
+
+    def discard_all(self, channel: str, identifier: str):
+        self.supabase.table('verification_codes').delete(returning=ReturnMethod.minimal).eq(
+            CODE_IDENTIFIER_COLUMNS[channel], identifier
+        ).eq('verified', False).execute()
+
+class SupabaseDeliveryRepository(DeliveryRepository):
+    def __init__(self, client=None):
+        self.supabase = client or supabase_client
+
+    def save(self, record: Dict):
+        self.supabase.table('otp_deliveries').upsert(record, returning=ReturnMethod.minimal).execute()
+
+    def get(self, delivery_id: str) -> Optional[Dict]:
+        result = self.supabase.table('otp_deliveries').select(DELIVERY_COLUMNS).eq('id', delivery_id).execute()
+        return result.data[0] if result.data else None
+
+    def fail_stale(self, cutoff: datetime, limit: int) -> List[Dict]:
+        result = self.supabase.rpc('fail_stale_deliveries', {
+            'p_cutoff': cutoff.isoformat(),
+            'p_limit': limit
+        }).execute()
+        return result.data or []
+
+class SupabaseMaintenanceRepository(MaintenanceRepository):
+    def __init__(self, client=None):
+        self.supabase = client or supabase_client
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: int) -> bool:
+        result = self.supabase.rpc('acquire_lease', {
+            'p_name': name,
+            'p_holder': holder,
+            'p_ttl_seconds': ttl_seconds
+        }).execute()
+        return bool(result.data)
+
+    def release_lease(self, name: str, holder: str):
+        self.supabase.rpc('release_lease', {'p_name': name, 'p_holder': holder}).execute()
+
+    def purge(self, target: str, cutoff: datetime, limit: int) -> int:
+        result = self.supabase.rpc('purge_expired', {
+            'p_target': target,
+            'p_cutoff': cutoff.isoformat(),
+            'p_limit': limit
+        }).execute()
+        return result.data[0]['deleted'] if result.data else 0
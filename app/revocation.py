@@ -0,0 +1,82 @@
+# auth/revocation.py
+import threading
+import time
+from typing import Optional
+from .config import Config
+from .repositories import repositories
+from .utils.bloom import BloomFilter
+from .utils.periodic import PeriodicTask
+import logging
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+class RevocationFilter:
+    """In-process Bloom filter of revoked refresh token JTIs.
+
+    Built from ``refresh_tokens`` on startup and kept current by polling rows
+    revoked since the last sync (``revoked_at`` cursor). It is rebuilt
+    periodically so expired tokens age out. Until the first load completes,
+    ``ready`` is False and callers must ask the database.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, sync_interval: float, rebuild_interval: float):
+        self.refresh_tokens = repositories.refresh_tokens
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.ready = False
+        self._filter = BloomFilter(capacity, error_rate)
+        self._cursor: Optional[str] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._task = PeriodicTask('revocation-filter', sync_interval, self.sync, run_immediately=True)
+
+    def might_be_revoked(self, jti: str) -> bool:
+        """False means not revoked as of the last sync; True may be a false positive."""
+        self._task.start()
+        return jti in self._filter
+
+    def add(self, jti: str):
+        """Record a revocation made by this process without waiting for a sync."""
+        self._filter.add(jti)
+
+    def sync(self):
+        if (not self.ready or self._filter.saturated
+                or time.monotonic() - self._built_at > self.rebuild_interval):
+            self._rebuild()
+        else:
+            self._cursor = self._load_since(self._filter, self._cursor)
+
+    def _rebuild(self):
+        count = self.refresh_tokens.count_revoked_unexpired()
+        bloom = BloomFilter(max(self.capacity, 2 * count), self.error_rate)
+        cursor = self._load_since(bloom, None, only_unexpired=True)
+        with self._lock:
+            self._filter = bloom
+            self._cursor = cursor
+            self._built_at = time.monotonic()
+            self.ready = True
+        logger.info("Revocation filter rebuilt with %s revoked tokens", bloom.count)
+
+    def _load_since(self, bloom: BloomFilter, cursor: Optional[str], only_unexpired: bool = False) -> Optional[str]:
+        """Add revoked JTIs with revoked_at >= cursor; returns the new cursor."""
+        offset = 0
+        while True:
+            rows = self.refresh_tokens.list_revoked(cursor, only_unexpired, offset, PAGE_SIZE)
+            for row in rows:
+                if row.get('jti'):
+                    bloom.add(row['jti'])
+            if rows:
+                cursor = rows[-1]['revoked_at'] or cursor
+            if len(rows) < PAGE_SIZE:
+                return cursor
+            offset += PAGE_SIZE
+
+revocation_filter = RevocationFilter(
+    Config.REVOCATION_FILTER_CAPACITY,
+    Config.REVOCATION_FILTER_ERROR_RATE,
+    Config.REVOCATION_SYNC_INTERVAL,
+    Config.REVOCATION_REBUILD_INTERVAL
+)
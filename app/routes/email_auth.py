@@ -1,8 +1,8 @@
 # auth/routes/email_auth.py
 from flask import Blueprint, request, jsonify
 from ..auth_service import AuthService
-from ..utils.rate_limiter import check_rate_limit, log_attempt, get_remaining_attempts
-from ..utils.validators import validate_email
+from ..utils.rate_limiter import rate_limiter, log_attempt
+from ..utils.validators import validate_idempotency_key, validate_email
 from ..config import Config
 
 email_auth = Blueprint('email_auth', __name__)
@@ -20,16 +20,34 @@ def register():
             'message': 'Invalid email format'
         }), 400
 
-    if not check_rate_limit(email, request.remote_addr):
-        remaining_time = Config.RATE_LIMIT_WINDOW
+    # Retries carrying the same key get the first response instead of a new code
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None and not validate_idempotency_key(idempotency_key):
         return jsonify({
             'status': 'error',
-            'message': f'Too many attempts. Please try again in {remaining_time} seconds',
+            'message': 'Invalid Idempotency-Key header'
+        }), 400
+
+    # A repeat of a registration that just succeeded is not a new attempt
+    replay = auth_service.recent_registration('email', email, idempotency_key)
+    if replay is not None:
+        return jsonify({
+            'status': 'success',
+            'message': replay[1],
+            'data': replay[2],
+            'remaining_attempts': None
+        }), 200
+
+    limit = rate_limiter.hit(email)
+    if not limit.allowed:
+        return jsonify({
+            'status': 'error',
+            'message': f'Too many attempts. Please try again in {limit.wait_time} seconds',
             'remaining_attempts': 0,
-            'wait_time': remaining_time
-        }), 429
+            'wait_time': limit.wait_time
+        }), 429, {'Retry-After': str(limit.wait_time)}
 
-    success, message, result = auth_service.register_with_email(email, name)
+    success, message, result = auth_service.register_with_email(email, name, idempotency_key)
     
     # Log the attempt
     log_attempt(email, request.remote_addr, success)
@@ -38,7 +56,7 @@ def register():
         'status': 'success' if success else 'error',
         'message': message,
         'data': result,
-        'remaining_attempts': get_remaining_attempts(email) if not success else None
+        'remaining_attempts': limit.remaining if not success else None
     }), 200 if success else 400
 
 @email_auth.route('/verify', methods=['POST'])
@@ -63,3 +81,17 @@ def verify():
         'data': result
     }), 200 if success else 400
 
+@email_auth.route('/delivery/<delivery_id>', methods=['GET'])
+def delivery_status(delivery_id):
+    """Get verification code delivery status."""
+    result = auth_service.get_delivery_status('email', delivery_id)
+    if not result:
+        return jsonify({
+            'status': 'error',
+            'message': 'Delivery not found'
+        }), 404
+
+    return jsonify({
+        'status': 'success',
+        'data': result
+    }), 200
@@ -2,8 +2,8 @@
 from flask import Blueprint, request, jsonify
 from ..auth_service import AuthService
 from ..config import Config
-from ..utils.rate_limiter import check_rate_limit, log_attempt, get_remaining_attempts
-from ..utils.validators import validate_phone
+from ..utils.rate_limiter import rate_limiter, log_attempt
+from ..utils.validators import validate_idempotency_key, validate_phone
 
 phone_auth = Blueprint('phone_auth', __name__)
 auth_service = AuthService()
@@ -21,16 +21,34 @@ def register():
             'message': 'Invalid phone number format'
         }), 400
 
-    if not check_rate_limit(phone, request.remote_addr):
-        remaining_time = Config.RATE_LIMIT_WINDOW
+    # Retries carrying the same key get the first response instead of a new code
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None and not validate_idempotency_key(idempotency_key):
         return jsonify({
             'status': 'error',
-            'message': f'Too many attempts. Please try again in {remaining_time} seconds',
+            'message': 'Invalid Idempotency-Key header'
+        }), 400
+
+    # A repeat of a registration that just succeeded is not a new attempt
+    replay = auth_service.recent_registration('phone', phone, idempotency_key)
+    if replay is not None:
+        return jsonify({
+            'status': 'success',
+            'message': replay[1],
+            'data': replay[2],
+            'remaining_attempts': None
+        }), 200
+
+    limit = rate_limiter.hit(phone)
+    if not limit.allowed:
+        return jsonify({
+            'status': 'error',
+            'message': f'Too many attempts. Please try again in {limit.wait_time} seconds',
             'remaining_attempts': 0,
-            'wait_time': remaining_time
-        }), 429
+            'wait_time': limit.wait_time
+        }), 429, {'Retry-After': str(limit.wait_time)}
 
-    success, message, result = auth_service.register_with_phone(phone, name)
+    success, message, result = auth_service.register_with_phone(phone, name, idempotency_key)
     
     # Log the attempt
     log_attempt(phone, request.remote_addr, success)
@@ -39,7 +57,7 @@ def register():
         'status': 'success' if success else 'error',
         'message': message,
         'data': result,
-        'remaining_attempts': get_remaining_attempts(phone) if not success else None
+        'remaining_attempts': limit.remaining if not success else None
     }), 200 if success else 400
 
 @phone_auth.route('/verify', methods=['POST'])
@@ -74,4 +92,19 @@ def verify():
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@phone_auth.route('/delivery/<delivery_id>', methods=['GET'])
+def delivery_status(delivery_id):
+    """Get verification code delivery status."""
+    result = auth_service.get_delivery_status('phone', delivery_id)
+    if not result:
+        return jsonify({
+            'status': 'error',
+            'message': 'Delivery not found'
+        }), 404
+
+    return jsonify({
+        'status': 'success',
+        'data': result
+    }), 200
@@ -0,0 +1,111 @@
+# auth/routes/token_auth.py
+from flask import Blueprint, g, request, jsonify
+from ..config import Config
+from ..session_manager import SessionManager
+from ..utils.auth_guard import require_auth, token_manager, verify_access_token
+
+token_auth = Blueprint('token_auth', __name__)
+session_manager = SessionManager()
+
+@token_auth.route('/refresh-token', methods=['POST'])
+def refresh_token():
+    """Exchange a refresh token for new tokens."""
+    data = request.json or {}
+    token = data.get('refresh_token')
+
+    if not token:
+        return jsonify({
+            'status': 'error',
+            'message': 'Refresh token is required'
+        }), 400
+
+    try:
+        tokens = token_manager.refresh_access_token(token)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+    if not tokens:
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid or revoked refresh token'
+        }), 401
+
+    return jsonify({
+        'status': 'success',
+        'data': {'tokens': tokens}
+    }), 200
+
+@token_auth.route('/introspect', methods=['POST'])
+def introspect():
+    """Validate a batch of access tokens in one request."""
+    data = request.json or {}
+    tokens = data.get('tokens')
+
+    if not isinstance(tokens, list) or not all(isinstance(t, str) for t in tokens):
+        return jsonify({
+            'status': 'error',
+            'message': 'tokens must be a list of strings'
+        }), 400
+
+    if len(tokens) > Config.INTROSPECT_MAX_BATCH:
+        return jsonify({
+            'status': 'error',
+            'message': f'At most {Config.INTROSPECT_MAX_BATCH} tokens per request'
+        }), 400
+
+    results = []
+    for token in tokens:
+        payload = verify_access_token(token)
+        if payload is None:
+            results.append({'active': False})
+        else:
+            results.append({
+                'active': True,
+                'user_id': payload['user_id'],
+                'exp': payload['exp']
+            })
+
+    return jsonify({
+        'status': 'success',
+        'data': results
+    }), 200
+
+@token_auth.route('/sessions', methods=['GET'])
+@require_auth
+def sessions():
+    """List the caller's active sessions."""
+    return jsonify({
+        'status': 'success',
+        'data': session_manager.get_active_sessions(g.user_id)
+    }), 200
+
+@token_auth.route('/logout', methods=['POST'])
+@require_auth
+def logout():
+    """End the current session, or every session with {"all": true}."""
+    data = request.get_json(silent=True) or {}
+
+    try:
+        if data.get('all'):
+            ended = session_manager.end_all_sessions(g.user_id)
+            token_manager.revoke_user_tokens(g.user_id)
+        elif g.token_payload.get('sid'):
+            # Revoke first: a refresh token must not outlive its session
+            token_manager.revoke_session_tokens(g.token_payload['sid'])
+            session_manager.end_session(g.token_payload['sid'])
+            ended = 1
+        else:
+            ended = 0
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+    return jsonify({
+        'status': 'success',
+        'data': {'sessions_ended': ended}
+    }), 200
@@ -0,0 +1,72 @@
+# auth/session_activity.py
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict
+from .config import Config
+from .repositories import repositories
+from .utils.periodic import PeriodicTask
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ActivityTracker:
+    """Write-behind tracker of session last-activity times.
+
+    ``touch`` only records the time in memory. A session touched again within
+    ``debounce`` seconds is not recorded again, and pending touches are
+    written every ``flush_interval`` seconds in one ``touch_sessions`` call, so
+    writes are bounded by the number of distinct sessions, not by requests.
+    At most ``max_sessions`` sessions are tracked; touches beyond that are
+    dropped until the next flush.
+    """
+
+    def __init__(self, debounce: float, flush_interval: float, max_sessions: int):
+        self.sessions = repositories.sessions
+        self.debounce = debounce
+        self.max_sessions = max_sessions
+        self.dropped = 0
+        self._pending: Dict[str, str] = {}
+        self._recorded: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._task = PeriodicTask('session-activity', flush_interval, self.flush, on_stop=self.flush)
+
+    def touch(self, session_id: str):
+        """Record activity on a session; written on the next flush."""
+        self._task.start()
+        now = time.monotonic()
+        with self._lock:
+            recorded = self._recorded.get(session_id)
+            if recorded is not None and now - recorded < self.debounce:
+                return
+            if session_id not in self._pending and len(self._pending) >= self.max_sessions:
+                self.dropped += 1
+                return
+            self._pending[session_id] = datetime.now(timezone.utc).isoformat()
+            self._recorded[session_id] = now
+            self._recorded.move_to_end(session_id)
+            while len(self._recorded) > self.max_sessions:
+                self._recorded.popitem(last=False)
+
+    def forget(self, session_id: str):
+        """Drop pending activity for a session that has ended."""
+        with self._lock:
+            self._pending.pop(session_id, None)
+            self._recorded.pop(session_id, None)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            self.sessions.touch(list(pending.keys()), list(pending.values()))
+        except Exception as e:
+            logger.error("Error writing activity for %s sessions: %s", len(pending), e)
+
+activity_tracker = ActivityTracker(
+    Config.SESSION_ACTIVITY_DEBOUNCE,
+    Config.SESSION_ACTIVITY_FLUSH_INTERVAL,
+    Config.SESSION_ACTIVITY_MAX_SESSIONS
+)
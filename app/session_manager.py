@@ -1,65 +1,136 @@
 # auth/session_manager.py
-from datetime import datetime, timezone
-from typing import Dict, Optional, List
-from .config import supabase_client
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, List, NamedTuple, Tuple
+from . import metrics
+from .config import Config
+from .repositories import repositories
+from .session_activity import activity_tracker
 import logging
 
 logger = logging.getLogger(__name__)
 
+class SessionRecord(NamedTuple):
+    id: str
+    device_info: Optional[Dict]
+    started_at: Optional[str]
+    last_activity: Optional[str]
+
+class SessionCache:
+    """Bounded LRU of each user's active sessions.
+
+    Entries are replaced or dropped by this process's own session writes and
+    expire after ``ttl`` seconds, which bounds how stale a listing can be when
+    another worker changed the sessions.
+    """
+
+    def __init__(self, max_users: int = 10000, ttl: float = 60):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[Tuple[SessionRecord, ...], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[Tuple[SessionRecord, ...]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, user_id: str, sessions: Tuple[SessionRecord, ...]):
+        with self._lock:
+            self._entries[user_id] = (sessions, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def add(self, user_id: str, record: SessionRecord):
+        """Append a new session to a cached set; uncached users are left alone."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = (entry[0] + (record,), entry[1])
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+session_cache = SessionCache(Config.SESSION_CACHE_SIZE, Config.SESSION_CACHE_TTL)
+
 class SessionManager:
     def __init__(self):
-        self.supabase = supabase_client
+        self.sessions = repositories.sessions
+        self.activity = activity_tracker
+        self.cache = session_cache
 
     def create_session(self, user_id: str, device_info: Dict = None) -> Optional[str]:
         """Create new user session."""
         try:
-            result = self.supabase.table('user_sessions').insert({
-                'user_id': user_id,
-                'device_info': device_info,
-                'is_active': True,
-                'last_activity': datetime.now(timezone.utc).isoformat()
-            }).execute()
-
-            if result.data:
-                return result.data[0]['id']
+            with metrics.stage('session_create'):
+                row = self.sessions.create(user_id, device_info)
+            if row:
+                self.cache.add(user_id, SessionRecord(
+                    row['id'], row.get('device_info'), row.get('started_at'), row.get('last_activity')
+                ))
+                return row['id']
             return None
 
         except Exception as e:
-            logger.error(f"Error creating session: {e}")
+            logger.error("Error creating session: %s", e)
             raise
 
     def get_active_sessions(self, user_id: str) -> List[Dict]:
         """Get all active sessions for user."""
-        try:
-            result = self.supabase.table('user_sessions').select('*').match({
-                'user_id': user_id,
-                'is_active': True
-            }).execute()
+        sessions = self.cache.get(user_id)
+        if sessions is None:
+            try:
+                rows = self.sessions.list_active(user_id)
 
-            return result.data or []
+            except Exception as e:
+                logger.error("Error getting sessions: %s", e)
+                return []
 
-        except Exception as e:
-            logger.error(f"Error getting sessions: {e}")
-            return []
+            sessions = tuple(SessionRecord(
+                row['id'], row.get('device_info'), row.get('started_at'), row.get('last_activity')
+            ) for row in rows)
+            self.cache.put(user_id, sessions)
+
+        return [session._asdict() for session in sessions]
 
     def end_session(self, session_id: str):
         """End a specific session."""
         try:
-            self.supabase.table('user_sessions').update({
-                'is_active': False,
-                'ended_at': datetime.now(timezone.utc).isoformat()
-            }).match({'id': session_id}).execute()
+            user_id = self.sessions.end(session_id)
+            self.activity.forget(session_id)
+            if user_id:
+                self.cache.invalidate(user_id)
 
         except Exception as e:
-            logger.error(f"Error ending session: {e}")
+            logger.error("Error ending session: %s", e)
             raise
 
-    def update_session_activity(self, session_id: str):
-        """Update last activity time for session."""
+    def end_all_sessions(self, user_id: str) -> int:
+        """End every active session of a user in one statement; returns how many were ended."""
         try:
-            self.supabase.table('user_sessions').update({
-                'last_activity': datetime.now(timezone.utc).isoformat()
-            }).match({'id': session_id}).execute()
+            ended = self.sessions.end_all(user_id)
+            self.cache.invalidate(user_id)
+            for session_id in ended:
+                self.activity.forget(session_id)
+            return len(ended)
 
         except Exception as e:
-            logger.error(f"Error updating session: {e}")
\ No newline at end of file
+            logger.error("Error ending sessions: %s", e)
+            raise
+
+    def session_created(self, user_id: str):
+        """Drop cached sessions of a user whose session was opened elsewhere (e.g. an RPC)."""
+        self.cache.invalidate(user_id)
+
+    def update_session_activity(self, session_id: str):
+        """Record activity on a session; written in batches by the activity tracker."""
+        self.activity.touch(session_id)
@@ -0,0 +1,131 @@
+# auth/signing_keys.py
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+from .config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SigningKey:
+    def __init__(self, kid: str, public_key, private_key=None):
+        self.kid = kid
+        self.public_key = public_key
+        self.private_key = private_key
+        if isinstance(public_key, rsa.RSAPublicKey):
+            self.algorithm = 'RS256'
+        elif isinstance(public_key, ed25519.Ed25519PublicKey):
+            self.algorithm = 'EdDSA'
+        else:
+            raise ValueError(f"Unsupported key type for kid {kid}")
+
+    def to_jwk(self) -> Dict:
+        if self.algorithm == 'RS256':
+            jwk = json.loads(RSAAlgorithm.to_jwk(self.public_key))
+        else:
+            jwk = json.loads(OKPAlgorithm.to_jwk(self.public_key))
+        jwk.update({'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'})
+        return jwk
+
+class KeyRing:
+    """Token signing keys with key IDs and rotation.
+
+    Keys are PEM files in ``JWT_SIGNING_KEYS_DIR`` named ``<kid>.pem``
+    (private key, can sign) or ``<kid>.pub.pem`` (public key of a retired
+    key, verify only). New tokens are signed with ``JWT_ACTIVE_KID``, or the
+    last private key by name. Without a key directory, tokens fall back to
+    HS256 with ``JWT_SECRET_KEY``. Once keys are loaded, HS256 tokens are
+    rejected unless ``accept_hs256`` is set, and then only until
+    ``accept_hs256_until`` if given.
+    """
+
+    def __init__(self, keys_dir: Optional[str] = None, active_kid: Optional[str] = None,
+                 accept_hs256: bool = False, accept_hs256_until: Optional[str] = None):
+        self.keys: Dict[str, SigningKey] = {}
+        self.active: Optional[SigningKey] = None
+        if keys_dir:
+            self._load(keys_dir, active_kid)
+        self.accept_hs256 = accept_hs256
+        self.accept_hs256_until: Optional[datetime] = None
+        if accept_hs256_until:
+            # fromisoformat only accepts a trailing Z from Python 3.11
+            until = datetime.fromisoformat(accept_hs256_until.replace('Z', '+00:00'))
+            self.accept_hs256_until = until if until.tzinfo else until.replace(tzinfo=timezone.utc)
+        if self.active is not None and self._accepts_hs256():
+            if self.accept_hs256_until is None:
+                logger.warning("JWT_ACCEPT_HS256 is enabled with no deadline: tokens signed with "
+                               "JWT_SECRET_KEY are accepted alongside the signing keys")
+            else:
+                logger.warning(f"JWT_ACCEPT_HS256 is enabled: tokens signed with JWT_SECRET_KEY are "
+                               f"accepted until {self.accept_hs256_until.isoformat()}")
+        # Keys do not change at runtime, so the published set is built once
+        self._jwks = {'keys': [key.to_jwk() for key in self.keys.values()]}
+        self.jwks_etag = hashlib.sha256(json.dumps(self._jwks, sort_keys=True).encode()).hexdigest()[:32]
+
+    def _load(self, keys_dir: str, active_kid: Optional[str]):
+        for filename in sorted(os.listdir(keys_dir)):
+            if not filename.endswith('.pem'):
+                continue
+            path = os.path.join(keys_dir, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if filename.endswith('.pub.pem'):
+                kid = filename[:-len('.pub.pem')]
+                self.keys.setdefault(kid, SigningKey(kid, serialization.load_pem_public_key(data)))
+            else:
+                kid = filename[:-len('.pem')]
+                private_key = serialization.load_pem_private_key(data, password=None)
+                self.keys[kid] = SigningKey(kid, private_key.public_key(), private_key)
+
+        signing_kids = [kid for kid, key in self.keys.items() if key.private_key is not None]
+        if active_kid:
+            if active_kid not in signing_kids:
+                raise ValueError(f"No private key for active kid {active_kid}")
+            self.active = self.keys[active_kid]
+        elif signing_kids:
+            self.active = self.keys[sorted(signing_kids)[-1]]
+        logger.info(f"Loaded {len(self.keys)} signing keys, active kid: {self.active.kid if self.active else None}")
+
+    def encode(self, payload: Dict) -> str:
+        if self.active is None:
+            return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
+        return jwt.encode(
+            payload,
+            self.active.private_key,
+            algorithm=self.active.algorithm,
+            headers={'kid': self.active.kid}
+        )
+
+    def decode(self, token: str) -> Dict:
+        """Verify a token against the key named by its ``kid`` header.
+
+        Raises jwt.InvalidTokenError (or a subclass) when the token is invalid.
+        """
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is None:
+            if self.active is not None and not self._accepts_hs256():
+                raise jwt.InvalidTokenError("Token has no key ID")
+            return jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=['HS256'])
+
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown key ID: {kid}")
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+    def _accepts_hs256(self) -> bool:
+        if not self.accept_hs256:
+            return False
+        return self.accept_hs256_until is None or datetime.now(timezone.utc) < self.accept_hs256_until
+
+    def jwks(self) -> Dict[str, List[Dict]]:
+        """Public keys as a JSON Web Key Set."""
+        return self._jwks
+
+key_ring = KeyRing(Config.JWT_SIGNING_KEYS_DIR, Config.JWT_ACTIVE_KID,
+                   Config.JWT_ACCEPT_HS256, Config.JWT_ACCEPT_HS256_UNTIL)
@@ -0,0 +1,111 @@
+# auth/sms_client.py
+import random
+import time
+from typing import Optional, Tuple
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from . import metrics
+from .config import Config
+from .utils.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the gateway did not accept the message, so resending is safe
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+def _not_connected(error: requests.exceptions.ConnectionError) -> bool:
+    """True if the request failed before a connection to the gateway was made."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+class SMSClient:
+    """SMS gateway client over a pooled keep-alive session.
+
+    Retries with jittered exponential backoff only when the message cannot have
+    been accepted (failed connects and retryable status codes); read timeouts
+    and aborted connections are not retried to avoid sending the same OTP twice.
+    """
+
+    def __init__(self, gateway_url: Optional[str] = None, session: Optional[requests.Session] = None):
+        self.gateway_url = gateway_url or Config.SMS_GATEWAY_URL
+        self.timeout = (Config.SMS_CONNECT_TIMEOUT, Config.SMS_READ_TIMEOUT)
+        self.max_retries = Config.SMS_MAX_RETRIES
+        self.backoff_base = Config.SMS_RETRY_BACKOFF
+        self.breaker = CircuitBreaker(
+            'sms-gateway',
+            failure_threshold=Config.SMS_BREAKER_THRESHOLD,
+            reset_timeout=Config.SMS_BREAKER_RESET_TIMEOUT
+        )
+        self.session = session or self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.SMS_POOL_SIZE, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'User-Agent': 'auth-server/1.0'
+        })
+        return session
+
+    def send(self, phone: str, message: str) -> Tuple[bool, bool, str]:
+        """Send an SMS; returns (success, retryable, error message).
+
+        ``retryable`` is set only when the gateway cannot have accepted the
+        message, so sending it again cannot deliver the OTP twice.
+        """
+        if not self.breaker.allow():
+            logger.warning("SMS gateway circuit open, failing fast")
+            return False, True, "SMS service unavailable"
+
+        payload = {'number': phone, 'message': message}
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+            try:
+                with metrics.dependency('sms_gateway', 'send'):
+                    response = self.session.post(self.gateway_url, json=payload, timeout=self.timeout)
+            except requests.exceptions.ConnectionError as e:
+                if _not_connected(e):
+                    # Nothing reached the gateway
+                    logger.warning("SMS gateway connection error (attempt %s): %s", attempt + 1, e)
+                    error = "SMS service connection error"
+                    continue
+                # Aborted or reset after the request may have been sent
+                logger.error("SMS gateway request error: %s", e)
+                self.breaker.record_failure()
+                return False, False, "SMS service connection error"
+            except requests.exceptions.RequestException as e:
+                logger.error("SMS gateway request error: %s", e)
+                self.breaker.record_failure()
+                return False, False, "SMS service connection error"
+
+            if response.status_code >= 400:
+                metrics.PROVIDER_FAILURES.labels('sms_gateway').inc()
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                logger.warning("SMS gateway returned %s (attempt %s)", response.status_code, attempt + 1)
+                error = f"SMS gateway unavailable ({response.status_code})"
+                continue
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            try:
+                response_data = response.json()
+            except ValueError:
+                response_data = {}
+            if response_data.get('status') != 'success':
+                return False, False, f"Failed to send SMS: {response.text}"
+            return True, False, ""
+
+        self.breaker.record_failure()
+        return False, True, error
@@ -1,65 +1,86 @@
 # auth/token_manager.py
 from datetime import datetime, timezone
-from typing import Dict, Optional
-from .config import Config, supabase_client
+from typing import Dict, Optional, Tuple
+from . import metrics
+from .config import Config
+from .repositories import repositories
+from .revocation import revocation_filter
+from .signing_keys import key_ring
+import hashlib
 import jwt
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
 class TokenManager:
     def __init__(self):
-        self.supabase = supabase_client
+        self.refresh_tokens = repositories.refresh_tokens
+        self.key_ring = key_ring
+        self.revocations = revocation_filter
 
     def create_tokens(self, user_id: str) -> Dict[str, str]:
         """Create access and refresh tokens."""
         try:
-            # Create access token
-            access_token = jwt.encode(
-                {
-                    'user_id': user_id,
-                    'type': 'access',
-                    'exp': datetime.now(timezone.utc) + Config.JWT_ACCESS_TOKEN_EXPIRES
-                },
-                Config.JWT_SECRET_KEY,
-                algorithm='HS256'
-            )
-
-            # Create refresh token
-            refresh_token = jwt.encode(
-                {
-                    'user_id': user_id,
-                    'type': 'refresh',
-                    'exp': datetime.now(timezone.utc) + Config.JWT_REFRESH_TOKEN_EXPIRES
-                },
-                Config.JWT_SECRET_KEY,
-                algorithm='HS256'
-            )
+            refresh_jti, refresh_expires_at = self.new_refresh_token_id()
+            tokens = self.sign_tokens(user_id, refresh_jti, refresh_expires_at)
 
             # Store refresh token
-            self.supabase.table('refresh_tokens').insert({
-                'user_id': user_id,
-                'token': refresh_token,
-                'expires_at': (datetime.now(timezone.utc) + Config.JWT_REFRESH_TOKEN_EXPIRES).isoformat()
-            }).execute()
+            self.store_refresh_token(user_id, refresh_jti, refresh_expires_at)
 
-            return {
-                'access_token': access_token,
-                'refresh_token': refresh_token
-            }
+            return tokens
 
         except Exception as e:
-            logger.error(f"Error creating tokens: {e}")
+            logger.error("Error creating tokens: %s", e)
             raise
 
+    def new_refresh_token_id(self) -> Tuple[str, datetime]:
+        """Allocate the JTI and expiry of a refresh token before it is stored."""
+        return str(uuid.uuid4()), datetime.now(timezone.utc) + Config.JWT_REFRESH_TOKEN_EXPIRES
+
+    def sign_access_token(self, user_id: str, session_id: Optional[str] = None) -> str:
+        """Sign a short-lived access token."""
+        payload = {
+            'user_id': user_id,
+            'type': 'access',
+            'exp': datetime.now(timezone.utc) + Config.JWT_ACCESS_TOKEN_EXPIRES
+        }
+        if session_id:
+            payload['sid'] = session_id
+        return self.key_ring.encode(payload)
+
+    def store_refresh_token(self, user_id: str, refresh_jti: str, refresh_expires_at: datetime,
+                            session_id: Optional[str] = None):
+        """Register a refresh token by its JTI, bound to the session it was issued for."""
+        with metrics.stage('refresh_token_store'):
+            self.refresh_tokens.insert(user_id, refresh_jti, refresh_expires_at, session_id)
+
+    def sign_tokens(self, user_id: str, refresh_jti: str, refresh_expires_at: datetime,
+                    session_id: Optional[str] = None) -> Dict[str, str]:
+        """Sign access and refresh tokens; the refresh token row must be stored separately."""
+        with metrics.stage('token_sign'):
+            access_token = self.sign_access_token(user_id, session_id)
+
+            # Create refresh token
+            refresh_payload = {
+                'user_id': user_id,
+                'type': 'refresh',
+                'jti': refresh_jti,
+                'exp': refresh_expires_at
+            }
+            if session_id:
+                refresh_payload['sid'] = session_id
+            refresh_token = self.key_ring.encode(refresh_payload)
+
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token
+        }
+
     def verify_token(self, token: str, token_type: str = 'access') -> Optional[Dict]:
         """Verify token and return payload if valid."""
         try:
-            payload = jwt.decode(
-                token,
-                Config.JWT_SECRET_KEY,
-                algorithms=['HS256']
-            )
+            payload = self.key_ring.decode(token)
 
             if payload.get('type') != token_type:
                 return None
@@ -70,22 +91,62 @@ class TokenManager:
             logger.warning("Token expired")
             return None
         except jwt.InvalidTokenError as e:
-            logger.warning(f"Invalid token: {e}")
+            logger.warning("Invalid token: %s", e)
             return None
 
     def refresh_access_token(self, refresh_token: str) -> Optional[Dict[str, str]]:
-        """Create new access token using refresh token."""
+        """Create new access token using refresh token.
+
+        With rotation enabled the presented refresh token is revoked and a new
+        one issued in the same database call; replaying it is rejected.
+        """
         payload = self.verify_token(refresh_token, 'refresh')
         if not payload:
             return None
 
-        # Check if refresh token is valid in database
-        result = self.supabase.table('refresh_tokens').select('*').match({
-            'token': refresh_token,
-            'is_revoked': False
-        }).execute()
+        jti = payload.get('jti')
+        if jti and self.revocations.might_be_revoked(jti):
+            logger.warning("Refresh token revoked")
+            return None
+
+        if not Config.REFRESH_TOKEN_ROTATION:
+            # Not revoked as of the last filter sync: no database round trip needed
+            if not (jti and self.revocations.ready) and not self.refresh_tokens.is_active(
+                    jti, None if jti else self.token_digest(refresh_token)):
+                return None
+            return {
+                'access_token': self.sign_access_token(payload['user_id'], payload.get('sid')),
+                'refresh_token': refresh_token
+            }
 
-        if not result.data:
+        new_jti, new_expires_at = self.new_refresh_token_id()
+        with metrics.stage('refresh_token_rotate'):
+            user_id = self.refresh_tokens.rotate(
+                jti,
+                # Tokens issued before JTIs were introduced are found by digest
+                None if jti else self.token_digest(refresh_token),
+                new_jti,
+                new_expires_at,
+                payload.get('sid')
+            )
+        if not user_id:
             return None
 
-        return self.create_tokens(payload['user_id'])
\ No newline at end of file
+        if jti:
+            self.revocations.add(jti)
+        return self.sign_tokens(user_id, new_jti, new_expires_at, payload.get('sid'))
+
+    def revoke_user_tokens(self, user_id: str):
+        """Revoke every refresh token of a user in one statement."""
+        self.refresh_tokens.revoke_all(user_id)
+
+    def revoke_session_tokens(self, session_id: str):
+        """Revoke the refresh tokens issued for a session, e.g. on logout."""
+        for jti in self.refresh_tokens.revoke_session(session_id):
+            # Other workers see the revocation at their next filter sync
+            self.revocations.add(jti)
+
+    @staticmethod
+    def token_digest(token: str) -> str:
+        """Fixed-size lookup key for tokens stored without a JTI."""
+        return hashlib.sha256(token.encode()).hexdigest()
@@ -0,0 +1,99 @@
+# auth/user_filter.py
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from .config import Config
+from .repositories import repositories
+from .utils.bloom import BloomFilter
+from .utils.periodic import PeriodicTask
+import logging
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+# Incremental syncs re-read this much before the last one, for rows whose
+# transaction committed after a later created_at was seen or with clock skew
+SYNC_OVERLAP = timedelta(seconds=60)
+
+class RegisteredUserFilter:
+    """In-process Bloom filter of registered emails and phone numbers.
+
+    Built from ``users`` on first use and kept current by loading users
+    created since the previous sync; users created by this process are added
+    at once. It is rebuilt periodically, or when more users were added than
+    it was sized for. A user created by another worker or node is seen after
+    at most one sync interval; until then registration behaves as if the
+    identifier were new, and verification logs the existing user in.
+    """
+
+    def __init__(self, enabled: bool, capacity: int, error_rate: float, sync_interval: float,
+                 rebuild_interval: float):
+        self.users = repositories.users
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.ready = False
+        self._filter = BloomFilter(capacity, error_rate)
+        self._cursor: Optional[datetime] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._task = PeriodicTask('user-filter', sync_interval, self.sync, run_immediately=True)
+
+    def might_exist(self, channel: str, identifier: str) -> bool:
+        """False means no user had the identifier as of the last sync; True means ask the database."""
+        if not self.enabled:
+            return True
+        self._task.start()
+        return not self.ready or self._key(channel, identifier) in self._filter
+
+    def add(self, channel: str, identifier: str):
+        """Record a user created or verified by this process without waiting for a sync."""
+        self._filter.add(self._key(channel, identifier))
+
+    def sync(self):
+        if (not self.ready or self._filter.saturated
+                or time.monotonic() - self._built_at > self.rebuild_interval):
+            self._rebuild()
+        else:
+            self._cursor = self._load(self._filter, self._cursor - SYNC_OVERLAP)
+
+    def _rebuild(self):
+        bloom = BloomFilter(max(self.capacity, 2 * self._filter.count), self.error_rate)
+        cursor = self._load(bloom, None)
+        # Users created while loading are picked up by the next sync, which starts
+        # from the time the load began
+        with self._lock:
+            self._filter = bloom
+            self._cursor = cursor
+            self._built_at = time.monotonic()
+            self.ready = True
+        logger.info("User filter rebuilt with %s identifiers", bloom.count)
+
+    def _load(self, bloom: BloomFilter, created_since: Optional[datetime]) -> datetime:
+        """Add identifiers of users created at or after created_since (all if None); returns the next cursor."""
+        cursor = datetime.now(timezone.utc)
+        after_id = None
+        while True:
+            rows = self.users.list_identifiers(after_id, created_since, PAGE_SIZE)
+            for row in rows:
+                if row.get('email'):
+                    bloom.add(self._key('email', row['email']))
+                if row.get('phone_number'):
+                    bloom.add(self._key('phone', row['phone_number']))
+            if len(rows) < PAGE_SIZE:
+                return cursor
+            after_id = rows[-1]['id']
+
+    @staticmethod
+    def _key(channel: str, identifier: str) -> str:
+        return f"{channel}:{identifier}"
+
+user_filter = RegisteredUserFilter(
+    Config.USER_FILTER_ENABLED,
+    Config.USER_FILTER_CAPACITY,
+    Config.USER_FILTER_ERROR_RATE,
+    Config.USER_FILTER_SYNC_INTERVAL,
+    Config.USER_FILTER_REBUILD_INTERVAL
+)
@@ -0,0 +1,93 @@
+# auth/utils/auth_guard.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Optional, Tuple
+from flask import g, jsonify, request
+from ..config import Config
+from ..session_activity import activity_tracker
+from ..token_manager import TokenManager
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenCache:
+    """Bounded LRU of verified token payloads keyed by token digest.
+
+    Entries expire at the token's own ``exp`` claim, so a cached answer is
+    never valid for longer than the token itself.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[bytes, Tuple[Dict, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, token: str, payload: Dict):
+        exp = payload.get('exp')
+        if exp is None:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+token_manager = TokenManager()
+token_cache = TokenCache(Config.TOKEN_CACHE_SIZE)
+
+def verify_access_token(token: str) -> Optional[Dict]:
+    """Return the access token payload if valid, using the cache when possible."""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    payload = token_manager.verify_token(token, 'access')
+    if payload is not None:
+        token_cache.put(token, payload)
+    return payload
+
+def require_auth(view):
+    """Reject requests without a valid Bearer access token; sets ``g.user_id`` and records session activity."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        scheme, _, token = auth_header.partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing bearer token'
+            }), 401
+
+        payload = verify_access_token(token.strip())
+        if payload is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid or expired token'
+            }), 401
+
+        g.user_id = payload['user_id']
+        g.token_payload = payload
+        if payload.get('sid'):
+            activity_tracker.touch(payload['sid'])
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,102 @@
+# auth/utils/batch_writer.py
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BatchWriter:
+    """Bounded write-behind queue flushed in batches by a background thread.
+
+    Items are flushed when ``max_batch`` items are pending or ``flush_interval``
+    seconds have passed since the first pending item. ``put`` blocks for at
+    most ``put_timeout`` seconds when the queue is full (backpressure) and then
+    drops the item. Pending items are drained when the process exits.
+    """
+
+    def __init__(self, flush_fn: Callable[[List[Any]], None], name: str = 'batch-writer',
+                 max_batch: int = 100, flush_interval: float = 1.0,
+                 max_queue: int = 10000, put_timeout: float = 0.05):
+        self.flush_fn = flush_fn
+        self.name = name
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def put(self, item: Any) -> bool:
+        """Enqueue an item; returns False if it had to be dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"{self.name}: queue full, dropped item ({self.dropped} dropped so far)")
+            return False
+
+    def close(self, timeout: float = 5.0):
+        """Stop the background thread and flush everything still queued."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._drain()
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so start one per process on first use
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.max_batch:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch: List[Any]):
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            logger.error(f"{self.name}: failed to flush {len(batch)} items: {e}")
@@ -0,0 +1,50 @@
+# auth/utils/bloom.py
+import hashlib
+import math
+import threading
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings.
+
+    ``add``/``__contains__`` never give false negatives; false positives occur
+    at roughly ``error_rate`` once ``capacity`` items have been added. Adding
+    an item that is already present does not count towards ``capacity``.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 1e-6):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, item: str):
+        # Double hashing: two 64-bit halves of one digest generate k positions
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str):
+        positions = self._positions(item)
+        with self._lock:
+            added = False
+            for pos in positions:
+                mask = 1 << (pos & 7)
+                if not self._bits[pos >> 3] & mask:
+                    self._bits[pos >> 3] |= mask
+                    added = True
+            # Syncs re-read overlapping rows; repeats must not make the filter look saturated
+            if added:
+                self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def saturated(self) -> bool:
+        """True once more items were added than the filter was sized for."""
+        return self.count > self.capacity
@@ -0,0 +1,253 @@
+# auth/utils/counter_store.py
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CounterStore:
+    """Minimal shared key/counter interface used by limiters.
+
+    Implementations must make ``incr`` atomic; ``ttl`` (seconds) is applied
+    when the key is first created.
+    """
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    def get(self, key: str) -> int:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+class MemoryCounterStore(CounterStore):
+    """Process-local counter store with per-key expiry.
+
+    Stands in for a shared store in single-process deployments and local runs.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._counters: Dict[str, Tuple[int, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._counters.get(key, (0, None))
+            if expires is not None and expires <= now:
+                value, expires = 0, None
+            if expires is None and ttl is not None:
+                expires = now + ttl
+            value += amount
+            self._counters[key] = (value, expires)
+            if len(self._counters) > self.max_keys:
+                self._evict(now)
+            return value
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            value, expires = self._counters.get(key, (0, None))
+            if expires is not None and expires <= time.monotonic():
+                del self._counters[key]
+                return 0
+            return value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._counters.pop(key, None)
+
+    def _evict(self, now: float):
+        """Drop expired keys, then the oldest ones if still over capacity."""
+        expired = [k for k, (_, exp) in self._counters.items() if exp is not None and exp <= now]
+        for k in expired:
+            del self._counters[k]
+        while len(self._counters) > self.max_keys:
+            del self._counters[next(iter(self._counters))]
+
+_HEADER = struct.Struct('<8sIII')  # magic, version, slots, bucket size
+_HEADER_SIZE = 64
+_SLOT = struct.Struct('<Qdq')  # key hash, expires at (epoch seconds, 0 = never), value
+_MAGIC = b'AUTHCNT\0'
+_VERSION = 1
+
+class MmapCounterStore(CounterStore):
+    """Fixed-size counter table in a memory-mapped file shared by every process on the host.
+
+    The file holds ``slots`` slots of (key hash, expiry, value) grouped in
+    buckets of ``bucket_size``; a key lives in one slot of the bucket its
+    64-bit hash selects. An update locks just that bucket, with a thread lock
+    and an ``fcntl`` byte-range lock, and reads and writes the slot in mapped
+    memory, so workers share exact counts without a round trip to another
+    process. Expired slots are reused; when a bucket has no free slot, the
+    one closest to expiry is evicted and counted in ``evictions``. fcntl locks
+    do not exclude threads of the same process, so use one instance per file
+    in a process; ``create_counter_store`` shares them.
+    """
+
+    def __init__(self, path: str, slots: int = 65536, bucket_size: int = 8):
+        if slots <= 0 or slots % bucket_size:
+            raise ValueError("slots must be a positive multiple of bucket_size")
+        self.path = path
+        self.slots = slots
+        self.bucket_size = bucket_size
+        self.buckets = slots // bucket_size
+        self.evictions = 0
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._locks = []
+        self._pid: Optional[int] = None
+        self._open_lock = threading.Lock()
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        with self._bucket(key) as (key_hash, bucket):
+            slot, found, evicted = self._find(key_hash, bucket, now)
+            if found:
+                _, expires, value = _SLOT.unpack_from(self._map, slot)
+            else:
+                expires, value = 0.0, 0
+                self.evictions += evicted
+            if not expires and ttl is not None:
+                expires = now + ttl
+            value += amount
+            _SLOT.pack_into(self._map, slot, key_hash, expires, value)
+            return value
+
+    def get(self, key: str) -> int:
+        with self._bucket(key) as (key_hash, bucket):
+            slot, found, _ = self._find(key_hash, bucket, time.time())
+            return _SLOT.unpack_from(self._map, slot)[2] if found else 0
+
+    def delete(self, key: str):
+        with self._bucket(key) as (key_hash, bucket):
+            slot, found, _ = self._find(key_hash, bucket, time.time())
+            if found:
+                _SLOT.pack_into(self._map, slot, 0, 0.0, 0)
+
+    @contextmanager
+    def _bucket(self, key: str):
+        """Lock the key's bucket; yields the key hash and the bucket's offset in the file."""
+        self._ensure_open()
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        index = key_hash % self.buckets
+        length = self.bucket_size * _SLOT.size
+        offset = _HEADER_SIZE + index * length
+        # fcntl locks are held per process, so threads of one worker also need a lock.
+        # Both are held for a few microseconds, so blocking on them is harmless under gevent too.
+        with self._locks[index % len(self._locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset)
+            try:
+                yield key_hash, offset
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+    def _find(self, key_hash: int, bucket: int, now: float) -> Tuple[int, bool, bool]:
+        """Return (slot offset, key found, live key evicted) for the key in a locked bucket."""
+        free = victim = None
+        victim_expires = float('inf')
+        for i in range(self.bucket_size):
+            slot = bucket + i * _SLOT.size
+            slot_hash, expires, _ = _SLOT.unpack_from(self._map, slot)
+            live = slot_hash and not (expires and expires <= now)
+            if not live:
+                if free is None:
+                    free = slot
+            elif slot_hash == key_hash:
+                return slot, True, False
+            elif victim is None or (expires or float('inf')) < victim_expires:
+                victim, victim_expires = slot, expires or float('inf')
+        if free is not None:
+            return free, False, False
+        return victim, False, True
+
+    def _ensure_open(self):
+        # The mapping is shared across fork; the thread locks are not and are made per process
+        if self._pid == os.getpid():
+            return
+        with self._open_lock:
+            if self._pid == os.getpid():
+                return
+            if self._map is None:
+                self._open()
+            self._locks = [threading.Lock() for _ in range(min(self.buckets, 64))]
+            self._pid = os.getpid()
+
+    def _open(self):
+        size = _HEADER_SIZE + self.slots * _SLOT.size
+        header = _HEADER.pack(_MAGIC, _VERSION, self.slots, self.bucket_size)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # Whichever process gets here first sizes the file and writes the layout
+            fcntl.lockf(fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, header, 0)
+                elif os.fstat(fd).st_size != size or os.pread(fd, _HEADER.size, 0) != header:
+                    raise RuntimeError(
+                        f"{self.path} holds counters with a different layout; remove it or use another path"
+                    )
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+            self._map = mmap.mmap(fd, size)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+class RedisCounterStore(CounterStore):
+    """Counter store backed by Redis, shared by every worker and node."""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("redis package is required for RedisCounterStore")
+        self.client = redis.Redis.from_url(url)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        pipe = self.client.pipeline()
+        if ttl is not None:
+            # Create the key with its expiry only if it does not exist yet
+            pipe.set(key, 0, ex=int(ttl) + 1, nx=True)
+        pipe.incrby(key, amount)
+        return int(pipe.execute()[-1])
+
+    def get(self, key: str) -> int:
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+_mmap_stores: Dict[str, MmapCounterStore] = {}
+_mmap_stores_lock = threading.Lock()
+
+def create_counter_store(url: Optional[str] = None) -> CounterStore:
+    """Build a counter store from a URL (``memory://``, ``mmap:///path?slots=N`` or ``redis://``)."""
+    if not url or url.startswith('memory://'):
+        return MemoryCounterStore()
+    if url.startswith('mmap://'):
+        parsed = urlparse(url)
+        options = {name: int(values[-1]) for name, values in parse_qs(parsed.query).items()}
+        with _mmap_stores_lock:
+            store = _mmap_stores.get(parsed.path)
+            if store is None:
+                store = _mmap_stores[parsed.path] = MmapCounterStore(parsed.path, **options)
+            elif (store.slots, store.bucket_size) != (options.get('slots', store.slots),
+                                                      options.get('bucket_size', store.bucket_size)):
+                raise ValueError(f"{url} conflicts with another store on {parsed.path}")
+        return store
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCounterStore(url)
+    raise ValueError(f"Unsupported counter store URL: {url}")
@@ -0,0 +1,568 @@
+# auth/utils/fakes.py
+"""Local stand-ins for external dependencies, for development and load tests."""
+import json
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _BackgroundServer:
+    """Run a socketserver-style server on a daemon thread."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._server = self._build_server()
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _build_server(self):
+        raise NotImplementedError
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients timing out on injected latency close early; not worth a traceback
+        logger.debug(f"fake server: error handling request from {client_address}")
+
+class FakeSMSGateway(_BackgroundServer):
+    """HTTP server speaking the SMS gateway's JSON protocol.
+
+    ``latency`` delays every response; ``fail_next(n, status)`` makes the next
+    ``n`` requests answer with ``status``. Accepted messages are kept in
+    ``messages``.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        super().__init__(host, port)
+        self.latency = latency
+        self.messages: List[Dict] = []
+        self.requests = 0
+        self._failures: List[int] = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/send-sms"
+
+    def fail_next(self, count: int = 1, status: int = 503):
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def _handle(self, payload: Dict):
+        with self._lock:
+            self.requests += 1
+            status = self._failures.pop(0) if self._failures else None
+        if self.latency:
+            time.sleep(self.latency)
+        if status is not None:
+            return status, {'status': 'error', 'message': 'Injected failure'}
+        if not payload.get('number') or not payload.get('message'):
+            return 400, {'status': 'error', 'message': 'number and message are required'}
+        with self._lock:
+            self.messages.append(payload)
+        return 200, {'status': 'success'}
+
+    def _build_server(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; avoid delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                if hasattr(socket, 'TCP_QUICKACK'):
+                    self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    payload = {}
+                status, body = gateway._handle(payload)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug("fake sms gateway: " + format % args)
+
+        return _QuietHTTPServer((self.host, self.port), Handler)
+
+class FakeSMTPServer(_BackgroundServer):
+    """Minimal plaintext ESMTP server in the spirit of aiosmtpd's debugging server.
+
+    Accepts AUTH PLAIN/LOGIN with any credentials and records each message as
+    a dict in ``messages``. ``latency`` delays the reply to DATA;
+    ``drop_after(n)`` closes each connection after ``n`` messages to exercise
+    reconnects. STARTTLS is not offered, so clients must set SMTP_USE_TLS=False.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        super().__init__(host, port)
+        self.latency = latency
+        self.messages: List[Dict] = []
+        self.connections = 0
+        self.logins = 0
+        self.messages_per_connection: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def drop_after(self, count: Optional[int]):
+        self.messages_per_connection = count
+
+    def _build_server(self):
+        smtp = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def reply(self, line: str):
+                self.wfile.write((line + '\r\n').encode())
+
+            def readline(self) -> Optional[str]:
+                line = self.rfile.readline()
+                return line.decode(errors='replace').rstrip('\r\n') if line else None
+
+            def handle(self):
+                with smtp._lock:
+                    smtp.connections += 1
+                sent = 0
+                envelope = {'from': None, 'to': []}
+                self.reply('220 fake-smtp ESMTP ready')
+                while True:
+                    line = self.readline()
+                    if line is None:
+                        return
+                    verb, _, arg = line.partition(' ')
+                    verb = verb.upper()
+                    if verb == 'EHLO':
+                        self.reply('250-fake-smtp')
+                        self.reply('250 AUTH PLAIN LOGIN')
+                    elif verb == 'HELO':
+                        self.reply('250 fake-smtp')
+                    elif verb == 'AUTH':
+                        mechanism, _, initial = arg.partition(' ')
+                        if mechanism.upper() == 'LOGIN':
+                            # base64 'Username:' / 'Password:' prompts
+                            prompts = ['UGFzc3dvcmQ6'] if initial else ['VXNlcm5hbWU6', 'UGFzc3dvcmQ6']
+                        else:
+                            prompts = [] if initial else ['']
+                        for prompt in prompts:
+                            self.reply(f'334 {prompt}')
+                            if self.readline() is None:
+                                return
+                        with smtp._lock:
+                            smtp.logins += 1
+                        self.reply('235 Authentication successful')
+                    elif verb == 'MAIL':
+                        envelope = {'from': arg.split(':', 1)[-1].strip(), 'to': []}
+                        self.reply('250 OK')
+                    elif verb == 'RCPT':
+                        envelope['to'].append(arg.split(':', 1)[-1].strip())
+                        self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        lines = []
+                        while True:
+                            data = self.readline()
+                            if data is None:
+                                return
+                            if data == '.':
+                                break
+                            lines.append(data[1:] if data.startswith('..') else data)
+                        if smtp.latency:
+                            time.sleep(smtp.latency)
+                        with smtp._lock:
+                            smtp.messages.append(dict(envelope, data='\n'.join(lines)))
+                        self.reply('250 OK: queued')
+                        sent += 1
+                        if smtp.messages_per_connection and sent >= smtp.messages_per_connection:
+                            return
+                    elif verb in ('RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Command not implemented')
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        return Server((self.host, self.port), Handler)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _parse_time(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _compare_key(row_value: Any, operand: str):
+    """Normalise a stored value and a filter operand into comparable values."""
+    if isinstance(row_value, bool):
+        return row_value, operand.lower() == 'true'
+    if isinstance(row_value, (int, float)):
+        return row_value, float(operand)
+    if isinstance(row_value, str):
+        row_time, operand_time = _parse_time(row_value), _parse_time(operand)
+        if row_time is not None and operand_time is not None:
+            return row_time, operand_time
+    return row_value, operand
+
+class FakePostgREST(_BackgroundServer):
+    """In-memory stand-in for the PostgREST subset this app uses.
+
+    Supports select with eq/neq/gt/gte/lt/lte/is/in filters, order, limit,
+    Range and ``Prefer: count=exact``; insert, upsert (``on_conflict``),
+    update and delete; and the ``verify_otp_login``, ``rotate_refresh_token``
+    and ``touch_sessions`` functions with the semantics of db/migrations.
+    ``latency`` delays every response. Serves under ``/rest/v1`` so it can be
+    used as SUPABASE_URL.
+    """
+
+    DEFAULTS = {
+        'users': {'email': None, 'phone_number': None, 'name': None, 'auth_type': 'email',
+                  'email_verified': False, 'phone_verified': False},
+        'verification_codes': {'verified': False, 'verified_at': None, 'name': None},
+        'user_sessions': {'device_info': None, 'is_active': True, 'ended_at': None},
+        'refresh_tokens': {'is_revoked': False, 'revoked_at': None, 'token_digest': None},
+        'login_attempts': {'success': False},
+    }
+    UNIQUE = {'users': ('email', 'phone_number'), 'refresh_tokens': ('jti',)}
+    # purge target -> (table, timestamp column, extra row condition)
+    PURGE_TARGETS = {
+        'verification_codes': ('verification_codes', 'expires_at', None),
+        'refresh_tokens_expired': ('refresh_tokens', 'expires_at', None),
+        'refresh_tokens_revoked': ('refresh_tokens', 'revoked_at', lambda row: row.get('is_revoked')),
+        'user_sessions': ('user_sessions', 'ended_at', lambda row: not row.get('is_active')),
+        'login_attempts': ('login_attempts', 'created_at', None),
+        'otp_deliveries': ('otp_deliveries', 'updated_at', None),
+    }
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        super().__init__(host, port)
+        self.latency = latency
+        self.tables: Dict[str, List[Dict]] = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._functions = {
+            'verify_otp_login': self._verify_otp_login,
+            'rotate_refresh_token': self._rotate_refresh_token,
+            'touch_sessions': self._touch_sessions,
+            'acquire_lease': self._acquire_lease,
+            'release_lease': self._release_lease,
+            'purge_expired': self._purge_expired,
+            'fail_stale_deliveries': self._fail_stale_deliveries,
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # Row helpers; callers hold self._lock
+
+    def _new_row(self, table: str, values: Dict) -> Dict:
+        row = {'id': str(uuid.uuid4()), 'created_at': _now()}
+        row.update(self.DEFAULTS.get(table, {}))
+        if table == 'users':
+            row['updated_at'] = row['created_at']
+        if table == 'user_sessions':
+            row['started_at'] = row['created_at']
+        row.update(values)
+        return row
+
+    def _find_conflict(self, table: str, values: Dict, columns) -> Optional[Dict]:
+        for column in columns:
+            if values.get(column) is None:
+                continue
+            for row in self.tables.get(table, []):
+                if row.get(column) == values[column]:
+                    return row
+        return None
+
+    def _insert(self, table: str, values: Dict, on_conflict: Optional[str] = None) -> Dict:
+        rows = self.tables.setdefault(table, [])
+        existing = self._find_conflict(table, values, [on_conflict] if on_conflict else self.UNIQUE.get(table, ()))
+        if existing is not None:
+            if not on_conflict:
+                raise ValueError(f'duplicate key value violates unique constraint on {table}')
+            existing.update(values)
+            return existing
+        row = self._new_row(table, values)
+        rows.append(row)
+        return row
+
+    @staticmethod
+    def _matches(row: Dict, filters: List) -> bool:
+        for column, op, operand in filters:
+            value = row.get(column)
+            if op == 'is':
+                if operand == 'null' and value is not None:
+                    return False
+                if operand.lower() in ('true', 'false') and value is not (operand.lower() == 'true'):
+                    return False
+                continue
+            if op == 'in':
+                if str(value) not in operand.strip('()').split(','):
+                    return False
+                continue
+            if value is None:
+                return False
+            left, right = _compare_key(value, operand)
+            if op == 'eq' and not left == right:
+                return False
+            if op == 'neq' and not left != right:
+                return False
+            if op == 'gt' and not left > right:
+                return False
+            if op == 'gte' and not left >= right:
+                return False
+            if op == 'lt' and not left < right:
+                return False
+            if op == 'lte' and not left <= right:
+                return False
+        return True
+
+    # SQL functions from db/migrations
+
+    def _verify_otp_login(self, p: Dict) -> List[Dict]:
+        now = datetime.now(timezone.utc)
+        for code in self.tables.get('verification_codes', []):
+            if (code.get('code_hash') == p['p_code_hash'] and not code['verified']
+                    and _parse_time(code['expires_at']) > now):
+                break
+        else:
+            return []
+        code.update(verified=True, verified_at=_now())
+
+        column = 'email' if p['p_channel'] == 'email' else 'phone_number'
+        verified = 'email_verified' if p['p_channel'] == 'email' else 'phone_verified'
+        user = self._find_conflict('users', {column: p['p_identifier']}, [column])
+        if user is None:
+            user = self._insert('users', {column: p['p_identifier'], verified: True,
+                                          'name': code.get('name'), 'auth_type': p['p_channel']})
+        else:
+            user[verified] = True
+            user['name'] = code.get('name') or user.get('name')
+
+        session = self._insert('user_sessions', {'user_id': user['id'], 'device_info': p.get('p_device_info'),
+                                                 'is_active': True, 'last_activity': _now()})
+        token = self._insert('refresh_tokens', {'user_id': user['id'], 'jti': p['p_refresh_jti'],
+                                                'expires_at': p['p_refresh_expires_at'],
+                                                'session_id': session['id']})
+        return [{
+            'app_user': dict(user),
+            'session_id': session['id'],
+            'refresh_token': {'id': token['id'], 'jti': token['jti'], 'expires_at': token['expires_at']}
+        }]
+
+    def _rotate_refresh_token(self, p: Dict) -> List[Dict]:
+        now = datetime.now(timezone.utc)
+        for token in self.tables.get('refresh_tokens', []):
+            matched = (token.get('jti') == p['p_jti'] if p.get('p_jti')
+                       else token.get('token_digest') == p.get('p_token_digest'))
+            if matched and not token['is_revoked'] and _parse_time(token['expires_at']) > now:
+                break
+        else:
+            return []
+        token.update(is_revoked=True, revoked_at=_now())
+        self._insert('refresh_tokens', {'user_id': token['user_id'], 'jti': p['p_new_jti'],
+                                        'expires_at': p['p_new_expires_at'],
+                                        'session_id': token.get('session_id') or p.get('p_session_id')})
+        return [{'user_id': token['user_id']}]
+
+    def _touch_sessions(self, p: Dict) -> List[Dict]:
+        seen = dict(zip(p['p_session_ids'], p['p_seen_at']))
+        for session in self.tables.get('user_sessions', []):
+            if session['id'] in seen and session['is_active']:
+                current = _parse_time(session.get('last_activity') or '')
+                if current is None or _parse_time(seen[session['id']]) > current:
+                    session['last_activity'] = seen[session['id']]
+        return []
+
+    def _acquire_lease(self, p: Dict) -> List[Dict]:
+        now = datetime.now(timezone.utc)
+        leases = self.tables.setdefault('maintenance_leases', [])
+        lease = next((row for row in leases if row['name'] == p['p_name']), None)
+        if lease is None:
+            lease = {'name': p['p_name']}
+            leases.append(lease)
+        elif lease['holder'] != p['p_holder'] and _parse_time(lease['expires_at']) >= now:
+            return []
+        lease.update(holder=p['p_holder'],
+                     expires_at=(now + timedelta(seconds=p['p_ttl_seconds'])).isoformat())
+        return [{'acquired': True}]
+
+    def _release_lease(self, p: Dict) -> List[Dict]:
+        leases = self.tables.get('maintenance_leases', [])
+        leases[:] = [row for row in leases
+                     if not (row['name'] == p['p_name'] and row['holder'] == p['p_holder'])]
+        return []
+
+    def _purge_expired(self, p: Dict) -> List[Dict]:
+        table, column, condition = self.PURGE_TARGETS[p['p_target']]
+        cutoff = _parse_time(p['p_cutoff'])
+        rows = self.tables.get(table, [])
+        doomed = set()
+        for index, row in enumerate(rows):
+            if len(doomed) >= p['p_limit']:
+                break
+            at = _parse_time(row.get(column) or '')
+            if at is not None and at < cutoff and (condition is None or condition(row)):
+                doomed.add(index)
+        rows[:] = [row for index, row in enumerate(rows) if index not in doomed]
+        return [{'deleted': len(doomed)}]
+
+    def _fail_stale_deliveries(self, p: Dict) -> List[Dict]:
+        cutoff = _parse_time(p['p_cutoff'])
+        failed = []
+        for row in self.tables.get('otp_deliveries', []):
+            if len(failed) >= p['p_limit']:
+                break
+            at = _parse_time(row.get('updated_at') or '')
+            if row.get('status') in ('queued', 'sending', 'retrying') and at is not None and at < cutoff:
+                row.update(status='failed', last_error='internal_error', updated_at=_now())
+                failed.append({'id': row['id'], 'channel': row['channel'], 'recipient': row['recipient']})
+        return failed
+
+    # HTTP
+
+    def _handle(self, method: str, path: str, params: List, headers, body: Any):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if not path.startswith('/rest/v1/'):
+            return 404, {'message': 'not found'}, {}
+        name = path[len('/rest/v1/'):]
+        prefer = headers.get('Prefer', '')
+
+        with self._lock:
+            if name.startswith('rpc/'):
+                function = self._functions.get(name[len('rpc/'):])
+                if function is None:
+                    return 404, {'message': f'function {name} not found'}, {}
+                return 200, function(body or {}), {}
+
+            query = {key: value for key, value in params if key in ('select', 'order', 'limit', 'on_conflict')}
+            filters = [(key, *value.split('.', 1)) for key, value in params
+                       if key not in ('select', 'order', 'limit', 'on_conflict')]
+            rows = self.tables.setdefault(name, [])
+
+            if method == 'POST':
+                values = body if isinstance(body, list) else [body]
+                # PostgREST upserts on the primary key unless on_conflict names a column
+                on_conflict = query.get('on_conflict', 'id') if 'merge-duplicates' in prefer else None
+                try:
+                    result = [self._insert(name, dict(v), on_conflict) for v in values]
+                except ValueError as e:
+                    return 409, {'code': '23505', 'message': str(e)}, {}
+                status = 201
+            elif method == 'PATCH':
+                result = [row for row in rows if self._matches(row, filters)]
+                for row in result:
+                    row.update(body or {})
+                status = 200
+            elif method == 'DELETE':
+                result = [row for row in rows if self._matches(row, filters)]
+                self.tables[name] = [row for row in rows if row not in result]
+                status = 200
+            else:
+                result = [row for row in rows if self._matches(row, filters)]
+                if 'order' in query:
+                    column, _, direction = query['order'].partition('.')
+                    result.sort(key=lambda row: (row.get(column) is None, row.get(column) or ''),
+                                reverse=direction.startswith('desc'))
+                total = len(result)
+                if headers.get('Range'):
+                    start, _, end = headers['Range'].partition('-')
+                    result = result[int(start):int(end) + 1]
+                if 'limit' in query:
+                    result = result[:int(query['limit'])]
+                extra = {}
+                if 'count=exact' in prefer:
+                    extra['Content-Range'] = f"0-{max(len(result) - 1, 0)}/{total}"
+                columns = query.get('select', '*')
+                if columns != '*':
+                    names = columns.split(',')
+                    result = [{column: row.get(column) for column in names} for row in result]
+                return 200, [dict(row) for row in result], extra
+
+            if 'return=minimal' in prefer:
+                return status, None, {}
+            return status, [dict(row) for row in result], {}
+
+    def _build_server(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; avoid delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def _dispatch(self):
+                url = urlparse(self.path)
+                if hasattr(socket, 'TCP_QUICKACK'):
+                    # Clients often send the body as a second segment behind Nagle; ack the
+                    # headers now instead of after the delayed-ACK timeout
+                    self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length) if length else b''
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = None
+                status, payload, extra = stub._handle(
+                    self.command, url.path, parse_qsl(url.query, keep_blank_values=True), self.headers, body
+                )
+                data = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in extra.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _dispatch
+
+            def log_message(self, format, *args):
+                logger.debug("fake postgrest: " + format % args)
+
+        return _QuietHTTPServer((self.host, self.port), Handler)
@@ -0,0 +1,53 @@
+# auth/utils/otp_attempts.py
+from .counter_store import CounterStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+class OTPAttemptLimiter:
+    """Caps verification guesses per identifier with a CounterStore.
+
+    ``attempt`` reserves a guess before the code is checked, so concurrent
+    guesses cannot get past ``max_attempts``; once they are used up every
+    further guess is refused without touching the database until ``reset``
+    (the code was consumed, or a new one is issued) or ``ttl`` passes.
+    """
+
+    def __init__(self, store: CounterStore, max_attempts: int, ttl: float, prefix: str = 'otp'):
+        self.store = store
+        self.max_attempts = max_attempts
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def attempt(self, channel: str, identifier: str) -> int:
+        """Reserve a guess; returns its number, counting earlier ones (0 if the store failed)."""
+        try:
+            return self.store.incr(self._key(channel, identifier), 1, ttl=self.ttl)
+        except Exception as e:
+            logger.error("OTP attempt counter error: %s", e)
+            return 0  # Let the guess through rather than block verification
+
+    def exhausted(self, attempt: int) -> bool:
+        """True if the guess is over the limit and must be refused."""
+        return attempt > self.max_attempts
+
+    def last(self, attempt: int) -> bool:
+        """True if the guess used up the limit."""
+        return attempt == self.max_attempts
+
+    def failures(self, channel: str, identifier: str) -> int:
+        """Guesses counted since the last reset."""
+        try:
+            return self.store.get(self._key(channel, identifier))
+        except Exception as e:
+            logger.error("OTP attempt counter error: %s", e)
+            return 0
+
+    def reset(self, channel: str, identifier: str):
+        try:
+            self.store.delete(self._key(channel, identifier))
+        except Exception as e:
+            logger.error("OTP attempt counter error: %s", e)
+
+    def _key(self, channel: str, identifier: str) -> str:
+        return f"{self.prefix}:{channel}:{identifier}"
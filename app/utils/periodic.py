@@ -0,0 +1,60 @@
+# auth/utils/periodic.py
+import atexit
+import os
+import threading
+from typing import Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """Run ``fn`` every ``interval`` seconds on a daemon thread.
+
+    The thread is started per process on first ``start()`` call, so it is safe
+    to create instances at import time under a forking server. ``on_stop`` runs
+    once when the process exits (e.g. a final flush).
+    """
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], None],
+                 on_stop: Optional[Callable[[], None]] = None, run_immediately: bool = False):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.on_stop = on_stop
+        self.run_immediately = run_immediately
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def stop(self, timeout: float = 5.0):
+        if self._pid != os.getpid() or self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.on_stop is not None:
+            self._call(self.on_stop)
+
+    def _run(self):
+        if self.run_immediately:
+            self._call(self.fn)
+        while not self._stop.wait(self.interval):
+            self._call(self.fn)
+
+    def _call(self, fn: Callable[[], None]):
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"{self.name}: periodic task failed: {e}")
@@ -1,65 +1,194 @@
 # auth/utils/rate_limiter.py
-from datetime import datetime, timedelta
-from typing import Tuple
-from ..config import Config, supabase_client
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, NamedTuple, Optional
+from .. import metrics
+from ..config import Config
+from ..repositories import repositories
+from .batch_writer import BatchWriter
+from .counter_store import CounterStore, create_counter_store
 import logging
+import math
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-def check_rate_limit(identifier: str, ip_address: str) -> bool:
-    """Check if the attempts exceed rate limit."""
-    try:
-        # Count attempts in the last window
-        window_start = (datetime.utcnow() - timedelta(seconds=Config.RATE_LIMIT_WINDOW)).isoformat()
-        
-        result = supabase_client.table('login_attempts').select('*').filter(
-            'created_at', 'gt', window_start
-        ).filter('identifier', 'eq', identifier).execute()
-
-        attempts = len(result.data)
-        
-        # Log the check for debugging
-        logger.debug(f"Rate limit check - Identifier: {identifier}, "
-                    f"Attempts: {attempts}, Limit: {Config.MAX_LOGIN_ATTEMPTS}")
-        
-        return attempts < Config.MAX_LOGIN_ATTEMPTS
-
-    except Exception as e:
-        logger.error(f"Rate limit check error: {e}")
-        return True  # Allow on error to prevent blocking legitimate users
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the next attempt is allowed, 0 if allowed now
+
+    @property
+    def wait_time(self) -> int:
+        """Retry-after rounded up to whole seconds, for responses."""
+        return int(math.ceil(self.retry_after))
+
+class MemoryRateLimitBackend:
+    """Exact sliding-window log kept in process memory."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._hits: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> RateLimitDecision:
+        with self._lock:
+            hits = self._prune(key, window, now)
+            if len(hits) >= limit:
+                return RateLimitDecision(False, 0, hits[len(hits) - limit] + window - now)
+            if key not in self._hits:
+                self._hits[key] = hits
+            hits.append(now)
+            if len(self._hits) > self.max_keys:
+                self._evict(window, now)
+            return RateLimitDecision(True, limit - len(hits), 0.0)
+
+    def peek(self, key: str, limit: int, window: float, now: float) -> RateLimitDecision:
+        with self._lock:
+            hits = self._prune(key, window, now)
+            if len(hits) >= limit:
+                return RateLimitDecision(False, 0, hits[len(hits) - limit] + window - now)
+            return RateLimitDecision(True, limit - len(hits), 0.0)
+
+    def reset(self, key: str, window: float, now: float):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _prune(self, key: str, window: float, now: float) -> Deque[float]:
+        hits = self._hits.get(key)
+        if hits is None:
+            return deque()
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        return hits
+
+    def _evict(self, window: float, now: float):
+        """Drop idle keys, then the oldest ones if still over capacity."""
+        for key in [k for k, h in self._hits.items() if not h or h[-1] <= now - window]:
+            del self._hits[key]
+        while len(self._hits) > self.max_keys:
+            del self._hits[next(iter(self._hits))]
+
+class SharedStoreRateLimitBackend:
+    """Sliding-window counter over a shared CounterStore.
+
+    Each key keeps one counter per fixed window; the effective count is the
+    current bucket plus the previous bucket weighted by how much of it still
+    overlaps the sliding window.
+    """
+
+    def __init__(self, store: CounterStore, prefix: str = 'rl'):
+        self.store = store
+        self.prefix = prefix
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> RateLimitDecision:
+        bucket, elapsed = divmod(now, window)
+        current_key = self._key(key, bucket)
+        previous = self.store.get(self._key(key, bucket - 1))
+        current = self.store.incr(current_key, 1, ttl=2 * window)
+
+        if self._estimate(previous, current, elapsed, window) > limit:
+            self.store.incr(current_key, -1)
+            return RateLimitDecision(False, 0, self._retry_after(previous, current - 1, elapsed, limit, window))
+
+        remaining = limit - int(math.ceil(self._estimate(previous, current, elapsed, window)))
+        return RateLimitDecision(True, max(0, remaining), 0.0)
+
+    def peek(self, key: str, limit: int, window: float, now: float) -> RateLimitDecision:
+        bucket, elapsed = divmod(now, window)
+        previous = self.store.get(self._key(key, bucket - 1))
+        current = self.store.get(self._key(key, bucket))
+        count = self._estimate(previous, current, elapsed, window)
+        if count + 1 > limit:
+            return RateLimitDecision(False, 0, self._retry_after(previous, current, elapsed, limit, window))
+        return RateLimitDecision(True, max(0, limit - int(math.ceil(count))), 0.0)
+
+    def reset(self, key: str, window: float, now: float):
+        bucket = now // window
+        for offset in (0, -1):
+            self.store.delete(self._key(key, bucket + offset))
+
+    def _key(self, key: str, bucket: float) -> str:
+        return f"{self.prefix}:{key}:{int(bucket)}"
+
+    @staticmethod
+    def _estimate(previous: int, current: int, elapsed: float, window: float) -> float:
+        return previous * (1 - elapsed / window) + current
+
+    @staticmethod
+    def _retry_after(previous: int, current: int, elapsed: float, limit: int, window: float) -> float:
+        """Seconds until one more hit fits under the limit."""
+        if current + 1 > limit:
+            # Must wait for the current bucket to become the previous one and decay
+            return (window - elapsed) + window * (1 - (limit - 1) / current)
+        if not previous:
+            return 0.0
+        # Wait for the previous bucket's weight to decay enough
+        return max(0.0, window * (1 - (limit - 1 - current) / previous) - elapsed)
+
+class RateLimiter:
+    """Rate-limit engine deciding allow/deny in one call against a pluggable backend."""
+
+    def __init__(self, backend, limit: int, window: float):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+
+    def hit(self, identifier: str) -> RateLimitDecision:
+        """Record an attempt if allowed and return the decision."""
+        try:
+            with metrics.stage('rate_limit'):
+                decision = self.backend.hit(identifier, self.limit, self.window, time.time())
+        except Exception as e:
+            logger.error("Rate limit check error: %s", e)
+            return RateLimitDecision(True, self.limit, 0.0)  # Allow on error to prevent blocking legitimate users
+        if not decision.allowed:
+            metrics.RATE_LIMIT_REJECTIONS.inc()
+        return decision
+
+    def peek(self, identifier: str) -> RateLimitDecision:
+        """Return the decision for the next attempt without recording one."""
+        try:
+            return self.backend.peek(identifier, self.limit, self.window, time.time())
+        except Exception as e:
+            logger.error("Rate limit check error: %s", e)
+            return RateLimitDecision(True, self.limit, 0.0)
+
+    def reset(self, identifier: str):
+        """Forget all recorded attempts for the identifier."""
+        self.backend.reset(identifier, self.window, time.time())
+
+def create_rate_limiter(backend_name: Optional[str] = None) -> RateLimiter:
+    """Build the rate limiter configured in Config."""
+    backend_name = backend_name or Config.RATE_LIMIT_BACKEND
+    if backend_name == 'memory':
+        backend = MemoryRateLimitBackend()
+    elif backend_name == 'shared':
+        backend = SharedStoreRateLimitBackend(create_counter_store(Config.RATE_LIMIT_STORE_URL))
+    else:
+        raise ValueError(f"Unknown rate limit backend: {backend_name}")
+    return RateLimiter(backend, Config.MAX_LOGIN_ATTEMPTS, Config.RATE_LIMIT_WINDOW)
+
+rate_limiter = create_rate_limiter()
+
+def _write_attempts(records: List[Dict]):
+    """Bulk insert buffered attempts; runs on the attempt writer thread."""
+    repositories.attempts.insert_many(records)
+
+attempt_writer = BatchWriter(
+    _write_attempts,
+    name='login-attempts-writer',
+    max_batch=Config.ATTEMPT_LOG_BATCH_SIZE,
+    flush_interval=Config.ATTEMPT_LOG_FLUSH_INTERVAL,
+    max_queue=Config.ATTEMPT_LOG_QUEUE_SIZE
+)
 
 def log_attempt(identifier: str, ip_address: str, success: bool):
-    """Log an authentication attempt."""
-    try:
-        # Clean up old records first (optional but recommended)
-        cleanup_window = (datetime.utcnow() - timedelta(days=1)).isoformat()
-        supabase_client.table('login_attempts').delete().filter(
-            'created_at', 'lt', cleanup_window
-        ).execute()
-
-        # Log new attempt
-        supabase_client.table('login_attempts').insert({
-            'identifier': identifier,
-            'ip_address': ip_address,
-            'success': success,
-            'created_at': datetime.utcnow().isoformat()
-        }).execute()
-
-    except Exception as e:
-        logger.error(f"Error logging attempt: {e}")
-
-def get_remaining_attempts(identifier: str) -> int:
-    """Get remaining attempts for the identifier."""
-    try:
-        window_start = (datetime.utcnow() - timedelta(seconds=Config.RATE_LIMIT_WINDOW)).isoformat()
-        
-        result = supabase_client.table('login_attempts').select('*').filter(
-            'created_at', 'gt', window_start
-        ).filter('identifier', 'eq', identifier).execute()
-
-        attempts = len(result.data)
-        return max(0, Config.MAX_LOGIN_ATTEMPTS - attempts)
-
-    except Exception as e:
-        logger.error(f"Error getting remaining attempts: {e}")
-        return Config.MAX_LOGIN_ATTEMPTS  # Return max on error
\ No newline at end of file
+    """Queue an authentication attempt for the background writer."""
+    attempt_writer.put({
+        'identifier': identifier,
+        'ip_address': ip_address,
+        'success': success,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    })
@@ -0,0 +1,164 @@
+# auth/utils/single_flight.py
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from .counter_store import CounterStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class _Call:
+    """An operation in flight; waiters block on ``done`` and share its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Run an operation once per key at a time and replay its recent result.
+
+    Callers arriving while the operation for their key is running wait for it
+    and share its result. A result for which ``keep`` is true is replayed to
+    later callers of the key for ``ttl`` seconds. With a shared ``store`` the
+    first caller also claims the key there, so a caller in another worker
+    process or node that finds it claimed gets ``duplicate()`` instead of
+    running the operation again. ``run`` and ``run_async`` return the result
+    and how it was obtained: 'run', 'joined', 'replayed' or 'claimed'.
+    """
+
+    def __init__(self, store: Optional[CounterStore] = None, prefix: str = 'sf', max_keys: int = 100000):
+        self.store = store
+        self.prefix = prefix
+        self.max_keys = max_keys
+        self._results: Dict[str, Tuple[Any, float]] = {}
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: str, fn: Callable[[], Any], ttl: float,
+            keep: Callable[[Any], bool] = lambda result: True,
+            duplicate: Optional[Callable[[], Any]] = None) -> Tuple[Any, str]:
+        with self._lock:
+            result = self._recent(key)
+            if result is not _MISSING:
+                return result, 'replayed'
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, 'joined'
+
+        outcome = 'run'
+        try:
+            if duplicate is not None and self._claimed(key, ttl):
+                call.result, outcome = duplicate(), 'claimed'
+            else:
+                call.result = fn()
+            return call.result, outcome
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(self._calls, key, call.result if call.error is None else _MISSING, outcome, ttl, keep)
+            call.done.set()
+
+    async def run_async(self, key: str, fn: Callable[[], Awaitable[Any]], ttl: float,
+                        keep: Callable[[Any], bool] = lambda result: True,
+                        duplicate: Optional[Callable[[], Any]] = None) -> Tuple[Any, str]:
+        """``run`` for coroutines; callers on the event loop wait without blocking it."""
+        with self._lock:
+            result = self._recent(key)
+        if result is not _MISSING:
+            return result, 'replayed'
+        future = self._async_calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), 'joined'
+
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        outcome, result = 'run', _MISSING
+        try:
+            # A shared store may be a network round trip; keep it off the event loop
+            if duplicate is not None and self.store is not None and await asyncio.to_thread(self._claimed, key, ttl):
+                result, outcome = duplicate(), 'claimed'
+            else:
+                result = await fn()
+            future.set_result(result)
+            return result, outcome
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieved here so an exception nobody joined on is not reported as unhandled
+            future.exception()
+            raise
+        finally:
+            self._finish(self._async_calls, key, result, outcome, ttl, keep)
+
+    def recent(self, key: str) -> Optional[Any]:
+        """The result being replayed for the key, or None."""
+        with self._lock:
+            result = self._recent(key)
+        return None if result is _MISSING else result
+
+    def forget(self, key: str):
+        """Drop the replayed result and the shared claim, e.g. when the operation later failed."""
+        with self._lock:
+            self._results.pop(key, None)
+        if self.store is not None:
+            try:
+                self.store.delete(self._store_key(key))
+            except Exception as e:
+                logger.error("Error releasing single-flight claim: %s", e)
+
+    def _recent(self, key: str) -> Any:
+        entry = self._results.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[1] <= time.monotonic():
+            del self._results[key]
+            return _MISSING
+        return entry[0]
+
+    def _claimed(self, key: str, ttl: float) -> bool:
+        """Claim the key in the shared store; True if another process already holds it."""
+        if self.store is None:
+            return False
+        try:
+            return self.store.incr(self._store_key(key), 1, ttl=ttl) > 1
+        except Exception as e:
+            logger.error("Single-flight claim error: %s", e)
+            return False  # Run the operation rather than fail the request
+
+    def _finish(self, calls: Dict, key: str, result: Any, outcome: str, ttl: float,
+                keep: Callable[[Any], bool]):
+        """Retire the call and remember its result in one step, so no caller sees neither."""
+        kept = outcome == 'run' and result is not _MISSING and keep(result)
+        with self._lock:
+            del calls[key]
+            if kept:
+                now = time.monotonic()
+                self._results[key] = (result, now + ttl)
+                if len(self._results) > self.max_keys:
+                    self._evict(now)
+        if outcome == 'run' and not kept:
+            # Let the next caller try again, here or elsewhere
+            self.forget(key)
+
+    def _evict(self, now: float):
+        """Drop expired results, then the oldest ones if still over capacity."""
+        for key in [k for k, (_, expires) in self._results.items() if expires <= now]:
+            del self._results[key]
+        while len(self._results) > self.max_keys:
+            del self._results[next(iter(self._results))]
+
+    def _store_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
@@ -0,0 +1,154 @@
+# auth/utils/structured_logging.py
+import atexit
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueListener
+from typing import List, Optional, Tuple
+
+# Attributes of every LogRecord; anything else on a record came from ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+# ``extra`` fields never written out as-is
+REDACTED_FIELDS = {'otp', 'code', 'password', 'token', 'access_token', 'refresh_token', 'authorization'}
+
+# Libraries that log every request at DEBUG; kept at the configured level
+QUIET_LOGGERS = ('urllib3', 'httpx', 'httpcore', 'hpack', 'hpack.hpack', 'hpack.table')
+
+_request_id: ContextVar[Optional[str]] = ContextVar('log_request_id', default=None)
+_debug: ContextVar[bool] = ContextVar('log_debug', default=False)
+
+def begin_request(request_id: str, debug: bool = False) -> Tuple:
+    """Tag log records of the current request; returns tokens for ``end_request``."""
+    return _request_id.set(request_id), _debug.set(debug)
+
+def end_request(tokens: Tuple):
+    request_token, debug_token = tokens
+    _request_id.reset(request_token)
+    _debug.reset(debug_token)
+
+def debug_requested(header_value: Optional[str], token: Optional[str], sample_rate: float) -> bool:
+    """DEBUG logging for a request: a matching debug header, or a random sample."""
+    if token and header_value and hmac.compare_digest(header_value.encode(), token.encode()):
+        return True
+    return sample_rate > 0 and random.random() < sample_rate
+
+class ContextFilter(logging.Filter):
+    """Runs on the calling thread: stamps the request ID and drops records below
+    ``level`` unless debug logging is on for the current request."""
+
+    def __init__(self, level: int = logging.INFO):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level and not _debug.get():
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with ``extra`` fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = '[redacted]' if key in REDACTED_FIELDS else value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class AsyncLogHandler(logging.Handler):
+    """Enqueue records for a listener thread that formats and writes them.
+
+    The caller pays for filtering and a non-blocking put; message formatting
+    (``%`` arguments), JSON encoding and stream I/O happen on the listener.
+    Arguments must therefore not be mutated after the logging call. When the
+    queue is full records are dropped and counted. The listener is started per
+    process on first use, so the handler can be installed before a fork.
+    """
+
+    def __init__(self, handlers: List[logging.Handler], max_queue: int = 10000):
+        super().__init__()
+        self.handlers = handlers
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: Optional[queue.Queue] = None
+        self._listener: Optional[QueueListener] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def emit(self, record: logging.LogRecord):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out queued records and stop the listener."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so start one per process on first use
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # A queue inherited from the parent may hold records it already wrote
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._listener = QueueListener(self._queue, *self.handlers, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+_handler: Optional[AsyncLogHandler] = None
+
+def setup_logging(level: str = 'INFO', json_format: bool = True, debug_available: bool = False,
+                  max_queue: int = 10000) -> AsyncLogHandler:
+    """Route all logging through one AsyncLogHandler on the root logger.
+
+    ``debug_available`` lowers the root level to DEBUG so that sampled or
+    explicitly requested requests can log at DEBUG; other requests drop those
+    records in ContextFilter. Calling it again returns the installed handler.
+    """
+    global _handler
+    if _handler is not None:
+        return _handler
+
+    stream = logging.StreamHandler(sys.stdout)
+    if json_format:
+        stream.setFormatter(JSONFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s]: %(message)s'))
+
+    level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    _handler = AsyncLogHandler([stream], max_queue)
+    _handler.addFilter(ContextFilter(level))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(logging.DEBUG if debug_available else level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+    return _handler
@@ -23,6 +23,10 @@ def validate_phone(phone: str) -> Tuple[bool, str]:
     
     return bool(re.match(pattern, phone)), phone
 
+def validate_idempotency_key(key: str) -> bool:
+    """Validate an Idempotency-Key header value."""
+    return bool(re.match(r'^[\x21-\x7e]{1,255}$', key))
+
 def validate_password(password: str) -> Tuple[bool, str]:
     """Validate password strength."""
     if len(password) < 8:
@@ -0,0 +1,5 @@
+# auth_client/__init__.py
+"""Client helpers for services that consume auth-server tokens."""
+from .verifier import JWKSVerifier
+
+__all__ = ['JWKSVerifier']
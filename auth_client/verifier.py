@@ -0,0 +1,88 @@
+# auth_client/verifier.py
+import json
+import threading
+import time
+import urllib.request
+from typing import Dict, Optional, Sequence
+import jwt
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+import logging
+
+logger = logging.getLogger(__name__)
+
+class JWKSVerifier:
+    """Verify auth-server tokens offline against its published JWKS.
+
+    The key set is fetched from ``/.well-known/jwks.json`` and cached in
+    process for ``cache_ttl`` seconds. A token with an unknown ``kid`` (after a
+    key rotation) triggers a refetch. Fetches, failed ones included, are at
+    least ``min_refresh_interval`` apart; the cached keys are served meanwhile.
+
+        verifier = JWKSVerifier('https://auth.example.com/.well-known/jwks.json')
+        payload = verifier.verify(token)  # None if invalid
+    """
+
+    def __init__(self, jwks_url: str, cache_ttl: float = 3600, min_refresh_interval: float = 30,
+                 algorithms: Sequence[str] = ('RS256', 'EdDSA'), timeout: float = 5):
+        self.jwks_url = jwks_url
+        self.cache_ttl = cache_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.algorithms = set(algorithms)
+        self.timeout = timeout
+        self._keys: Dict[str, tuple] = {}
+        self._fetched_at = float('-inf')
+        self._attempted_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def verify(self, token: str, token_type: str = 'access') -> Optional[Dict]:
+        """Return the token payload if valid and of the given type, else None."""
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+            key = self._get_key(kid)
+            if key is None:
+                logger.warning("Unknown signing key: %s", kid)
+                return None
+            public_key, algorithm = key
+            payload = jwt.decode(token, public_key, algorithms=[algorithm])
+        except jwt.InvalidTokenError as e:
+            logger.debug("Invalid token: %s", e)
+            return None
+
+        if payload.get('type') != token_type:
+            return None
+        return payload
+
+    def _get_key(self, kid: Optional[str]) -> Optional[tuple]:
+        now = time.monotonic()
+        with self._lock:
+            stale = now - self._fetched_at > self.cache_ttl
+            missing = kid not in self._keys
+            # A failed fetch counts too, so an unreachable server is not retried
+            # (and waited on for up to the timeout) by every verify call
+            if (stale or missing) and now - self._attempted_at > self.min_refresh_interval:
+                self._attempted_at = now
+                try:
+                    self._keys = self._fetch()
+                    self._fetched_at = now
+                except Exception as e:
+                    # Keep serving the cached keys if the server is unreachable
+                    logger.error("Failed to fetch JWKS: %s", e)
+            return self._keys.get(kid)
+
+    def _fetch(self) -> Dict[str, tuple]:
+        with urllib.request.urlopen(self.jwks_url, timeout=self.timeout) as response:
+            jwks = json.load(response)
+
+        keys = {}
+        for jwk in jwks.get('keys', []):
+            algorithm = jwk.get('alg')
+            if algorithm not in self.algorithms:
+                continue
+            if jwk.get('kty') == 'RSA':
+                public_key = RSAAlgorithm.from_jwk(jwk)
+            elif jwk.get('kty') == 'OKP':
+                public_key = OKPAlgorithm.from_jwk(jwk)
+            else:
+                continue
+            keys[jwk['kid']] = (public_key, algorithm)
+        return keys
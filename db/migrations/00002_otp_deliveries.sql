@@ -0,0 +1,23 @@
+-- 00002_otp_deliveries.sql
+
+-- OTP delivery jobs (status only; the code itself lives in verification_codes)
+CREATE TABLE otp_deliveries (
+    id uuid PRIMARY KEY,
+    channel text NOT NULL CHECK (channel IN ('email', 'phone')),
+    recipient text NOT NULL,
+    status text NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'sending', 'retrying', 'delivered', 'failed')),
+    attempts integer NOT NULL DEFAULT 0,
+    last_error text,
+    created_at timestamptz DEFAULT timezone('utc'::text, now()),
+    updated_at timestamptz DEFAULT timezone('utc'::text, now())
+);
+
+ALTER TABLE otp_deliveries ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "otp_deliveries_all_access" ON otp_deliveries
+    FOR ALL
+    TO authenticated, anon
+    USING (true)
+    WITH CHECK (true);
+
+GRANT ALL ON otp_deliveries TO anon;
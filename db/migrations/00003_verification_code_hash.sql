@@ -0,0 +1,11 @@
+-- 00003_verification_code_hash.sql
+
+-- Codes are looked up by a keyed digest of (channel, identifier, code)
+-- instead of the plaintext code.
+ALTER TABLE verification_codes ADD COLUMN code_hash text;
+ALTER TABLE verification_codes ALTER COLUMN code DROP NOT NULL;
+
+-- Only unverified codes are ever looked up
+CREATE INDEX verification_codes_code_hash_idx
+    ON verification_codes (code_hash)
+    WHERE verified = false;
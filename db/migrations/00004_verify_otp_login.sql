@@ -0,0 +1,80 @@
+-- 00004_verify_otp_login.sql
+
+-- Refresh tokens are identified by their JTI claim so the row can be created
+-- before the token is signed.
+ALTER TABLE refresh_tokens ADD COLUMN jti uuid;
+ALTER TABLE refresh_tokens ALTER COLUMN token DROP NOT NULL;
+CREATE UNIQUE INDEX refresh_tokens_jti_idx ON refresh_tokens (jti);
+
+-- Consume a verification code, upsert the user, open a session and register
+-- a refresh token in one transaction. Returns no row if the code is invalid,
+-- already used or expired.
+CREATE OR REPLACE FUNCTION verify_otp_login(
+    p_code_hash text,
+    p_channel text,
+    p_identifier text,
+    p_refresh_jti uuid,
+    p_refresh_expires_at timestamptz,
+    p_device_info jsonb DEFAULT NULL
+)
+RETURNS TABLE (app_user jsonb, session_id uuid, refresh_token jsonb) AS $$
+DECLARE
+    v_code verification_codes%ROWTYPE;
+    v_user users%ROWTYPE;
+    v_session_id uuid;
+    v_token refresh_tokens%ROWTYPE;
+BEGIN
+    -- Row lock makes concurrent verifies of the same code consume it once
+    UPDATE verification_codes
+       SET verified = true,
+           verified_at = timezone('utc'::text, now())
+     WHERE id = (
+            SELECT id FROM verification_codes
+             WHERE code_hash = p_code_hash
+               AND verified = false
+               AND expires_at > now()
+             LIMIT 1
+             FOR UPDATE SKIP LOCKED
+           )
+    RETURNING * INTO v_code;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    IF p_channel = 'email' THEN
+        INSERT INTO users (email, email_verified, name, auth_type)
+        VALUES (p_identifier, true, v_code.name, 'email')
+        ON CONFLICT (email) DO UPDATE
+            SET email_verified = true,
+                name = COALESCE(NULLIF(EXCLUDED.name, ''), users.name)
+        RETURNING * INTO v_user;
+    ELSE
+        INSERT INTO users (phone_number, phone_verified, name, auth_type)
+        VALUES (p_identifier, true, v_code.name, 'phone')
+        ON CONFLICT (phone_number) DO UPDATE
+            SET phone_verified = true,
+                name = COALESCE(NULLIF(EXCLUDED.name, ''), users.name)
+        RETURNING * INTO v_user;
+    END IF;
+
+    INSERT INTO user_sessions (user_id, device_info, is_active, last_activity)
+    VALUES (v_user.id, p_device_info, true, timezone('utc'::text, now()))
+    RETURNING id INTO v_session_id;
+
+    INSERT INTO refresh_tokens (user_id, jti, expires_at)
+    VALUES (v_user.id, p_refresh_jti, p_refresh_expires_at)
+    RETURNING * INTO v_token;
+
+    RETURN QUERY SELECT
+        to_jsonb(v_user),
+        v_session_id,
+        jsonb_build_object(
+            'id', v_token.id,
+            'jti', v_token.jti,
+            'expires_at', v_token.expires_at
+        );
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION verify_otp_login(text, text, text, uuid, timestamptz, jsonb) TO anon;
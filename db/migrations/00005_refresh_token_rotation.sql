@@ -0,0 +1,59 @@
+-- 00005_refresh_token_rotation.sql
+
+-- Refresh tokens are no longer stored in clear. Tokens with a jti claim are
+-- looked up by jti; tokens issued before that by a SHA-256 digest.
+ALTER TABLE refresh_tokens ADD COLUMN token_digest text;
+ALTER TABLE refresh_tokens ADD COLUMN revoked_at timestamptz;
+
+UPDATE refresh_tokens
+   SET token_digest = encode(sha256(convert_to(token, 'UTF8')), 'hex')
+ WHERE token IS NOT NULL;
+
+UPDATE refresh_tokens
+   SET revoked_at = timezone('utc'::text, now())
+ WHERE is_revoked AND revoked_at IS NULL;
+
+ALTER TABLE refresh_tokens DROP COLUMN token;
+
+CREATE INDEX refresh_tokens_token_digest_idx
+    ON refresh_tokens (token_digest)
+    WHERE token_digest IS NOT NULL;
+
+-- Incremental sync of the in-process revocation filter
+CREATE INDEX refresh_tokens_revoked_at_idx
+    ON refresh_tokens (revoked_at)
+    WHERE is_revoked;
+
+-- Revoke a refresh token on use and register its replacement in one
+-- transaction. Pass either p_jti or p_token_digest. Returns the owner's
+-- user_id, or no row if the token is unknown, revoked or expired.
+CREATE OR REPLACE FUNCTION rotate_refresh_token(
+    p_jti uuid,
+    p_token_digest text,
+    p_new_jti uuid,
+    p_new_expires_at timestamptz
+)
+RETURNS TABLE (user_id uuid) AS $$
+DECLARE
+    v_user_id uuid;
+BEGIN
+    UPDATE refresh_tokens AS rt
+       SET is_revoked = true,
+           revoked_at = timezone('utc'::text, now())
+     WHERE (rt.jti = p_jti OR (p_jti IS NULL AND rt.token_digest = p_token_digest))
+       AND NOT rt.is_revoked
+       AND rt.expires_at > now()
+    RETURNING rt.user_id INTO v_user_id;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO refresh_tokens (user_id, jti, expires_at)
+    VALUES (v_user_id, p_new_jti, p_new_expires_at);
+
+    RETURN QUERY SELECT v_user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION rotate_refresh_token(uuid, text, uuid, timestamptz) TO anon;
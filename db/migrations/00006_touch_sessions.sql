@@ -0,0 +1,18 @@
+-- 00006_touch_sessions.sql
+
+-- Bulk update of user_sessions.last_activity from the in-process activity
+-- tracker. Arrays are matched by position. Activity never moves backwards,
+-- so flushes from several workers may arrive in any order.
+CREATE OR REPLACE FUNCTION touch_sessions(
+    p_session_ids uuid[],
+    p_seen_at timestamptz[]
+)
+RETURNS void AS $$
+    UPDATE user_sessions AS s
+       SET last_activity = GREATEST(s.last_activity, t.seen_at)
+      FROM unnest(p_session_ids, p_seen_at) AS t(id, seen_at)
+     WHERE s.id = t.id
+       AND s.is_active;
+$$ LANGUAGE sql;
+
+GRANT EXECUTE ON FUNCTION touch_sessions(uuid[], timestamptz[]) TO anon;
@@ -0,0 +1,103 @@
+-- 00007_retention.sql
+
+-- Leases for background jobs that must run on one worker in the whole
+-- cluster. A holder keeps its lease by re-acquiring it before it expires;
+-- once expired, any other holder can take it over.
+CREATE TABLE maintenance_leases (
+    name text PRIMARY KEY,
+    holder text NOT NULL,
+    expires_at timestamptz NOT NULL
+);
+
+ALTER TABLE maintenance_leases ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "maintenance_leases_all_access" ON maintenance_leases
+    FOR ALL
+    TO authenticated, anon
+    USING (true)
+    WITH CHECK (true);
+
+-- Returns one row (true) if p_holder now holds the lease, no row otherwise
+CREATE OR REPLACE FUNCTION acquire_lease(
+    p_name text,
+    p_holder text,
+    p_ttl_seconds integer
+)
+RETURNS TABLE (acquired boolean) AS $$
+    INSERT INTO maintenance_leases AS l (name, holder, expires_at)
+    VALUES (p_name, p_holder, now() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (name) DO UPDATE
+       SET holder = EXCLUDED.holder,
+           expires_at = EXCLUDED.expires_at
+     WHERE l.holder = EXCLUDED.holder
+        OR l.expires_at < now()
+    RETURNING true;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION release_lease(p_name text, p_holder text)
+RETURNS void AS $$
+    DELETE FROM maintenance_leases WHERE name = p_name AND holder = p_holder;
+$$ LANGUAGE sql;
+
+-- Indexes for the purge predicates below
+CREATE INDEX verification_codes_expires_at_idx ON verification_codes (expires_at);
+CREATE INDEX refresh_tokens_expires_at_idx ON refresh_tokens (expires_at);
+CREATE INDEX user_sessions_ended_at_idx ON user_sessions (ended_at) WHERE NOT is_active;
+CREATE INDEX login_attempts_created_at_idx ON login_attempts (created_at);
+CREATE INDEX otp_deliveries_updated_at_idx ON otp_deliveries (updated_at);
+
+-- Delete at most p_limit rows of one purge target older than p_cutoff and
+-- return how many were deleted. Rows locked by other transactions are
+-- skipped, so a batch never waits on request traffic.
+CREATE OR REPLACE FUNCTION purge_expired(
+    p_target text,
+    p_cutoff timestamptz,
+    p_limit integer
+)
+RETURNS TABLE (deleted integer) AS $$
+DECLARE
+    v_deleted integer;
+BEGIN
+    IF p_target = 'verification_codes' THEN
+        DELETE FROM verification_codes WHERE id IN (
+            SELECT id FROM verification_codes
+             WHERE expires_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'refresh_tokens_expired' THEN
+        DELETE FROM refresh_tokens WHERE id IN (
+            SELECT id FROM refresh_tokens
+             WHERE expires_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'refresh_tokens_revoked' THEN
+        DELETE FROM refresh_tokens WHERE id IN (
+            SELECT id FROM refresh_tokens
+             WHERE is_revoked AND revoked_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'user_sessions' THEN
+        DELETE FROM user_sessions WHERE id IN (
+            SELECT id FROM user_sessions
+             WHERE NOT is_active AND ended_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'login_attempts' THEN
+        DELETE FROM login_attempts WHERE id IN (
+            SELECT id FROM login_attempts
+             WHERE created_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'otp_deliveries' THEN
+        DELETE FROM otp_deliveries WHERE id IN (
+            SELECT id FROM otp_deliveries
+             WHERE updated_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSE
+        RAISE EXCEPTION 'Unknown purge target: %', p_target;
+    END IF;
+
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN QUERY SELECT v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT ALL ON maintenance_leases TO anon;
+GRANT EXECUTE ON FUNCTION acquire_lease(text, text, integer) TO anon;
+GRANT EXECUTE ON FUNCTION release_lease(text, text) TO anon;
+GRANT EXECUTE ON FUNCTION purge_expired(text, timestamptz, integer) TO anon;
@@ -0,0 +1,173 @@
+-- 00008_indexes_and_partitions.sql
+
+-- Indexes for the remaining hot lookups. Lookups by email, phone_number,
+-- code_hash, jti and token_digest are covered by earlier migrations.
+
+-- Revoke all of a user's tokens (logout everywhere)
+CREATE INDEX refresh_tokens_user_id_active_idx
+    ON refresh_tokens (user_id)
+    WHERE NOT is_revoked;
+
+-- List and end a user's active sessions
+CREATE INDEX user_sessions_user_id_active_idx
+    ON user_sessions (user_id)
+    WHERE is_active;
+
+-- The revocation filter reads jti and expires_at of revoked tokens in
+-- revoked_at order; including them makes its scans index-only
+DROP INDEX refresh_tokens_revoked_at_idx;
+CREATE INDEX refresh_tokens_revoked_at_idx
+    ON refresh_tokens (revoked_at) INCLUDE (jti, expires_at)
+    WHERE is_revoked;
+
+-- login_attempts is range-partitioned by UTC day, so retention drops whole
+-- partitions instead of deleting rows. Rows outside every daily partition
+-- land in login_attempts_default and are deleted in batches.
+ALTER TABLE login_attempts RENAME TO login_attempts_unpartitioned;
+
+CREATE TABLE login_attempts (
+    id uuid DEFAULT uuid_generate_v4() NOT NULL,
+    identifier text NOT NULL, -- email or phone
+    ip_address text NOT NULL,
+    success boolean DEFAULT false,
+    attempt_type text DEFAULT 'email' CHECK (attempt_type IN ('email', 'phone')),
+    created_at timestamptz NOT NULL DEFAULT timezone('utc'::text, now()),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE login_attempts_default PARTITION OF login_attempts DEFAULT;
+CREATE INDEX login_attempts_default_created_at_idx ON login_attempts_default (created_at);
+
+-- Create the daily partitions login_attempts_pYYYYMMDD for p_days days from
+-- p_from. A day whose rows are already in the default partition is skipped.
+CREATE OR REPLACE FUNCTION create_login_attempt_partitions(p_from date, p_days integer)
+RETURNS void AS $$
+DECLARE
+    v_day date;
+BEGIN
+    FOR i IN 0..p_days - 1 LOOP
+        v_day := p_from + i;
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF login_attempts FOR VALUES FROM (%L) TO (%L)',
+                'login_attempts_p' || to_char(v_day, 'YYYYMMDD'),
+                v_day::timestamp AT TIME ZONE 'UTC',
+                (v_day + 1)::timestamp AT TIME ZONE 'UTC'
+            );
+        EXCEPTION WHEN check_violation THEN
+            RAISE WARNING 'login_attempts_default has rows for %, partition not created', v_day;
+        END;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Drop daily partitions that end at or before p_cutoff; returns the
+-- (estimated, from table statistics) number of rows dropped. A partition
+-- that cannot be locked within a second is left for the next run.
+CREATE OR REPLACE FUNCTION drop_login_attempt_partitions(p_cutoff timestamptz)
+RETURNS bigint AS $$
+DECLARE
+    v_partition record;
+    v_dropped bigint := 0;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname, greatest(c.reltuples, 0)::bigint AS estimate
+          FROM pg_inherits i
+          JOIN pg_class c ON c.oid = i.inhrelid
+         WHERE i.inhparent = 'login_attempts'::regclass
+           AND c.relname ~ '^login_attempts_p[0-9]{8}$'
+           AND (to_date(right(c.relname, 8), 'YYYYMMDD') + 1)::timestamp AT TIME ZONE 'UTC' <= p_cutoff
+         ORDER BY c.relname
+    LOOP
+        BEGIN
+            PERFORM set_config('lock_timeout', '1s', true);
+            EXECUTE format('DROP TABLE %I', v_partition.relname);
+            v_dropped := v_dropped + v_partition.estimate;
+        EXCEPTION WHEN lock_not_available THEN
+            RAISE WARNING 'Could not lock %, not dropped', v_partition.relname;
+        END;
+    END LOOP;
+    PERFORM set_config('lock_timeout', '0', true);
+    RETURN v_dropped;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+SELECT create_login_attempt_partitions((now() AT TIME ZONE 'UTC')::date - 1, 9);
+
+INSERT INTO login_attempts (id, identifier, ip_address, success, attempt_type, created_at)
+SELECT id, identifier, ip_address, success, attempt_type, coalesce(created_at, now())
+  FROM login_attempts_unpartitioned;
+
+DROP TABLE login_attempts_unpartitioned;
+
+ALTER TABLE login_attempts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE login_attempts_default ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "login_attempts_all_access" ON login_attempts
+    FOR ALL
+    TO authenticated, anon
+    USING (true)
+    WITH CHECK (true);
+
+-- purge_expired deletes from the default partition directly
+CREATE POLICY "login_attempts_default_all_access" ON login_attempts_default
+    FOR ALL
+    TO authenticated, anon
+    USING (true)
+    WITH CHECK (true);
+
+GRANT ALL ON login_attempts TO anon;
+GRANT ALL ON login_attempts_default TO anon;
+
+-- Same as 00007, except that login_attempts keeps a week of partitions
+-- ahead and drops expired days before deleting stray default-partition rows
+CREATE OR REPLACE FUNCTION purge_expired(
+    p_target text,
+    p_cutoff timestamptz,
+    p_limit integer
+)
+RETURNS TABLE (deleted integer) AS $$
+DECLARE
+    v_deleted integer;
+    v_dropped bigint := 0;
+BEGIN
+    IF p_target = 'verification_codes' THEN
+        DELETE FROM verification_codes WHERE id IN (
+            SELECT id FROM verification_codes
+             WHERE expires_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'refresh_tokens_expired' THEN
+        DELETE FROM refresh_tokens WHERE id IN (
+            SELECT id FROM refresh_tokens
+             WHERE expires_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'refresh_tokens_revoked' THEN
+        DELETE FROM refresh_tokens WHERE id IN (
+            SELECT id FROM refresh_tokens
+             WHERE is_revoked AND revoked_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'user_sessions' THEN
+        DELETE FROM user_sessions WHERE id IN (
+            SELECT id FROM user_sessions
+             WHERE NOT is_active AND ended_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'login_attempts' THEN
+        PERFORM create_login_attempt_partitions((now() AT TIME ZONE 'UTC')::date, 8);
+        v_dropped := drop_login_attempt_partitions(p_cutoff);
+        DELETE FROM login_attempts_default WHERE id IN (
+            SELECT id FROM login_attempts_default
+             WHERE created_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'otp_deliveries' THEN
+        DELETE FROM otp_deliveries WHERE id IN (
+            SELECT id FROM otp_deliveries
+             WHERE updated_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSE
+        RAISE EXCEPTION 'Unknown purge target: %', p_target;
+    END IF;
+
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN QUERY SELECT (v_deleted + v_dropped)::integer;
+END;
+$$ LANGUAGE plpgsql;
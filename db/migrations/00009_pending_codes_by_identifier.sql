@@ -0,0 +1,11 @@
+-- 00009_pending_codes_by_identifier.sql
+
+-- When an identifier has used up its OTP guesses, or a new code is issued
+-- after wrong guesses, all of its pending codes are deleted by email or phone
+CREATE INDEX verification_codes_email_pending_idx
+    ON verification_codes (email)
+    WHERE verified = false;
+
+CREATE INDEX verification_codes_phone_pending_idx
+    ON verification_codes (phone)
+    WHERE verified = false;
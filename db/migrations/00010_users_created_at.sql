@@ -0,0 +1,5 @@
+-- 00010_users_created_at.sql
+
+-- The registered-user filter loads users created since its last sync,
+-- paging by id; without this index every sync scans the users table
+CREATE INDEX users_created_at_idx ON users (created_at);
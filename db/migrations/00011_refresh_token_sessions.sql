@@ -0,0 +1,116 @@
+-- 00011_refresh_token_sessions.sql
+
+-- Refresh tokens record the session they were issued for, so ending one
+-- session revokes its tokens. No foreign key: sessions and tokens are purged
+-- on different schedules. Tokens issued before this migration are bound when
+-- they are next rotated, from the sid claim the caller passes.
+ALTER TABLE refresh_tokens ADD COLUMN session_id uuid;
+
+-- Revoke a session's tokens (single-session logout)
+CREATE INDEX refresh_tokens_session_id_active_idx
+    ON refresh_tokens (session_id)
+    WHERE NOT is_revoked;
+
+CREATE OR REPLACE FUNCTION verify_otp_login(
+    p_code_hash text,
+    p_channel text,
+    p_identifier text,
+    p_refresh_jti uuid,
+    p_refresh_expires_at timestamptz,
+    p_device_info jsonb DEFAULT NULL
+)
+RETURNS TABLE (app_user jsonb, session_id uuid, refresh_token jsonb) AS $$
+DECLARE
+    v_code verification_codes%ROWTYPE;
+    v_user users%ROWTYPE;
+    v_session_id uuid;
+    v_token refresh_tokens%ROWTYPE;
+BEGIN
+    -- Row lock makes concurrent verifies of the same code consume it once
+    UPDATE verification_codes
+       SET verified = true,
+           verified_at = timezone('utc'::text, now())
+     WHERE id = (
+            SELECT id FROM verification_codes
+             WHERE code_hash = p_code_hash
+               AND verified = false
+               AND expires_at > now()
+             LIMIT 1
+             FOR UPDATE SKIP LOCKED
+           )
+    RETURNING * INTO v_code;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    IF p_channel = 'email' THEN
+        INSERT INTO users (email, email_verified, name, auth_type)
+        VALUES (p_identifier, true, v_code.name, 'email')
+        ON CONFLICT (email) DO UPDATE
+            SET email_verified = true,
+                name = COALESCE(NULLIF(EXCLUDED.name, ''), users.name)
+        RETURNING * INTO v_user;
+    ELSE
+        INSERT INTO users (phone_number, phone_verified, name, auth_type)
+        VALUES (p_identifier, true, v_code.name, 'phone')
+        ON CONFLICT (phone_number) DO UPDATE
+            SET phone_verified = true,
+                name = COALESCE(NULLIF(EXCLUDED.name, ''), users.name)
+        RETURNING * INTO v_user;
+    END IF;
+
+    INSERT INTO user_sessions (user_id, device_info, is_active, last_activity)
+    VALUES (v_user.id, p_device_info, true, timezone('utc'::text, now()))
+    RETURNING id INTO v_session_id;
+
+    INSERT INTO refresh_tokens (user_id, jti, expires_at, session_id)
+    VALUES (v_user.id, p_refresh_jti, p_refresh_expires_at, v_session_id)
+    RETURNING * INTO v_token;
+
+    RETURN QUERY SELECT
+        to_jsonb(v_user),
+        v_session_id,
+        jsonb_build_object(
+            'id', v_token.id,
+            'jti', v_token.jti,
+            'expires_at', v_token.expires_at
+        );
+END;
+$$ LANGUAGE plpgsql;
+
+-- The replacement token inherits the session of the one it replaces
+DROP FUNCTION rotate_refresh_token(uuid, text, uuid, timestamptz);
+
+CREATE FUNCTION rotate_refresh_token(
+    p_jti uuid,
+    p_token_digest text,
+    p_new_jti uuid,
+    p_new_expires_at timestamptz,
+    p_session_id uuid DEFAULT NULL
+)
+RETURNS TABLE (user_id uuid) AS $$
+DECLARE
+    v_user_id uuid;
+    v_session_id uuid;
+BEGIN
+    UPDATE refresh_tokens AS rt
+       SET is_revoked = true,
+           revoked_at = timezone('utc'::text, now())
+     WHERE (rt.jti = p_jti OR (p_jti IS NULL AND rt.token_digest = p_token_digest))
+       AND NOT rt.is_revoked
+       AND rt.expires_at > now()
+    RETURNING rt.user_id, rt.session_id INTO v_user_id, v_session_id;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO refresh_tokens (user_id, jti, expires_at, session_id)
+    VALUES (v_user_id, p_new_jti, p_new_expires_at, COALESCE(v_session_id, p_session_id));
+
+    RETURN QUERY SELECT v_user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION rotate_refresh_token(uuid, text, uuid, timestamptz, uuid) TO anon;
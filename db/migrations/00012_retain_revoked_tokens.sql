@@ -0,0 +1,57 @@
+-- 00012_retain_revoked_tokens.sql
+
+-- Same as 00008, except that revoked refresh tokens are kept until they
+-- expire. The revocation filter is rebuilt from the revoked rows, so a token
+-- purged while still valid would be accepted again after a rebuild when
+-- refresh tokens are not looked up (REFRESH_TOKEN_ROTATION=False).
+CREATE OR REPLACE FUNCTION purge_expired(
+    p_target text,
+    p_cutoff timestamptz,
+    p_limit integer
+)
+RETURNS TABLE (deleted integer) AS $$
+DECLARE
+    v_deleted integer;
+    v_dropped bigint := 0;
+BEGIN
+    IF p_target = 'verification_codes' THEN
+        DELETE FROM verification_codes WHERE id IN (
+            SELECT id FROM verification_codes
+             WHERE expires_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'refresh_tokens_expired' THEN
+        DELETE FROM refresh_tokens WHERE id IN (
+            SELECT id FROM refresh_tokens
+             WHERE expires_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'refresh_tokens_revoked' THEN
+        DELETE FROM refresh_tokens WHERE id IN (
+            SELECT id FROM refresh_tokens
+             WHERE is_revoked AND revoked_at < p_cutoff
+               AND expires_at < now()
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'user_sessions' THEN
+        DELETE FROM user_sessions WHERE id IN (
+            SELECT id FROM user_sessions
+             WHERE NOT is_active AND ended_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'login_attempts' THEN
+        PERFORM create_login_attempt_partitions((now() AT TIME ZONE 'UTC')::date, 8);
+        v_dropped := drop_login_attempt_partitions(p_cutoff);
+        DELETE FROM login_attempts_default WHERE id IN (
+            SELECT id FROM login_attempts_default
+             WHERE created_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSIF p_target = 'otp_deliveries' THEN
+        DELETE FROM otp_deliveries WHERE id IN (
+            SELECT id FROM otp_deliveries
+             WHERE updated_at < p_cutoff
+             LIMIT p_limit FOR UPDATE SKIP LOCKED);
+    ELSE
+        RAISE EXCEPTION 'Unknown purge target: %', p_target;
+    END IF;
+
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN QUERY SELECT (v_deleted + v_dropped)::integer;
+END;
+$$ LANGUAGE plpgsql;
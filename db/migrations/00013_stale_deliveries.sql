@@ -0,0 +1,27 @@
+-- 00013_stale_deliveries.sql
+
+-- Deliveries still pending, for finding those whose worker died
+CREATE INDEX otp_deliveries_pending_updated_at_idx
+    ON otp_deliveries (updated_at)
+    WHERE status IN ('queued', 'sending', 'retrying');
+
+-- Mark at most p_limit deliveries that have been pending without an update
+-- since before p_cutoff as failed, and return them. The code was only ever
+-- held by the worker, so such a delivery cannot be resumed. Rows locked by
+-- another caller are skipped, so each row is returned once.
+CREATE OR REPLACE FUNCTION fail_stale_deliveries(
+    p_cutoff timestamptz,
+    p_limit integer
+)
+RETURNS TABLE (id uuid, channel text, recipient text) AS $$
+    UPDATE otp_deliveries AS d
+       SET status = 'failed',
+           last_error = 'internal_error',
+           updated_at = now()
+     WHERE d.id IN (
+        SELECT s.id FROM otp_deliveries AS s
+         WHERE s.status IN ('queued', 'sending', 'retrying')
+           AND s.updated_at < p_cutoff
+         LIMIT p_limit FOR UPDATE SKIP LOCKED)
+    RETURNING d.id, d.channel, d.recipient;
+$$ LANGUAGE sql;
@@ -1,5 +1,15 @@
 #!/bin/sh
 set -e
 
+# Workers write metric samples here and /metrics merges them; start each run empty
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+    echo "Starting ASGI application..."
+    exec python -m app.aio.server --host 0.0.0.0 --port 5000
+fi
+
 echo "Starting Flask application..."
-gunicorn --bind 0.0.0.0:5000 --workers 4 --threads 2 --log-level=info --access-logfile - --error-logfile - "app:app"
\ No newline at end of file
+gunicorn --config docker/gunicorn.conf.py --bind 0.0.0.0:5000 --log-level=info --access-logfile - --error-logfile - "app:app"
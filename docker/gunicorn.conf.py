@@ -0,0 +1,15 @@
+# docker/gunicorn.conf.py
+import os
+from prometheus_client import multiprocess
+
+# Same variables and defaults as the web server settings in app/config.py. The
+# master must not import the app: gevent workers patch the standard library
+# after the fork, and anything the app creates before that would block.
+worker_class = os.getenv('WEB_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_WORKERS', '4'))
+threads = int(os.getenv('WEB_THREADS', '2'))
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', '1000'))
+
+def child_exit(server, worker):
+    # Samples of a dead worker stay in PROMETHEUS_MULTIPROC_DIR; only its live gauges are dropped
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Compare per-operation latency of the data backends.
+
+Usage: python scripts/bench_repositories.py [--backends supabase,postgres] [-n 200]
+
+Runs each repository operation n times against every listed backend and
+prints mean, p50 and p95 latency in milliseconds. The supabase backend uses
+SUPABASE_URL/SUPABASE_KEY, the postgres backend DATABASE_URL (or
+--database-url). Both must point at a database with db/migrations applied.
+Rows created are tagged with a bench- prefix and ended or revoked, but not
+deleted.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.repositories import create_repositories  # noqa: E402
+
+def timed(fn, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def run(backend, n, database_url=None):
+    repos = create_repositories(backend, database_url)
+    run_id = uuid.uuid4().hex[:8]
+    email = f'bench-{run_id}@example.com'
+    user = repos.users.upsert_verified('email', email, 'Bench')
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    jtis = [str(uuid.uuid4()) for _ in range(n + 1)]
+    sessions = []
+
+    def rotate(i):
+        repos.refresh_tokens.rotate(jtis[i], None, jtis[i + 1], expires_at)
+
+    def create_session(i):
+        sessions.append(repos.sessions.create(user['id'], {'bench': run_id})['id'])
+
+    code_hashes = [f'bench-{run_id}-{i}' for i in range(n)]
+    delivery = {
+        'id': str(uuid.uuid4()),
+        'channel': 'email',
+        'recipient': email,
+        'status': 'queued',
+        'attempts': 0,
+        'last_error': None,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+
+    attempts = [{
+        'identifier': email,
+        'ip_address': '127.0.0.1',
+        'success': False,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }] * 10
+
+    repos.refresh_tokens.insert(user['id'], jtis[0], expires_at)
+    operations = [
+        ('users.exists', lambda i: repos.users.exists('email', email)),
+        ('users.upsert_verified', lambda i: repos.users.upsert_verified('email', email, 'Bench')),
+        ('refresh_tokens.is_active', lambda i: repos.refresh_tokens.is_active(jtis[0], None)),
+        ('refresh_tokens.rotate', rotate),
+        ('sessions.create', create_session),
+        ('sessions.list_active', lambda i: repos.sessions.list_active(user['id'])),
+        ('sessions.touch(1)', lambda i: repos.sessions.touch(
+            [sessions[i % len(sessions)]], [datetime.now(timezone.utc).isoformat()])),
+        ('sessions.end', lambda i: repos.sessions.end(sessions[i])),
+        ('attempts.insert_many(10)', lambda i: repos.attempts.insert_many(attempts)),
+        ('verification_codes.insert', lambda i: repos.verification_codes.insert(
+            'email', email, code_hashes[i], 'Bench', expires_at)),
+        ('verification_codes.consume', lambda i: repos.verification_codes.consume(code_hashes[i])),
+        ('deliveries.save', lambda i: repos.deliveries.save(dict(delivery, attempts=i))),
+        ('deliveries.get', lambda i: repos.deliveries.get(delivery['id'])),
+        ('refresh_tokens.list_revoked', lambda i: repos.refresh_tokens.list_revoked(None, True, 0, 100)),
+    ]
+
+    repos.users.exists('email', email)  # warm up the connection
+    results = []
+    for name, fn in operations:
+        samples = timed(fn, n)
+        results.append((name, statistics.mean(samples), statistics.median(samples),
+                        statistics.quantiles(samples, n=20)[18]))
+
+    repos.refresh_tokens.revoke_all(user['id'])
+    repos.sessions.end_all(user['id'])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='supabase,postgres')
+    parser.add_argument('-n', type=int, default=200, help='iterations per operation')
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10} {'operation':<28} {'mean':>8} {'p50':>8} {'p95':>8}")
+    for backend in args.backends.split(','):
+        for name, mean, p50, p95 in run(backend, args.n, args.database_url):
+            print(f"{backend:<10} {name:<28} {mean:8.2f} {p50:8.2f} {p95:8.2f}")
+
+if __name__ == '__main__':
+    main()
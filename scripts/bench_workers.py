@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Compare gunicorn worker configurations under slow dependencies.
+
+Usage: python scripts/bench_workers.py [--rps 5,10,20] [--duration 20]
+                                       [--db-latency 0.2] [--smtp-latency 0.2]
+
+Runs scripts/loadtest.py --server gunicorn once per worker configuration
+and target rate, with the fake PostgREST and SMTP server slowed down so
+that requests spend most of their time waiting on I/O. Prints completed
+flows per second, failed flows and p95 endpoint latency for each run. The
+default configurations are today's 4 processes x 2 threads, the same with
+32 threads, and gevent with 1000 connections per process. The driver and
+the fakes run on the same machine, so compare configurations at rates it
+can sustain without the CPU saturating.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# name -> loadtest.py options
+CONFIGURATIONS = {
+    'gthread 4x2': ['--worker-class', 'gthread', '--workers', '4', '--threads', '2'],
+    'gthread 4x32': ['--worker-class', 'gthread', '--workers', '4', '--threads', '32'],
+    'gevent 4x1000': ['--worker-class', 'gevent', '--workers', '4', '--worker-connections', '1000'],
+}
+
+def run(options, rps, args):
+    command = [
+        sys.executable, os.path.join(ROOT, 'scripts', 'loadtest.py'), '--server', 'gunicorn',
+        '--rps', str(rps), '--duration', str(args.duration), '--channel', args.channel,
+        '--db-latency', str(args.db_latency), '--smtp-latency', str(args.smtp_latency),
+        '--sms-latency', str(args.sms_latency), '--concurrency', str(args.concurrency),
+        '--json', '-', *options
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rps', default='5,10,20', help='comma-separated target flow rates')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per run')
+    parser.add_argument('--configurations', default=','.join(CONFIGURATIONS),
+                        help=f"comma-separated subset of: {', '.join(CONFIGURATIONS)}")
+    parser.add_argument('--channel', choices=['email', 'phone'], default='email')
+    parser.add_argument('--concurrency', type=int, default=1000, help='maximum flows in flight')
+    parser.add_argument('--db-latency', type=float, default=0.2, help='fake PostgREST latency, seconds')
+    parser.add_argument('--smtp-latency', type=float, default=0.2, help='fake SMTP latency, seconds')
+    parser.add_argument('--sms-latency', type=float, default=0.2, help='fake SMS gateway latency, seconds')
+    args = parser.parse_args()
+
+    names = args.configurations.split(',')
+    for name in names:
+        if name not in CONFIGURATIONS:
+            parser.error(f"unknown configuration {name!r}")
+
+    print(f"{'configuration':<16} {'rps':>6} {'flows/s':>8} {'failed':>7} {'late':>6} "
+          f"{'register p95':>13} {'verify p95':>11} {'refresh p95':>12}")
+    for name in names:
+        for rps in (float(value) for value in args.rps.split(',')):
+            results = run(CONFIGURATIONS[name], rps, args)
+            flows = results['flows']
+            p95 = {endpoint.split('/')[-1]: stats['p95'] for endpoint, stats in results['endpoints'].items()}
+            print(f"{name:<16} {rps:>6g} {flows['flows_per_second']:>8.2f} {flows['failed']:>7} "
+                  f"{flows['late_starts']:>6} {p95.get('register', 0):>13.1f} {p95.get('verify', 0):>11.1f} "
+                  f"{p95.get('refresh-token', 0):>12.1f}", flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""Check that the hot queries use indexes at realistic table sizes.
+
+Usage: python scripts/check_query_plans.py --database-url postgresql://... [--scale 1.0]
+
+Seeds users, verification codes, refresh tokens, sessions, OTP deliveries
+and login attempts into an empty scratch database with db/migrations
+applied, VACUUM ANALYZEs, then runs EXPLAIN ANALYZE on every query the
+repositories, OTP store, revocation and user filters and delivery pipeline
+issue. A query fails if it scans its table sequentially, uses no index on
+it, or its best of --runs executions is over its latency budget. Each
+EXPLAIN ANALYZE is rolled back and the tables are truncated at the end; the
+script refuses to run if any of them already has rows. Exits 1 if any query fails.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+import psycopg2
+
+INDEX_SCANS = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan', 'Bitmap Heap Scan'}
+
+# Rows per table at --scale 1.0
+VOLUMES = {
+    'users': 200_000,
+    'verification_codes': 200_000,
+    'refresh_tokens': 500_000,
+    'user_sessions': 300_000,
+    'otp_deliveries': 200_000,
+    'login_attempts': 300_000,
+}
+
+SEED = [
+    # One user created per second, the newest now
+    """INSERT INTO users (email, phone_number, name, auth_type, email_verified, created_at)
+       SELECT 'user' || i || '@example.com', '+1555' || lpad(i::text, 7, '0'), 'User ' || i, 'email', true,
+              now() - i * interval '1 second'
+         FROM generate_series(1, %(users)s) AS i""",
+    # About one code in 20 is still pending; the rest are verified or expired
+    """INSERT INTO verification_codes (email, code_hash, type, verified, verified_at, expires_at, created_at)
+       SELECT 'user' || (i %% %(users)s) || '@example.com', md5('code' || i), 'email',
+              i %% 20 <> 0, CASE WHEN i %% 20 <> 0 THEN now() - interval '1 hour' END,
+              now() + (CASE WHEN i %% 20 = 0 THEN 10 ELSE -60 END) * interval '1 minute',
+              now() - interval '1 hour'
+         FROM generate_series(1, %(verification_codes)s) AS i""",
+    # One token in 5 is revoked, one in 10 carries only a legacy digest and no session
+    """INSERT INTO refresh_tokens (user_id, jti, token_digest, is_revoked, revoked_at, expires_at, created_at,
+                                 session_id)
+       SELECT u.ids[1 + i %% cardinality(u.ids)], CASE WHEN i %% 10 <> 0 THEN gen_random_uuid() END,
+              CASE WHEN i %% 10 = 0 THEN md5('token' || i) END,
+              i %% 5 = 0, CASE WHEN i %% 5 = 0 THEN now() - (i %% 1000) * interval '1 minute' END,
+              now() + (i %% 60 - 10) * interval '1 day', now() - (i %% 30) * interval '1 day',
+              CASE WHEN i %% 10 <> 0 THEN gen_random_uuid() END
+         FROM generate_series(1, %(refresh_tokens)s) AS i
+         CROSS JOIN (SELECT array_agg(id) AS ids FROM users) AS u""",
+    # Three sessions in 10 are active
+    """INSERT INTO user_sessions (user_id, device_info, is_active, last_activity, started_at, ended_at)
+       SELECT u.ids[1 + i %% cardinality(u.ids)], '{"user_agent": "check"}'::jsonb, i %% 10 < 3,
+              now(), now() - interval '2 days', CASE WHEN i %% 10 >= 3 THEN now() - interval '1 day' END
+         FROM generate_series(1, %(user_sessions)s) AS i
+         CROSS JOIN (SELECT array_agg(id) AS ids FROM users) AS u""",
+    """INSERT INTO otp_deliveries (id, channel, recipient, status, attempts, updated_at)
+       SELECT gen_random_uuid(), 'email', 'user' || i || '@example.com', 'delivered', 1,
+              now() - (i %% 1440) * interval '1 minute'
+         FROM generate_series(1, %(otp_deliveries)s) AS i""",
+    # Spread over the last 24 hours, so across today's and yesterday's partitions
+    """INSERT INTO login_attempts (identifier, ip_address, success, created_at)
+       SELECT 'user' || (i %% %(users)s) || '@example.com', '10.0.0.' || (i %% 250), i %% 3 = 0,
+              now() - (i %% 86400) * interval '1 second'
+         FROM generate_series(1, %(login_attempts)s) AS i""",
+]
+
+# Parameters taken from the seeded rows
+PARAMETERS = {
+    'email': "SELECT email FROM users LIMIT 1",
+    'phone': "SELECT phone_number FROM users LIMIT 1",
+    'user_id': "SELECT user_id FROM user_sessions WHERE is_active LIMIT 1",
+    'session_id': "SELECT id FROM user_sessions WHERE is_active LIMIT 1",
+    'code_hash': "SELECT code_hash FROM verification_codes WHERE NOT verified LIMIT 1",
+    'code_email': "SELECT email FROM verification_codes WHERE NOT verified LIMIT 1",
+    'jti': "SELECT jti FROM refresh_tokens WHERE jti IS NOT NULL LIMIT 1",
+    'token_session_id': "SELECT session_id FROM refresh_tokens WHERE session_id IS NOT NULL AND NOT is_revoked LIMIT 1",
+    'token_digest': "SELECT token_digest FROM refresh_tokens WHERE token_digest IS NOT NULL LIMIT 1",
+    'revoked_since': "SELECT now() - interval '10 minutes'",
+    'delivery_id': "SELECT id FROM otp_deliveries LIMIT 1",
+    'created_since': "SELECT now() - interval '1 minute'",
+    'min_uuid': "SELECT '00000000-0000-0000-0000-000000000000'::uuid",
+}
+
+# (name, table, statement, budget in ms). Statements match what the code
+# sends, directly (postgres backend) or through PostgREST.
+QUERIES: List[Tuple[str, str, str, float]] = [
+    ('users.exists email', 'users',
+     "SELECT 1 FROM users WHERE email = %(email)s LIMIT 1", 1),
+    ('users.exists phone', 'users',
+     "SELECT 1 FROM users WHERE phone_number = %(phone)s LIMIT 1", 1),
+    ('otp.consume', 'verification_codes',
+     """UPDATE verification_codes SET verified = true, verified_at = now()
+         WHERE code_hash = %(code_hash)s AND verified = false AND expires_at > now()
+     RETURNING id, name, expires_at""", 2),
+    ('otp.discard', 'verification_codes',
+     "DELETE FROM verification_codes WHERE code_hash = %(code_hash)s AND verified = false", 2),
+    ('otp.discard_all', 'verification_codes',
+     "DELETE FROM verification_codes WHERE email = %(code_email)s AND verified = false", 2),
+    ('refresh_tokens.is_active jti', 'refresh_tokens',
+     """SELECT 1 FROM refresh_tokens
+         WHERE jti = %(jti)s AND NOT is_revoked AND expires_at > now() LIMIT 1""", 1),
+    ('refresh_tokens.is_active digest', 'refresh_tokens',
+     """SELECT 1 FROM refresh_tokens
+         WHERE token_digest = %(token_digest)s AND NOT is_revoked AND expires_at > now() LIMIT 1""", 1),
+    ('refresh_tokens.revoke_all', 'refresh_tokens',
+     """UPDATE refresh_tokens SET is_revoked = true, revoked_at = now()
+         WHERE user_id = %(user_id)s AND is_revoked = false""", 2),
+    ('refresh_tokens.revoke_session', 'refresh_tokens',
+     """UPDATE refresh_tokens SET is_revoked = true, revoked_at = now()
+         WHERE session_id = %(token_session_id)s AND NOT is_revoked RETURNING jti""", 1),
+    ('sessions.list_active', 'user_sessions',
+     """SELECT id, device_info, started_at, last_activity FROM user_sessions
+         WHERE user_id = %(user_id)s AND is_active = true""", 1),
+    ('sessions.end', 'user_sessions',
+     """UPDATE user_sessions SET is_active = false, ended_at = now()
+         WHERE id = %(session_id)s RETURNING user_id""", 1),
+    ('sessions.end_all', 'user_sessions',
+     """UPDATE user_sessions SET is_active = false, ended_at = now()
+         WHERE user_id = %(user_id)s AND is_active = true RETURNING id""", 2),
+    ('sessions.touch', 'user_sessions',
+     """UPDATE user_sessions AS s SET last_activity = GREATEST(s.last_activity, t.seen_at)
+          FROM unnest(ARRAY[%(session_id)s]::uuid[], ARRAY[now()]) AS t(id, seen_at)
+         WHERE s.id = t.id AND s.is_active""", 1),
+    ('revocation.sync page', 'refresh_tokens',
+     """SELECT jti, revoked_at FROM refresh_tokens
+         WHERE is_revoked = true AND revoked_at >= %(revoked_since)s
+         ORDER BY revoked_at LIMIT 1000""", 20),
+    ('user_filter.rebuild page', 'users',
+     """SELECT id, email, phone_number, created_at FROM users
+         WHERE id > %(min_uuid)s ORDER BY id LIMIT 1000""", 20),
+    ('user_filter.sync page', 'users',
+     """SELECT id, email, phone_number, created_at FROM users
+         WHERE created_at >= %(created_since)s AND id > %(min_uuid)s ORDER BY id LIMIT 1000""", 2),
+    ('revocation.count', 'refresh_tokens',
+     "SELECT count(*) FROM refresh_tokens WHERE is_revoked = true AND expires_at > now()", 100),
+    ('delivery.status', 'otp_deliveries',
+     "SELECT * FROM otp_deliveries WHERE id = %(delivery_id)s", 1),
+    ('delivery.fail_stale', 'otp_deliveries',
+     """UPDATE otp_deliveries AS d SET status = 'failed', last_error = 'internal_error', updated_at = now()
+         WHERE d.id IN (SELECT s.id FROM otp_deliveries AS s
+                         WHERE s.status IN ('queued', 'sending', 'retrying')
+                           AND s.updated_at < now() - interval '5 minutes'
+                         LIMIT 100 FOR UPDATE SKIP LOCKED)
+     RETURNING d.id, d.channel, d.recipient""", 2),
+]
+
+def plan_nodes(plan: Dict) -> List[Dict]:
+    nodes = [plan]
+    for child in plan.get('Plans', []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+def check(conn, table: str, statement: str, budget: float, params: Dict, runs: int) -> Tuple[bool, str]:
+    timings = []
+    for _ in range(runs):
+        with conn.cursor() as cur:
+            cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {statement}", params)
+            result = cur.fetchone()[0]
+        # EXPLAIN ANALYZE executes updates and deletes; keep the seeded rows as they were
+        conn.rollback()
+        result = result[0] if isinstance(result, list) else json.loads(result)[0]
+        timings.append(result['Execution Time'])
+
+    nodes = [node for node in plan_nodes(result['Plan'])
+             if node.get('Relation Name') == table or node.get('Index Name', '').startswith(table)]
+    scans = sorted({node['Node Type'] + (f" ({node['Index Name']})" if 'Index Name' in node else '')
+                    for node in nodes})
+    best = min(timings)
+    if any(node['Node Type'] == 'Seq Scan' for node in nodes):
+        return False, f"sequential scan on {table}: {', '.join(scans)}"
+    if not any(node['Node Type'] in INDEX_SCANS for node in nodes):
+        return False, f"no index used on {table}: {', '.join(scans) or 'no scan'}"
+    if best > budget:
+        return False, f"{best:.2f} ms over the {budget:g} ms budget ({', '.join(scans)})"
+    return True, f"{best:.2f} ms ({', '.join(scans)})"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for the seeded row counts')
+    parser.add_argument('--runs', type=int, default=5, help='executions per query; the fastest is compared')
+    parser.add_argument('--budget-factor', type=float, default=1.0, help='multiplier for every latency budget')
+    args = parser.parse_args()
+
+    volumes = {table: max(1, int(rows * args.scale)) for table, rows in VOLUMES.items()}
+    conn = psycopg2.connect(args.database_url)
+    with conn.cursor() as cur:
+        for table in VOLUMES:
+            cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+            if cur.fetchone()[0]:
+                sys.exit(f"{table} is not empty; run this against a scratch database")
+    conn.rollback()
+
+    failed = 0
+    try:
+        print(f"Seeding {', '.join(f'{table}={rows}' for table, rows in volumes.items())}")
+        with conn.cursor() as cur:
+            for statement in SEED:
+                cur.execute(statement, volumes)
+        conn.commit()
+        # VACUUM sets the visibility map, without which index-only scans are not chosen
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE users, verification_codes, refresh_tokens, user_sessions, "
+                        "otp_deliveries, login_attempts")
+        conn.autocommit = False
+
+        params = {}
+        with conn.cursor() as cur:
+            for key, query in PARAMETERS.items():
+                cur.execute(query)
+                params[key] = cur.fetchone()[0]
+        conn.rollback()
+
+        print(f"{'query':<34} {'result':<6} detail")
+        for name, table, statement, budget in QUERIES:
+            ok, detail = check(conn, table, statement, budget * args.budget_factor, params, args.runs)
+            failed += not ok
+            print(f"{name:<34} {'ok' if ok else 'FAIL':<6} {detail}")
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"TRUNCATE {', '.join(VOLUMES)}")
+        conn.commit()
+        conn.close()
+
+    print(f"{len(QUERIES) - failed}/{len(QUERIES)} queries passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
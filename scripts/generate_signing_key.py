@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""Generate a token signing key for JWT_SIGNING_KEYS_DIR.
+
+Usage: python scripts/generate_signing_key.py <keys_dir> [--type rsa|ed25519] [--kid KID]
+
+To rotate: generate a new key and point JWT_ACTIVE_KID at it (or let it sort
+last). Keep the old <kid>.pem, or replace it with <kid>.pub.pem, until every
+token it signed has expired, so verifiers can still find it in the JWKS.
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('keys_dir')
+    parser.add_argument('--type', choices=['rsa', 'ed25519'], default='rsa')
+    parser.add_argument('--kid', default=None, help='key ID (default: UTC timestamp)')
+    args = parser.parse_args()
+
+    kid = args.kid or datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+    if args.type == 'rsa':
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        key = ed25519.Ed25519PrivateKey.generate()
+
+    os.makedirs(args.keys_dir, exist_ok=True)
+    path = os.path.join(args.keys_dir, f'{kid}.pem')
+    with open(path, 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ))
+    os.chmod(path, 0o600)
+    print(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+"""Load test the auth flows against local stand-ins for every dependency.
+
+Usage: python scripts/loadtest.py [--rps 20] [--duration 30] [--server wsgi|asgi|gunicorn]
+                                  [--worker-class gthread|gevent] [--workers 4] [--threads 2]
+                                  [--channel email|phone] [--db-latency 0.005]
+                                  [--smtp-latency 0.05] [--sms-latency 0.1]
+                                  [--json results.json] [--history bench/history.jsonl]
+
+Starts a fake PostgREST (or uses local Postgres with --database-url), a fake
+SMTP server and a fake SMS gateway from app/utils/fakes.py, each with the
+given latency in seconds, boots the app in-process against them and starts
+register -> verify -> refresh flows at the target rate. Flows are started on
+schedule whether or not earlier ones finished (open loop), so slow responses
+show up as latency instead of a lower request rate.
+
+--server gunicorn runs docker/gunicorn.conf.py in a subprocess instead, with
+the worker class, processes, threads and gevent connections given by the
+--worker-class, --workers, --threads and --worker-connections options.
+
+Reports p50/p95/p99 latency in milliseconds per endpoint, per dependency
+call (timed inside the app process, so not with --server gunicorn) and for
+OTP delivery (register response to message arrival). --json writes the results, --history appends them as
+one line to a JSONL file along with the git commit, for tracking over time.
+"""
+import argparse
+import email
+import json
+import logging
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+def _load_fakes():
+    # Importing through the app package would read Config before the fakes exist
+    import importlib.util
+    spec = importlib.util.spec_from_file_location('fakes', os.path.join(ROOT, 'app', 'utils', 'fakes.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+fakes_module = _load_fakes()
+
+OTP_PATTERN = re.compile(r'\b(\d{6})\b')
+
+class Recorder:
+    """Thread-safe latency samples keyed by name."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name, ms, ok=True):
+        with self._lock:
+            self.samples[name].append(ms)
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self):
+        with self._lock:
+            names = sorted(self.samples)
+            return {name: summarize(self.samples[name], self.errors[name]) for name in names}
+
+def summarize(samples, errors=0):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2)
+
+    return {
+        'count': len(ordered),
+        'errors': errors,
+        'mean': round(statistics.mean(ordered), 2),
+        'p50': pct(50),
+        'p95': pct(95),
+        'p99': pct(99),
+        'max': round(ordered[-1], 2)
+    }
+
+def instrument(recorder, fakes):
+    """Time outgoing calls to the fakes from inside the app process."""
+    import aiosmtplib
+    import httpx
+    import requests
+    import smtplib
+
+    ports = {urlparse(fake.url).port: kind for kind, fake in fakes.items() if hasattr(fake, 'url')}
+
+    def classify(method, url):
+        kind = ports.get(url.port)
+        if kind == 'postgrest':
+            path = url.path.split('/rest/v1/', 1)[-1]
+            return f'postgrest {method} {path}'
+        if kind == 'sms_gateway':
+            return 'sms_gateway send'
+        return None
+
+    def timed(name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            status = getattr(result, 'status_code', 200)
+            ok = status < 400
+            return result
+        finally:
+            recorder.add(name, (time.perf_counter() - start) * 1000, ok)
+
+    async def atimed(name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = await fn(*args, **kwargs)
+            status = getattr(result, 'status_code', 200)
+            ok = status < 400
+            return result
+        finally:
+            recorder.add(name, (time.perf_counter() - start) * 1000, ok)
+
+    httpx_send = httpx.Client.send
+    httpx_async_send = httpx.AsyncClient.send
+    requests_send = requests.Session.send
+    smtp_sendmail = smtplib.SMTP.sendmail
+    aiosmtp_sendmail = aiosmtplib.SMTP.sendmail
+
+    def patched_httpx_send(self, request, *args, **kwargs):
+        name = classify(request.method, request.url)
+        if name is None:
+            return httpx_send(self, request, *args, **kwargs)
+        return timed(name, httpx_send, self, request, *args, **kwargs)
+
+    async def patched_httpx_async_send(self, request, *args, **kwargs):
+        name = classify(request.method, request.url)
+        if name is None:
+            return await httpx_async_send(self, request, *args, **kwargs)
+        return await atimed(name, httpx_async_send, self, request, *args, **kwargs)
+
+    def patched_requests_send(self, request, *args, **kwargs):
+        name = classify(request.method, urlparse(request.url))
+        if name is None:
+            return requests_send(self, request, *args, **kwargs)
+        return timed(name, requests_send, self, request, *args, **kwargs)
+
+    def patched_smtp_sendmail(self, *args, **kwargs):
+        return timed('smtp send', smtp_sendmail, self, *args, **kwargs)
+
+    async def patched_aiosmtp_sendmail(self, *args, **kwargs):
+        return await atimed('smtp send', aiosmtp_sendmail, self, *args, **kwargs)
+
+    from app.repositories.postgres import PostgresPool
+
+    postgres_execute = PostgresPool.execute
+
+    def patched_postgres_execute(self, name, *args, **kwargs):
+        return timed(f'postgres {name}', postgres_execute, self, name, *args, **kwargs)
+
+    PostgresPool.execute = patched_postgres_execute
+    httpx.Client.send = patched_httpx_send
+    httpx.AsyncClient.send = patched_httpx_async_send
+    requests.Session.send = patched_requests_send
+    smtplib.SMTP.sendmail = patched_smtp_sendmail
+    aiosmtplib.SMTP.sendmail = patched_aiosmtp_sendmail
+
+def configure_environment(args, fakes):
+    """Point Config at the fakes; must run before the app is imported."""
+    import jwt
+
+    os.environ.update({
+        'SUPABASE_URL': fakes['postgrest'].url,
+        # supabase-py only accepts JWT-shaped keys; the fake ignores it
+        'SUPABASE_KEY': jwt.encode({'role': 'service_role'}, 'loadtest' * 4, algorithm='HS256'),
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY', uuid.uuid4().hex),
+        'SMTP_SERVER': fakes['smtp'].host,
+        'SMTP_PORT': str(fakes['smtp'].port),
+        'SMTP_USERNAME': 'loadtest',
+        'SMTP_PASSWORD': 'loadtest',
+        'SMTP_FROM_EMAIL': 'loadtest@example.com',
+        'SMTP_USE_TLS': 'False',
+        'SMS_GATEWAY_URL': fakes['sms_gateway'].url,
+    })
+    if args.database_url:
+        os.environ.update({'DATA_BACKEND': 'postgres', 'DATABASE_URL': args.database_url})
+        if args.server == 'asgi':
+            # The async OTP store talks to PostgREST, whose codes could not be consumed
+            # in Postgres; the in-memory store keeps the whole login on the repositories
+            os.environ['OTP_STORE_BACKEND'] = 'memory'
+
+def start_gunicorn(args):
+    """Run gunicorn with the production config on a free port; returns (base URL, process)."""
+    import socket
+    import tempfile
+    import httpx
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, **{
+        'WEB_WORKER_CLASS': args.worker_class,
+        'WEB_WORKERS': str(args.workers),
+        'WEB_THREADS': str(args.threads),
+        'WEB_WORKER_CONNECTIONS': str(args.worker_connections),
+        'PROMETHEUS_MULTIPROC_DIR': tempfile.mkdtemp(prefix='loadtest-metrics-'),
+    })
+    if not args.verbose:
+        env['LOG_LEVEL'] = 'WARNING'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'docker/gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+         '--log-level', 'info' if args.verbose else 'warning', 'app:app'],
+        cwd=ROOT, env=env
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + '/livez', timeout=1).status_code == 200:
+                return base_url, process
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+def start_app(server):
+    """Serve the app on an ephemeral port on a background thread; returns its base URL."""
+    if server == 'asgi':
+        import socket
+        import uvicorn
+        from app.asgi import app
+        from app.aio.server import NoDelayH11Protocol
+
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        uvicorn_server = uvicorn.Server(uvicorn.Config(app, log_level='warning', lifespan='on',
+                                                       http=NoDelayH11Protocol))
+        threading.Thread(target=uvicorn_server.run, kwargs={'sockets': [sock]}, daemon=True).start()
+        while not uvicorn_server.started:
+            time.sleep(0.05)
+        return f'http://127.0.0.1:{sock.getsockname()[1]}'
+
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    wsgi_server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+    threading.Thread(target=wsgi_server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{wsgi_server.server_port}'
+
+class Mailbox:
+    """Find the OTP sent to a recipient through the fake SMTP server or SMS gateway."""
+
+    def __init__(self, smtp, sms_gateway):
+        self.smtp = smtp
+        self.sms_gateway = sms_gateway
+        self.seen = {'email': 0, 'phone': 0}
+        self.codes = {}
+        self._lock = threading.Lock()
+
+    def _index(self):
+        with self._lock:
+            for message in self.smtp.messages[self.seen['email']:]:
+                parsed = email.message_from_string(message['data'])
+                body = ''.join(part.get_payload(decode=True).decode(errors='replace')
+                               for part in parsed.walk() if not part.is_multipart())
+                match = OTP_PATTERN.search(body)
+                for recipient in message['to']:
+                    self.codes[recipient.strip('<>')] = match.group(1) if match else None
+                self.seen['email'] += 1
+            for message in self.sms_gateway.messages[self.seen['phone']:]:
+                match = OTP_PATTERN.search(message['message'])
+                self.codes[message['number']] = match.group(1) if match else None
+                self.seen['phone'] += 1
+
+    def wait_for(self, recipient, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self._index()
+            with self._lock:
+                if recipient in self.codes:
+                    return self.codes.pop(recipient)
+            time.sleep(0.01)
+        return None
+
+def run_flow(client, base_url, channel, mailbox, recorder, refreshes, timeout):
+    """One register -> verify -> refresh sequence; returns True if every step succeeded."""
+    if channel == 'email':
+        field, identifier = 'email', f'loadtest-{uuid.uuid4().hex}@example.com'
+    else:
+        field, identifier = 'phone', f'+2613{uuid.uuid4().int % 10 ** 8:08d}'
+
+    def call(name, path, payload):
+        start = time.perf_counter()
+        try:
+            response = client.post(base_url + path, json=payload, timeout=timeout)
+            ok = response.status_code == 200
+        except Exception:
+            response, ok = None, False
+        recorder.add(name, (time.perf_counter() - start) * 1000, ok)
+        return response.json() if ok else None
+
+    if call(f'POST /auth/{channel}/register', f'/auth/{channel}/register',
+            {field: identifier, 'name': 'Load Test'}) is None:
+        return False
+
+    start = time.perf_counter()
+    otp = mailbox.wait_for(identifier, timeout)
+    recorder.add('otp delivery', (time.perf_counter() - start) * 1000, otp is not None)
+    if otp is None:
+        return False
+
+    verified = call(f'POST /auth/{channel}/verify', f'/auth/{channel}/verify', {field: identifier, 'otp': otp})
+    if verified is None:
+        return False
+
+    refresh_token = verified['data']['tokens']['refresh_token']
+    for _ in range(refreshes):
+        refreshed = call('POST /auth/refresh-token', '/auth/refresh-token', {'refresh_token': refresh_token})
+        if refreshed is None:
+            return False
+        refresh_token = refreshed['data']['tokens']['refresh_token']
+    return True
+
+def drive(args, base_url, mailbox, endpoints):
+    """Start flows at args.rps for args.duration seconds; returns flow counts and elapsed time."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    counts = {'started': 0, 'completed': 0, 'failed': 0, 'late_starts': 0}
+    lock = threading.Lock()
+    # urllib3 sets TCP_NODELAY; httpx 0.23 does not, and a POST body sent in a
+    # second segment then waits for the server's delayed ACK on kept-alive connections
+    client = requests.Session()
+    client.mount('http://', HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def flow():
+        ok = run_flow(client, base_url, args.channel, mailbox, endpoints, args.refreshes, args.timeout)
+        with lock:
+            counts['completed' if ok else 'failed'] += 1
+
+    total = int(args.rps * args.duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(total):
+            delay = start + i / args.rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.1:
+                counts['late_starts'] += 1
+            pool.submit(flow)
+            counts['started'] += 1
+    elapsed = time.perf_counter() - start
+    client.close()
+    return counts, elapsed
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'name':<44} {'count':>7} {'errors':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, s in rows.items():
+        print(f"{name:<44} {s['count']:>7} {s['errors']:>7} {s['p50']:>9.2f} {s['p95']:>9.2f} "
+              f"{s['p99']:>9.2f} {s['max']:>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rps', type=float, default=20, help='flows started per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to keep starting flows')
+    parser.add_argument('--server', choices=['wsgi', 'asgi', 'gunicorn'], default='wsgi')
+    parser.add_argument('--worker-class', choices=['gthread', 'gevent'], default='gthread',
+                        help='gunicorn worker class (--server gunicorn)')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn processes (--server gunicorn)')
+    parser.add_argument('--threads', type=int, default=2, help='threads per gthread worker (--server gunicorn)')
+    parser.add_argument('--worker-connections', type=int, default=1000,
+                        help='concurrent requests per gevent worker (--server gunicorn)')
+    parser.add_argument('--channel', choices=['email', 'phone'], default='email')
+    parser.add_argument('--refreshes', type=int, default=1, help='refresh-token calls per flow')
+    parser.add_argument('--concurrency', type=int, default=200, help='maximum flows in flight')
+    parser.add_argument('--timeout', type=float, default=30, help='per request and OTP wait, seconds')
+    parser.add_argument('--db-latency', type=float, default=0.005, help='fake PostgREST latency, seconds')
+    parser.add_argument('--smtp-latency', type=float, default=0.05, help='fake SMTP latency, seconds')
+    parser.add_argument('--sms-latency', type=float, default=0.1, help='fake SMS gateway latency, seconds')
+    parser.add_argument('--database-url', default=None, help='use local Postgres for the repositories')
+    parser.add_argument('--json', default=None, help="write results to this file ('-' for stdout)")
+    parser.add_argument('--history', default=None, help='append results as a line to this JSONL file')
+    parser.add_argument('--verbose', action='store_true', help='keep the app and access logs')
+    args = parser.parse_args()
+
+    fakes = {
+        'postgrest': fakes_module.FakePostgREST(latency=args.db_latency).start(),
+        'smtp': fakes_module.FakeSMTPServer(latency=args.smtp_latency).start(),
+        'sms_gateway': fakes_module.FakeSMSGateway(latency=args.sms_latency).start(),
+    }
+    configure_environment(args, fakes)
+
+    dependencies = Recorder()
+    endpoints = Recorder()
+    process = None
+    if args.server == 'gunicorn':
+        if args.database_url:
+            parser.error('--database-url keeps codes in process memory and cannot be used with --server gunicorn')
+        base_url, process = start_gunicorn(args)
+    else:
+        instrument(dependencies, fakes)
+        base_url = start_app(args.server)
+    if not args.verbose:
+        # Per-request log lines would dominate the output
+        logging.getLogger('app').setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    mailbox = Mailbox(fakes['smtp'], fakes['sms_gateway'])
+
+    counts, elapsed = drive(args, base_url, mailbox, endpoints)
+    if process is not None:
+        process.terminate()
+        process.wait(30)
+    for fake in fakes.values():
+        fake.stop()
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'history')},
+        'flows': dict(counts, flows_per_second=round(counts['completed'] / elapsed, 2) if elapsed else 0),
+        'endpoints': endpoints.summary(),
+        'dependencies': dependencies.summary(),
+    }
+
+    if args.json != '-':
+        flows = results['flows']
+        print(f"{flows['started']} flows started in {elapsed:.1f}s, {flows['completed']} completed, "
+              f"{flows['failed']} failed, {flows['late_starts']} started late")
+        print_table('Endpoints (ms)', results['endpoints'])
+        print_table('Dependencies (ms)', results['dependencies'])
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.history:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(results) + '\n')
+
+if __name__ == '__main__':
+    main()